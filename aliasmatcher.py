@@ -0,0 +1,293 @@
+import os
+import re
+import json
+import time
+import hashlib
+import logging
+from collections import deque
+from threading import Lock
+
+# Alias resolver settings (overridable through the environment)
+ALIAS_MAP_PATH = os.getenv("ALIAS_MAP_PATH", "")  # optional JSON file with "plants" and/or "aliases"; empty = built-in maps
+ALIAS_MAP_CHECK_INTERVAL = float(os.getenv("ALIAS_MAP_CHECK_INTERVAL", "30"))  # seconds between mtime checks
+
+_ALIAS_LINE = re.compile(r'^- "([^"]+)" refers to "([^"]+)"$', re.MULTILINE)
+
+
+def parse_alias_lines(text):
+    """Parses '- "phrase" refers to "column"' lines into (phrase, column) pairs, in order."""
+    return [(match.group(1), match.group(2)) for match in _ALIAS_LINE.finditer(text)]
+
+
+def format_alias_line(phrase, column):
+    """The prompt line for one alias, in the entity_aliases format."""
+    return f'- "{phrase}" refers to "{column}"'
+
+
+def is_word_char(ch):
+    """Same test as the regex \\w class for str patterns."""
+    return ch.isalnum() or ch == "_"
+
+
+class AhoCorasick:
+    """
+    Multi-pattern string matcher: finds every occurrence of every pattern, overlapping ones
+    included, in one left-to-right pass over the text (time linear in the text plus matches).
+    """
+
+    def __init__(self, patterns):
+        self.patterns = list(patterns)
+        self.goto = [{}]  # state -> {char: next state}
+        self.fail = [0]
+        self.output = [[]]  # state -> indexes of the patterns ending here
+        for index, pattern in enumerate(self.patterns):
+            state = 0
+            for ch in pattern:
+                nxt = self.goto[state].get(ch)
+                if nxt is None:
+                    nxt = len(self.goto)
+                    self.goto[state][ch] = nxt
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.output.append([])
+                state = nxt
+            self.output[state].append(index)
+
+        # Breadth-first failure links; each state also inherits the outputs of its failure state
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self.goto[state].items():
+                queue.append(nxt)
+                fallback = self.fail[state]
+                while fallback and ch not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[nxt] = self.goto[fallback].get(ch, 0)
+                self.output[nxt] = self.output[nxt] + self.output[self.fail[nxt]]
+
+    def iter_matches(self, text):
+        """Yields (start, end, pattern index) for every occurrence, ordered by end position."""
+        goto, fail, output, patterns = self.goto, self.fail, self.output, self.patterns
+        state = 0
+        for position, ch in enumerate(text):
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            for index in output[state]:
+                yield position + 1 - len(patterns[index]), position + 1, index
+
+
+class AliasResolver:
+    """
+    Resolves plant names, plant codes and column aliases in a query with one automaton.
+
+    Plant names and codes match anywhere in the lowercased query, as plain substrings; a plant
+    name wins over a code, and among several names (or codes) the first in map order wins.
+    Alias phrases must start at a word boundary and not be followed by a word character.
+    The mappings come from the built-in defaults, or from the JSON file at ALIAS_MAP_PATH
+    ({"plants": {name: code}, "aliases": {phrase: column}}; either key may be left out). The file
+    is re-read when its mtime changes, at most every ALIAS_MAP_CHECK_INTERVAL seconds, so edited
+    mappings apply without a restart. Lookups use an immutable snapshot swapped in on reload.
+    """
+
+    def __init__(self, plants, aliases, path=ALIAS_MAP_PATH, check_interval=ALIAS_MAP_CHECK_INTERVAL):
+        self.default_plants = dict(plants)
+        self.default_aliases = list(aliases)
+        self.path = path
+        self.check_interval = check_interval
+        self._lock = Lock()
+        self._mtime = None
+        self._next_check = 0.0
+        self._stats = {"resolved": 0, "plant_hits": 0, "alias_hits": 0, "reloads": 0, "reload_errors": 0}
+        self._snapshot = self._build(self.default_plants, self.default_aliases)
+        if self.path:
+            self.maybe_reload(force=True)
+
+    @staticmethod
+    def _build(plants, aliases):
+        """Builds the automaton and lookup tables for one set of mappings."""
+        plant_entries = list(plants.items())
+        patterns = {}  # lowercase pattern -> [(kind, position in its map)]
+        for position, (name, _code) in enumerate(plant_entries):
+            patterns.setdefault(name.lower(), []).append(("name", position))
+        for position, (_name, code) in enumerate(plant_entries):
+            patterns.setdefault(code.lower(), []).append(("code", position))
+        for position, (phrase, _column) in enumerate(aliases):
+            patterns.setdefault(phrase.lower(), []).append(("alias", position))
+        keys = list(patterns)
+        digest = hashlib.sha256(json.dumps([plant_entries, aliases]).encode("utf-8")).hexdigest()
+        return {
+            "plants": plant_entries,
+            "aliases": list(aliases),
+            "entries": [patterns[key] for key in keys],
+            "automaton": AhoCorasick(keys),
+            "version": digest,
+        }
+
+    @property
+    def version(self):
+        """Hash of the current mappings; changes when a reload changes them."""
+        return self._snapshot["version"]
+
+    def reload(self, plants=None, aliases=None):
+        """
+        Rebuilds the matcher from the given mappings, or from ALIAS_MAP_PATH (falling back to the
+        built-in defaults for any part the file leaves out).
+
+        Returns:
+            bool: True if the new mappings were loaded, False if the file could not be read.
+        """
+        if plants is None and aliases is None and self.path:
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                plants = data.get("plants")
+                if plants is not None:
+                    plants = {str(name): str(code) for name, code in dict(plants).items()}
+                aliases = data.get("aliases")
+                if isinstance(aliases, dict):
+                    aliases = list(aliases.items())
+                if aliases is not None:
+                    aliases = [(str(phrase), str(column)) for phrase, column in aliases]
+            except (OSError, ValueError, AttributeError, TypeError) as e:
+                print(f"Error loading alias map '{self.path}': {e}")
+                logging.error(f"Error loading alias map '{self.path}': {e}")
+                with self._lock:
+                    self._stats["reload_errors"] += 1
+                return False
+        snapshot = self._build(self.default_plants if plants is None else plants,
+                               self.default_aliases if aliases is None else aliases)
+        with self._lock:
+            self._snapshot = snapshot
+            self._stats["reloads"] += 1
+        logging.info(f"Alias map loaded: {len(snapshot['plants'])} plants, {len(snapshot['aliases'])} aliases")
+        return True
+
+    def maybe_reload(self, force=False):
+        """Reloads ALIAS_MAP_PATH if its modification time changed since the last load."""
+        if not self.path:
+            return
+        now = time.monotonic()
+        with self._lock:
+            if not force and now < self._next_check:
+                return
+            self._next_check = now + self.check_interval
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            mtime = None
+        if mtime == self._mtime and not force:
+            return
+        if mtime is None:
+            if self._mtime is not None:
+                logging.warning(f"Alias map '{self.path}' disappeared; keeping the loaded mappings")
+            self._mtime = None
+            return
+        if self.reload():
+            self._mtime = mtime
+
+    def resolve(self, query):
+        """
+        Finds the plant and the column aliases mentioned in a query in one pass.
+
+        Args:
+            query (str): The user question.
+
+        Returns:
+            dict: {"plant_code", "plant_name" (None when no plant is mentioned),
+                   "aliases": [(phrase, column), ...] in mapping order,
+                   "columns": the aliased column names, in the same order, without duplicates}.
+        """
+        self.maybe_reload()
+        snapshot = self._snapshot
+        text = query.lower()
+        best_name = best_code = None
+        alias_positions = set()
+        for start, end, index in snapshot["automaton"].iter_matches(text):
+            for kind, position in snapshot["entries"][index]:
+                if kind == "name":
+                    if best_name is None or position < best_name:
+                        best_name = position
+                elif kind == "code":
+                    if best_code is None or position < best_code:
+                        best_code = position
+                elif (is_word_char(text[start]) != (start > 0 and is_word_char(text[start - 1]))
+                      and (end == len(text) or not is_word_char(text[end]))):
+                    alias_positions.add(position)
+
+        plant = best_name if best_name is not None else best_code
+        plant_name, plant_code = snapshot["plants"][plant] if plant is not None else (None, None)
+        aliases = [snapshot["aliases"][position] for position in sorted(alias_positions)]
+        with self._lock:
+            self._stats["resolved"] += 1
+            self._stats["plant_hits"] += plant is not None
+            self._stats["alias_hits"] += bool(aliases)
+        return {
+            "plant_code": plant_code,
+            "plant_name": plant_name,
+            "aliases": aliases,
+            "columns": list(dict.fromkeys(column for _phrase, column in aliases)),
+        }
+
+    def stats(self):
+        """Returns lookup and reload counters and the size of the current mappings."""
+        with self._lock:
+            stats = dict(self._stats)
+        snapshot = self._snapshot
+        stats.update(plants=len(snapshot["plants"]), aliases=len(snapshot["aliases"]),
+                     states=len(snapshot["automaton"].goto), version=snapshot["version"][:12])
+        return stats
+
+
+if __name__ == "__main__":
+    # Micro-benchmark: one automaton pass vs. a substring scan per plant plus a regex per alias,
+    # on the json.txt questions with the built-in aliases and a growing number of synthetic plants.
+    import argparse
+    from sqlgen import PLANT_NAME_CODE_MAP, entity_aliases
+
+    parser = argparse.ArgumentParser(description="Compare AliasResolver with per-pattern scans.")
+    parser.add_argument("--corpus", default="json.txt", help="JSON list of {input: question} examples.")
+    parser.add_argument("--plants", type=int, nargs="+", default=[5, 100, 1000])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    with open(args.corpus, "r", encoding="utf-8") as f:
+        messages = [example["input"] for example in json.load(f)]
+    aliases = parse_alias_lines(entity_aliases)
+    alias_patterns = [(re.compile(rf"\b{re.escape(phrase.lower())}(?!\w)"), phrase, column) for phrase, column in aliases]
+
+    def linear_scan(plants, codes, message):
+        query = message.lower()
+        plant = next(((code, name) for name, code in plants.items() if name in query), None)
+        if plant is None:
+            plant = next(((code, name) for code, name in codes.items() if code.lower() in query), (None, None))
+        return plant, [(phrase, column) for pattern, phrase, column in alias_patterns if pattern.search(query)]
+
+    def timed(fn):
+        best = float("inf")
+        for _ in range(3):
+            start = time.perf_counter()
+            for _ in range(args.repeat):
+                for message in messages:
+                    fn(message)
+            best = min(best, time.perf_counter() - start)
+        return best / (args.repeat * len(messages)) * 1e6
+
+    report = []
+    for count in args.plants:
+        plants = dict(PLANT_NAME_CODE_MAP)
+        for i in range(len(plants), count):
+            plants[f"plantsite{i:04d}"] = f"Z{i:04d}"
+        codes = {code: name for name, code in plants.items()}
+        resolver = AliasResolver(plants, aliases, path="")
+        mismatches = 0
+        for message in messages:
+            match = resolver.resolve(message)
+            if linear_scan(plants, codes, message) != ((match["plant_code"], match["plant_name"]), match["aliases"]):
+                mismatches += 1
+        linear_us = timed(lambda m: linear_scan(plants, codes, m))
+        resolver_us = timed(resolver.resolve)
+        report.append({"plants": count, "aliases": len(aliases), "linear_scan_us": round(linear_us, 2),
+                       "automaton_us": round(resolver_us, 2), "speedup": round(linear_us / resolver_us, 2),
+                       "mismatches": mismatches})
+    print(json.dumps({"messages": len(messages), "results": report}, indent=2))
@@ -5,6 +5,7 @@ from datetime import timedelta
 import logging
 import os
 from flask_cors import CORS
+from sessionstore import create_session_store
 
 app = Flask(__name__)
 CORS(app)
@@ -24,15 +25,14 @@ logging.basicConfig(
     datefmt='%Y-%m-%d %H:%M:%S'
 )
 
-# Global session_data to track per user session
-session_data = {}
+# Per-user session data, bounded and expiring (see sessionstore.py)
+session_data = create_session_store("app")
 
 @app.before_request
 def before_request():
     if 'session_id' not in session:
         session['session_id'] = str(uuid.uuid4())
-    if session['session_id'] not in session_data:
-        session_data[session['session_id']] = {'entities': {}, 'history': []}
+    session_data.get_or_create(session['session_id'])
 
 @app.route("/")
 def index():
@@ -48,17 +48,12 @@ def chat():
         return jsonify({"response": "Please enter a valid question."})
   
     session_id = session.get('session_id')
-    if session_id not in session_data:
-        session_data[session_id] = {'entities': {}, 'history': []}
 
     # ----- Check for predefined response -----
     predefined_reply = get_response(user_query.lower())
     if predefined_reply:
         # Save to session history
-        session_data[session_id]['history'].append({
-            "user": user_query,
-            "bot": predefined_reply
-        })
+        session_data.append_turn(session_id, user_query, predefined_reply)
 
         # Log both user query and predefined response
         logging.info(
@@ -73,8 +68,6 @@ def chat():
 
     try:
         # ----- Normal bot logic -----
-        current_session = session_data[session_id]
-
         # Call bot response function
         bot_response = get_bot_response(user_query)
         print("Raw bot response:", bot_response)
@@ -94,10 +87,7 @@ def chat():
             formatted_response = "\n".join(cleaned_lines)
 
         # Save to history
-        current_session['history'].append({
-            "user": user_query,
-            "bot": formatted_response
-        })
+        session_data.append_turn(session_id, user_query, formatted_response)
 
         # Log both query and bot response
         logging.info(
@@ -144,7 +134,7 @@ def feedback():
 def clear_history():
     session_id = session.get('session_id')
     if session_id and session_id in session_data:
-        session_data[session_id] = {'entities': {}, 'history': []}
+        session_data.reset(session_id)
     return jsonify({"message": "Conversation history cleared."})
 
 if __name__ == "__main__":
@@ -0,0 +1,224 @@
+# ASGI entry point for the async chat pipeline. Serves the same /chat, /feedback and /clear_history
+# endpoints as main.py (same cookie session and JSON response shape), but awaits the LLM calls on a
+# pooled httpx client and runs the blocking MySQL work on a thread pool.
+# Run with:  hypercorn asgi_main:app --bind 0.0.0.0:8000
+import uuid
+import asyncio
+import logging
+from datetime import timedelta, datetime
+import httpx
+import mysql.connector
+from quart import Quart, request, jsonify, session, g, Response
+from quart_cors import cors
+from sqlgen import get_response, extract_plant_from_query
+from asyncpipeline import agenerate_sql_from_nl, aexecute_sql, agenerate_natural_language_response
+from llmclient import aclose_async_client
+from main import log_query_json, extract_vehicle_number, session_data
+from tracing import REQUEST_ID_HEADER, new_request_id, start_trace, finish_trace, stage
+from metrics import render_prometheus, PROMETHEUS_CONTENT_TYPE
+from retrieval import readiness
+
+app = cors(Quart(__name__))
+
+app.secret_key = "your_secret_key"
+app.permanent_session_lifetime = timedelta(minutes=30)
+
+
+def get_session():
+    """Gets or initializes the user session (stored in main.py's session store)."""
+    if 'session_id' not in session:
+        session['session_id'] = str(uuid.uuid4())
+
+    session_id = session['session_id']
+    current_session = session_data.get_or_create(session_id)
+
+    return session_id, current_session
+
+
+async def log_query_json_async(user_query, sql_query, bot_response, error=None, feedback=None):
+    """Queues the JSON log entry (never blocks the event loop), with the session fields resolved up front."""
+    log_query_json(user_query, sql_query, bot_response, error, feedback,
+                   session.get('session_id'), session.get('plant_code'))
+
+
+@app.before_request
+async def before_request():
+    """Ensure session is initialized before processing any request, and start its trace."""
+    g.trace = start_trace(new_request_id(request.headers.get(REQUEST_ID_HEADER)))
+    if request.endpoint not in ("metrics", "ready"):  # scrapes and probes should not create chat sessions
+        get_session()
+
+
+@app.after_request
+async def after_request(response):
+    """Returns the request id and records the request's total latency."""
+    trace = g.get("trace")
+    if trace is not None:
+        response.headers[REQUEST_ID_HEADER] = trace.request_id
+        finish_trace(trace, request.endpoint or "unknown")
+    return response
+
+
+@app.after_serving
+async def shutdown():
+    await aclose_async_client()
+
+
+@app.route("/chat", methods=["POST"])
+async def chat():
+    """Async version of main.chat: generate SQL, execute it and phrase the answer."""
+
+    data = await request.get_json()
+    user_query = data.get("query")
+    plant_code = data.get("plantCode")
+
+    session_id, current_session = get_session()
+
+    # Update plant code if provided
+    if plant_code:
+        session['plant_code'] = plant_code
+    else:
+        plant_code = session.get('plant_code')
+
+    if not plant_code:
+        return jsonify({"response": "Error: Plant code must be provided."}), 400
+
+    if not user_query:
+        return jsonify({"response": "Please enter a valid question."}), 400
+
+    vehicle_number = extract_vehicle_number(user_query)
+    if vehicle_number:
+        current_session['entities']['vehicle_number'] = vehicle_number
+        session_data.save(session_id, current_session)
+
+    logging.info(f"\n==== New Chat ====\nUser: {user_query}")
+
+    with stage("get_response"):
+        predefined_reply = get_response(user_query.lower())
+    if predefined_reply:
+        current_session['history'].append({"user": user_query, "bot": predefined_reply})
+        session_data.save(session_id, current_session)
+        await log_query_json_async(user_query, "N/A", predefined_reply)
+        return jsonify({"response": predefined_reply, "query": user_query})
+
+    with stage("extract_plant"):
+        queried_plant_code, queried_plant_name = extract_plant_from_query(user_query)
+
+    if queried_plant_code:
+        if queried_plant_code != session.get('plant_code'):
+            return jsonify({
+                "response": "Oops! It looks like you're trying to access information from a plant you're not authorized to. Please check the plant you're trying to query or contact support if you think there's a mistake."
+            }), 200
+        session['plant_code'] = queried_plant_code
+    else:
+        plant_code = session.get('plant_code')
+
+    try:
+        with stage("generate_sql"):
+            sql_query = await agenerate_sql_from_nl(user_query, plant_code=plant_code)
+
+        if sql_query.strip().lower().startswith("sorry") or "could you please clarify" in sql_query.lower():
+            await log_query_json_async(user_query, "N/A", sql_query)
+            return jsonify({"response": sql_query, "query": user_query}), 200
+
+        with stage("execute_sql"):
+            sql_result = await aexecute_sql(sql_query, plant_code=plant_code)
+        if "error" in sql_result:
+            logging.error(f"SQL Execution Error: {sql_result['error']}")
+            await log_query_json_async(user_query, sql_query, "Error in SQL execution", error=sql_result['error'])
+            return jsonify(
+                {"response": "Sorry, I encountered an error while querying the database.", "query": user_query}), 500
+
+        with stage("generate_nl"):
+            nl_response = await agenerate_natural_language_response(sql_result, user_query)
+        if nl_response.startswith("Error:"):
+            logging.error(f"NLG Error: {nl_response}")
+            await log_query_json_async(user_query, sql_query, "Error in NL generation", error=nl_response)
+            return jsonify({"response": "Sorry, I could not generate a response.", "query": user_query}), 500
+
+        current_session['history'].append({"user": user_query, "bot": nl_response})
+        session_data.save(session_id, current_session)
+        logging.info(f"Bot: {nl_response}")
+        await log_query_json_async(user_query, sql_query, nl_response)
+        return jsonify({"response": nl_response, "query": user_query})
+
+    except mysql.connector.Error as db_error:
+        logging.error(f"Database error: {str(db_error)}")
+        await log_query_json_async(user_query, "N/A", "Database Connection Error", error=str(db_error))
+        return jsonify({"response": "Sorry, I'm having trouble connecting to the database. Please try again later.",
+                        "query": user_query}), 500
+    except httpx.HTTPError as api_error:
+        logging.error(f"LLM API error: {str(api_error)}")
+        await log_query_json_async(user_query, "N/A", "LLM API Error", error=str(api_error))
+        return jsonify(
+            {"response": "Sorry, I'm unable to process your request due to an API issue. Please try again later.",
+             "query": user_query}), 500
+    except Exception as e:
+        logging.exception("An unexpected error occurred: ", exc_info=True)
+        await log_query_json_async(user_query, "N/A", "Unexpected Error", error=str(e))
+        return jsonify({"response": "Sorry, I cannot process your query at the moment. Please try again later.",
+                        "query": user_query}), 500
+
+
+def _append_feedback(file_name, feedback_entry):
+    with open(file_name, 'a') as f:
+        f.write(feedback_entry)
+
+
+@app.route("/feedback", methods=["POST"])
+async def feedback():
+    """Handles user feedback on bot responses."""
+    data = await request.get_json()
+    user_query = data.get("query")
+    bot_response = data.get("response")
+    feedback_type = data.get("feedback")
+
+    if not user_query or not bot_response or feedback_type not in [0, 1]:
+        return jsonify({"message": "Incomplete feedback data."}), 400
+
+    try:
+        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        feedback_entry = (
+            f"Timestamp: {timestamp}\n"
+            f"User Query: {user_query}\n"
+            f"Bot Response:\n{bot_response}\n"
+            f"Feedback: {'good' if feedback_type == 1 else 'bad'}\n"
+            f"{'-' * 50}\n"
+        )
+
+        file_name = 'good_feedback.txt' if feedback_type == 1 else 'bad_feedback.txt'
+        await asyncio.to_thread(_append_feedback, file_name, feedback_entry)
+
+        await log_query_json_async(user_query, None, bot_response,
+                                   feedback={'type': 'good' if feedback_type == 1 else 'bad'})
+
+        return jsonify({"message": "Feedback received. Thank You!"})
+
+    except Exception as e:
+        return jsonify({"message": f"Error: {str(e)}"}), 500
+
+
+@app.route("/metrics", methods=["GET"])
+async def metrics():
+    """Prometheus scrape endpoint (same histograms as main.py's /metrics)."""
+    return Response(render_prometheus(), content_type=PROMETHEUS_CONTENT_TYPE)
+
+
+@app.route("/ready", methods=["GET"])
+async def ready():
+    """Readiness probe (the warm-up is started by main.py, imported above)."""
+    status = readiness()
+    return jsonify(status), 200 if status["ready"] else 503
+
+
+@app.route("/clear_history", methods=["POST"])
+async def clear_history():
+    """Clears the conversation history for the current session."""
+    session_id, _ = get_session()
+    session_data.reset(session_id)
+    return jsonify({"message": "Conversation history cleared."}), 200
+
+
+if __name__ == "__main__":
+    print("Starting ASGI server on http://0.0.0.0:8000")
+    app.run(port=8000, host='0.0.0.0')
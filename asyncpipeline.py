@@ -0,0 +1,133 @@
+import time
+import asyncio
+import json
+import logging
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+import httpx
+from dbpool import DB_POOL_SIZE
+from llmclient import achat_completion, completion_content
+from eventlog import debug
+from sqlgen import (SQLGEN_GROQ_API_KEY, is_gibberish, lookup_cached_sql, build_sql_prompt, build_sql_payload,
+                    extract_sql_from_completion, postprocess_generated_sql, sql_cache, log_query, execute_sql,
+                    match_sql_template, SQL_PATH_LATENCY)
+from nlgen import (NLGEN_GROQ_API_KEY, build_nl_payload, finalize_nl_response, is_unhelpful_response,
+                   nl_cache, nl_cache_key, render_simple_response, NL_PATH_LATENCY)
+
+# Blocking DB calls run on a dedicated pool sized like the connection pool, so waiting
+# requests queue here instead of tying up the default executor
+_db_executor = ThreadPoolExecutor(max_workers=DB_POOL_SIZE, thread_name_prefix="db")
+
+
+async def aquery_groq_api(prompt):
+    """Async version of sqlgen.query_groq_api."""
+    try:
+        payload = build_sql_payload(prompt)
+        response = await achat_completion(payload, SQLGEN_GROQ_API_KEY)
+        response.raise_for_status()
+        content = completion_content(response, payload["model"])
+        return extract_sql_from_completion(content)
+    except httpx.HTTPError as e:
+        debug(f"Groq API error: {e}")
+        return "Error generating SQL query."
+
+
+async def agenerate_sql_from_nl(nl_query, session_history="", plant_code=None, entity_context=""):
+    """
+    Async version of sqlgen.generate_sql_from_nl.
+
+    The entity context is passed in explicitly because there is no Flask request context here.
+    Embedding/FAISS work for the cache and few-shot retrieval is CPU bound and runs in a thread.
+    """
+    if is_gibberish(nl_query):
+        debug("Detected gibberish:", nl_query)
+        return "Sorry, I didn't understand your request. Could you please clarify?"
+
+    start = time.perf_counter()
+    template_sql = match_sql_template(nl_query, plant_code)
+    if template_sql is not None:
+        SQL_PATH_LATENCY.observe("template", time.perf_counter() - start)
+        log_query(template_sql)
+        return template_sql
+
+    use_cache = bool(plant_code) and not session_history and not entity_context
+    if use_cache:
+        cached_sql = await asyncio.to_thread(lookup_cached_sql, nl_query, plant_code)
+        if cached_sql:
+            SQL_PATH_LATENCY.observe("cache", time.perf_counter() - start)
+            return cached_sql
+
+    full_prompt_content, sql_friendly_query = await asyncio.to_thread(
+        build_sql_prompt, nl_query, session_history, plant_code, entity_context)
+
+    sql_query = await aquery_groq_api(full_prompt_content)
+    debug(f"Generated SQL Query: {sql_query}")
+
+    sql_query, is_sql = postprocess_generated_sql(sql_query, sql_friendly_query, plant_code)
+    SQL_PATH_LATENCY.observe("llm", time.perf_counter() - start)
+    if not is_sql:
+        return sql_query
+
+    if use_cache:
+        sql_cache.put(nl_query, plant_code, sql_query)
+
+    log_query(sql_query)
+    return sql_query
+
+
+async def aexecute_sql(query, plant_code=None):
+    """Runs sqlgen.execute_sql (pooled, blocking driver) on the DB thread pool, in the request's trace context."""
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(_db_executor, context.run, execute_sql, query, plant_code)
+
+
+async def agenerate_natural_language_response(sql_result, user_query):
+    """Async version of nlgen.generate_natural_language_response."""
+    if "error" in sql_result:
+        return f"Sorry, there was an error: {sql_result['error']}"
+
+    columns = sql_result.get("columns", [])
+    data = sql_result.get("data", [])
+    truncated = sql_result.get("truncated", False)  # execute_sql hit its row/byte cap
+
+    if not columns or not data:
+        return "I found no matching results in the database."
+
+    start = time.perf_counter()
+    rendered_response = render_simple_response(columns, data, user_query, truncated=truncated)
+    if rendered_response is not None:
+        NL_PATH_LATENCY.observe("render", time.perf_counter() - start)
+        return rendered_response
+
+    cache_key = nl_cache_key(user_query, columns, data)
+    cached_response = nl_cache.get(cache_key)
+    if cached_response is not None:
+        NL_PATH_LATENCY.observe("cache", time.perf_counter() - start)
+        return cached_response
+
+    payload = build_nl_payload(columns, data, user_query, truncated=truncated)
+
+    try:
+        response = await achat_completion(payload, NLGEN_GROQ_API_KEY)
+        response.raise_for_status()
+        llm_response = completion_content(response, payload["model"]).strip()
+        NL_PATH_LATENCY.observe("llm", time.perf_counter() - start)
+        if not is_unhelpful_response(llm_response):
+            nl_cache.put(cache_key, llm_response)
+        return finalize_nl_response(llm_response)
+    except httpx.HTTPError as e:
+        error_message = f"Groq/Llama 3 API error: {e}"
+        debug(error_message)
+        logging.error(error_message)
+        return f"Error: I encountered an error communicating with the language model: {e}"
+    except json.JSONDecodeError as e:
+        error_message = f"JSON Decode Error: {e}.  Response Text: {response.text}"
+        debug(error_message)
+        logging.error(error_message)
+        return "Error: Invalid JSON response from Groq API."
+    except Exception as e:
+        error_message = f"Unexpected error in generate_natural_language_response: {e}"
+        debug(error_message)
+        logging.error(error_message)
+        return f"Error: An unexpected error occurred: {e}"
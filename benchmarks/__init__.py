@@ -0,0 +1,8 @@
+# Offline benchmark suite for the /chat pipeline (NL -> SQL -> MySQL -> NL).
+#
+# Replays questions from json.txt and recorded query_logs.jsonl traffic through main.app (or
+# asgi_main.app) with the LLM and MySQL replaced by deterministic local stand-ins, then reports
+# throughput, per-stage latency percentiles, allocations and peak RSS as JSON.
+#
+#   python -m benchmarks --requests 500 --concurrency 8 --output bench.json
+#   python -m benchmarks --compare bench.json --fail-on-regression
@@ -0,0 +1,213 @@
+import re
+import json
+import time
+import random
+import asyncio
+import zlib
+from datetime import datetime, timedelta
+from threading import Lock
+from contextvars import ContextVar
+import httpx
+import requests
+from requests.adapters import BaseAdapter
+
+SQL_MODEL = "gemma2-9b-it"
+DEFAULT_SQL = ("SELECT COUNT(DISTINCT vehicleNumber) AS vehicle_count FROM transactionalplms.vw_trip_info "
+               "WHERE mapPlantStageLocation = 'YARD-IN'")
+STUB_ANSWER = ("Sure! Here's the info you requested:\n"
+               "- {rows} records matched your question.\n"
+               "- The most recent one is listed first.\n"
+               "Hope this helps!")
+CHARS_PER_TOKEN = 4  # token usage reported by the stand-in LLM
+BASE_TIME = datetime(2024, 1, 1, 6, 0, 0)
+
+# SQL the stand-in SQL model answers for the request being replayed (set by the runner)
+_expected_sql = ContextVar("expected_sql", default=None)
+
+_SELECT_LIST = re.compile(r"^\s*SELECT\s+(?:/\*.*?\*/\s*)?(?:DISTINCT\s+)?(.*?)\s+FROM\s", re.IGNORECASE | re.DOTALL)
+_ALIAS = re.compile(r"\bAS\s+`?(\w+)`?\s*$", re.IGNORECASE)
+_AGGREGATE = re.compile(r"^\s*(?:COUNT|SUM|AVG|MIN|MAX)\s*\(", re.IGNORECASE)
+
+
+def expect_sql(sql):
+    """Sets the SQL the stand-in SQL model returns in this context; returns a token for reset_sql()."""
+    return _expected_sql.set(sql)
+
+
+def reset_sql(token):
+    _expected_sql.reset(token)
+
+
+class LatencyModel:
+    """Injected delay: ``mean`` seconds, spread by +/- ``jitter`` (a fraction) from a seeded generator."""
+
+    def __init__(self, mean, jitter=0.0, seed=0):
+        self.mean = mean
+        self.jitter = jitter
+        self._random = random.Random(seed)
+        self._lock = Lock()
+
+    def sample(self):
+        if self.mean <= 0:
+            return 0.0
+        if not self.jitter:
+            return self.mean
+        with self._lock:
+            factor = 1.0 + self._random.uniform(-self.jitter, self.jitter)
+        return max(self.mean * factor, 0.0)
+
+
+def stub_completion(payload):
+    """Deterministic chat completion: the expected SQL for the SQL model, a short answer otherwise."""
+    prompt = "".join(message.get("content", "") for message in payload.get("messages", []))
+    if payload.get("model") == SQL_MODEL:
+        content = f"```sql\n{_expected_sql.get() or DEFAULT_SQL}\n```"
+    else:
+        content = STUB_ANSWER.format(rows=prompt.count("\n") % 97 + 1)
+    return {
+        "choices": [{"message": {"role": "assistant", "content": content}}],
+        "usage": {"prompt_tokens": len(prompt) // CHARS_PER_TOKEN + 1,
+                  "completion_tokens": len(content) // CHARS_PER_TOKEN + 1},
+    }
+
+
+class StubLLMAdapter(BaseAdapter):
+    """requests transport that answers chat completions locally after the injected delay."""
+
+    def __init__(self, latency):
+        super().__init__()
+        self.latency = latency
+
+    def send(self, request, **kwargs):
+        time.sleep(self.latency.sample())
+        response = requests.Response()
+        response.status_code = 200
+        response._content = json.dumps(stub_completion(json.loads(request.body))).encode("utf-8")
+        response.headers["Content-Type"] = "application/json"
+        response.encoding = "utf-8"
+        response.url = request.url
+        response.request = request
+        return response
+
+    def close(self):
+        pass
+
+
+def async_stub_transport(latency):
+    """httpx transport with the same answers and (non-blocking) delay as StubLLMAdapter."""
+    async def handler(request):
+        await asyncio.sleep(latency.sample())
+        return httpx.Response(200, json=stub_completion(json.loads(request.content)))
+    return httpx.MockTransport(handler)
+
+
+def result_columns(sql):
+    """Output column names of a SELECT, read from its select list (aliases win)."""
+    match = _SELECT_LIST.match(sql)
+    if not match:
+        return ["value"], False
+    items, depth, current = [], 0, []
+    for ch in match.group(1):
+        if ch == "," and depth == 0:
+            items.append("".join(current))
+            current = []
+            continue
+        depth += (ch == "(") - (ch == ")")
+        current.append(ch)
+    items.append("".join(current))
+    columns = []
+    for item in items:
+        alias = _ALIAS.search(item)
+        name = alias.group(1) if alias else re.split(r"[.\s]", item.strip())[-1].strip("`") or "value"
+        columns.append(name)
+    single_row = all(_AGGREGATE.match(item) for item in items) and not re.search(r"\bGROUP\s+BY\b", sql, re.IGNORECASE)
+    return columns, single_row
+
+
+def fake_value(column, row):
+    """Deterministic value for a column, shaped by its name (timestamps, counts, weights, text)."""
+    lowered = column.lower()
+    if lowered.endswith(("in", "out", "time", "date", "weight")) and lowered not in ("weight", "tw", "gw"):
+        return BASE_TIME + timedelta(minutes=17 * row + zlib.crc32(column.encode()) % 60)
+    if "count" in lowered or lowered in ("tat", "total", "weight", "tw", "gw"):
+        return 10 + (zlib.crc32(f"{column}{row}".encode()) % 990)
+    return f"{column}-{row + 1}"
+
+
+class FakeCursor:
+    """Unbuffered-cursor stand-in: rows shaped like the query's select list, after the injected delay."""
+
+    def __init__(self, latency, rows):
+        self.latency = latency
+        self.result_rows = rows
+        self.description = None
+        self._rows = []
+
+    def execute(self, query, params=None):
+        time.sleep(self.latency.sample())  # blocking, like the real driver
+        columns, single_row = result_columns(query)
+        count = 1 if single_row else self.result_rows
+        self.description = [(column,) for column in columns]
+        self._rows = [tuple(fake_value(column, row) for column in columns) for row in range(count)]
+
+    def fetchall(self):
+        rows, self._rows = self._rows, []
+        return rows
+
+    def fetchmany(self, size=1):
+        rows, self._rows = self._rows[:size], self._rows[size:]
+        return rows
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    def __init__(self, latency, rows):
+        self.latency = latency
+        self.rows = rows
+
+    def cursor(self, *args, **kwargs):
+        return FakeCursor(self.latency, self.rows)
+
+    def is_connected(self):
+        return True
+
+    def close(self):
+        pass
+
+
+def install(llm_latency, db_latency, db_rows=20, db_pool_size=10, llm_fixtures=None, fixture_scale=1.0):
+    """
+    Points the app's LLM client (sync and async) and MySQL pool at the local stand-ins.
+
+    Args:
+        llm_latency (LatencyModel): Delay per LLM call.
+        db_latency (LatencyModel): Delay per query.
+        db_rows (int): Rows returned by non-aggregate queries.
+        db_pool_size (int): Size of the replacement connection pool.
+        llm_fixtures (str, optional): Recorded LLM fixtures to replay (see llmfixtures.py); calls
+            without a fixture fall through to the stand-in LLM.
+        fixture_scale (float): Multiplier on the recorded latencies (0 = no delay).
+
+    Returns:
+        FixtureStore or None: The replayed fixtures, for their hit/miss counters.
+    """
+    import llmclient
+    import sqlgen
+    from dbpool import ConnectionPool
+    from llmfixtures import FixtureStore, FixtureAdapter, AsyncFixtureTransport
+
+    session = llmclient.get_session()
+    adapter = StubLLMAdapter(llm_latency)
+    transport = async_stub_transport(llm_latency)
+    store = None
+    if llm_fixtures:
+        store = FixtureStore(llm_fixtures)
+        adapter = FixtureAdapter(store, "replay", adapter, scale=fixture_scale, on_miss="passthrough")
+        transport = AsyncFixtureTransport(store, "replay", transport, scale=fixture_scale, on_miss="passthrough")
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    llmclient.configure_async(transport)
+    sqlgen.db_pool = ConnectionPool(lambda: FakeConnection(db_latency, db_rows), size=db_pool_size)
+    return store
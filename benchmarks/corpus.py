@@ -0,0 +1,88 @@
+import json
+import random
+import logging
+
+VEHICLE_PLACEHOLDER = "[VEHICLE_NUMBER]"
+VEHICLE_LIST_PLACEHOLDER = "[VEHICLE_NUMBER_LIST]"
+STATE_CODES = ("MH", "KA", "HR", "PB", "JH", "HP")
+
+
+def vehicle_number(index):
+    """A deterministic, well-formed vehicle number for corpus entry ``index``."""
+    return f"{STATE_CODES[index % len(STATE_CODES)]}{index % 50 + 1:02d}AB{1000 + index % 9000:04d}"
+
+
+def fill_placeholders(question, sql, index):
+    """Replaces the json.txt vehicle placeholders with concrete values (the same ones in both texts)."""
+    first, second = vehicle_number(index), vehicle_number(index + 1)
+    question = question.replace(VEHICLE_LIST_PLACEHOLDER, f"{first}, {second}")
+    sql = sql.replace(VEHICLE_LIST_PLACEHOLDER, f"'{first}', '{second}'")
+    return question.replace(VEHICLE_PLACEHOLDER, first), sql.replace(VEHICLE_PLACEHOLDER, first)
+
+
+def load_examples(path="json.txt"):
+    """
+    Loads the few-shot examples as benchmark requests.
+
+    Returns:
+        list: {"query", "sql", "plant_code": None, "source": "json.txt"} per example; "sql" is
+              what the stubbed SQL model answers for it.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        examples = json.load(f)
+    corpus = []
+    for index, example in enumerate(examples):
+        question, sql = fill_placeholders(example["input"], example["output"], index)
+        corpus.append({"query": question, "sql": sql, "plant_code": None, "source": "json.txt"})
+    return corpus
+
+
+def load_query_log(path="query_logs.jsonl"):
+    """
+    Loads recorded chat traffic from the JSON query log.
+
+    Feedback events, malformed lines and entries without a question are skipped. The recorded SQL
+    (when there was one) becomes the stubbed SQL model's answer for that question.
+
+    Returns:
+        list: {"query", "sql", "plant_code", "source": "query_log"} per recorded question.
+    """
+    corpus = []
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            for line_number, line in enumerate(f, 1):
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    logging.warning(f"{path}:{line_number}: not JSON, skipped")
+                    continue
+                if not isinstance(entry, dict) or entry.get("feedback") or not entry.get("user_query"):
+                    continue
+                sql = entry.get("sql_query")
+                corpus.append({
+                    "query": entry["user_query"],
+                    "sql": sql if isinstance(sql, str) and sql.strip().lower().startswith("select") else None,
+                    "plant_code": entry.get("plant_code"),
+                    "source": "query_log",
+                })
+    except FileNotFoundError:
+        logging.warning(f"Query log '{path}' not found; benchmarking json.txt questions only")
+    return corpus
+
+
+def build_corpus(json_path="json.txt", log_path="query_logs.jsonl", limit=None, seed=0):
+    """
+    Combines json.txt examples and recorded traffic into one deterministic request corpus.
+
+    Args:
+        json_path (str): Few-shot examples file; empty to leave it out.
+        log_path (str): JSON query log; empty to leave it out.
+        limit (int, optional): Keep at most this many entries (after shuffling).
+        seed (int): Shuffle seed, so the same inputs always give the same order.
+
+    Returns:
+        list: Corpus entries (see load_examples / load_query_log).
+    """
+    corpus = (load_examples(json_path) if json_path else []) + (load_query_log(log_path) if log_path else [])
+    random.Random(seed).shuffle(corpus)
+    return corpus[:limit] if limit else corpus
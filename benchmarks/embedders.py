@@ -0,0 +1,138 @@
+import sys
+import json
+import time
+import argparse
+import faiss
+import numpy as np
+
+from metrics import percentile
+from embedders import create_embedder, parse_embedder_spec, CachedEmbedder
+from vectordb import load_examples
+
+
+def relevant_sets(examples):
+    """For each example, the positions of the examples asking the same question (json.txt repeats some)."""
+    by_question = {}
+    for position, (_key, _hash, _text, item) in enumerate(examples):
+        by_question.setdefault(" ".join(item["input"].lower().split()), set()).add(position)
+    return [by_question[" ".join(item["input"].lower().split())] for _key, _hash, _text, item in examples]
+
+
+def retrieval_quality(doc_vectors, query_vectors, relevant, k):
+    """
+    Searches every query against the examples, exactly (IndexFlatL2, as vectordb.py's default).
+
+    Returns:
+        tuple: ({"hit@1", f"hit@{k}", f"mrr@{k}"}, top-k positions per query).
+    """
+    index = faiss.IndexFlatL2(doc_vectors.shape[1])
+    index.add(doc_vectors)
+    _, found = index.search(query_vectors, k)
+    hit_1 = hit_k = reciprocal_rank = 0.0
+    for row, expected in zip(found, relevant):
+        ranks = [rank for rank, position in enumerate(row.tolist()) if position in expected]
+        if ranks:
+            hit_1 += ranks[0] == 0
+            hit_k += 1
+            reciprocal_rank += 1.0 / (ranks[0] + 1)
+    count = len(relevant)
+    return {"hit@1": round(hit_1 / count, 4), f"hit@{k}": round(hit_k / count, 4),
+            f"mrr@{k}": round(reciprocal_rank / count, 4)}, found
+
+
+def benchmark_embedder(spec, examples, k=3, batch_size=32, repeat=3, threads=0):
+    """
+    Measures one embedder on the json.txt corpus.
+
+    The examples are embedded as vectordb.py indexes them (instruction + input + output) and
+    queried with their bare questions, as a user would ask them.
+
+    Returns:
+        tuple: (result dict, top-k positions per query, for agreement with the reference embedder).
+    """
+    backend, location = parse_embedder_spec(spec)
+    start = time.perf_counter()
+    embedder = create_embedder(backend, location, threads=threads)
+    load_seconds = time.perf_counter() - start
+
+    texts = [text for _key, _hash, text, _item in examples]
+    questions = [item["input"] for _key, _hash, _text, item in examples]
+    embedder.encode(texts[:batch_size], batch_size)  # first calls allocate buffers and pick kernels
+
+    start = time.perf_counter()
+    doc_vectors = np.asarray(embedder.encode(texts, batch_size), dtype="float32")
+    index_seconds = time.perf_counter() - start
+
+    query_ms, query_vectors = [], []
+    for attempt in range(repeat):
+        for question in questions:
+            start = time.perf_counter()
+            vector = embedder.encode_one(question)
+            query_ms.append((time.perf_counter() - start) * 1000)
+            if attempt == 0:
+                query_vectors.append(vector)
+    query_vectors = np.asarray(query_vectors, dtype="float32")
+
+    cached = CachedEmbedder(embedder, size=len(questions))
+    for question in questions:
+        cached.encode_one(question)
+    cached_us = []
+    for question in questions:
+        start = time.perf_counter()
+        cached.encode_one(question)
+        cached_us.append((time.perf_counter() - start) * 1e6)
+
+    quality, found = retrieval_quality(doc_vectors, query_vectors, relevant_sets(examples), k)
+    return {
+        "embedder": spec,
+        "name": embedder.name,
+        "dimension": int(doc_vectors.shape[1]),
+        "load_sec": round(load_seconds, 3),
+        "index_texts_per_sec": round(len(texts) / index_seconds, 1) if index_seconds else 0.0,
+        "query_ms": {"p50": round(percentile(query_ms, 50), 2), "p95": round(percentile(query_ms, 95), 2),
+                     "p99": round(percentile(query_ms, 99), 2)},
+        "cached_query_us_p50": round(percentile(cached_us, 50), 1),
+        "quality": quality,
+    }, found
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.embedders",
+                                     description="Compare embedders on encode latency and json.txt retrieval quality.")
+    parser.add_argument("--embedder", action="append", dest="embedders",
+                        help='"sentence-transformers:<model>" or "onnx:<export dir>" (repeatable; the first is '
+                             'the reference for agreement). Default: mpnet and MiniLM.')
+    parser.add_argument("--corpus", default="json.txt")
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--repeat", type=int, default=3, help="Passes over the questions for query latency.")
+    parser.add_argument("--threads", type=int, default=0, help="ONNX Runtime intra-op threads (0 = default).")
+    parser.add_argument("--output", help="Write the JSON results to this file as well as stdout.")
+    args = parser.parse_args(argv)
+
+    specs = args.embedders or ["sentence-transformers:sentence-transformers/all-mpnet-base-v2",
+                               "sentence-transformers:sentence-transformers/all-MiniLM-L6-v2"]
+    examples = load_examples(args.corpus)
+    results, reference = [], None
+    for spec in specs:
+        result, found = benchmark_embedder(spec, examples, k=args.k, batch_size=args.batch_size,
+                                           repeat=args.repeat, threads=args.threads)
+        if reference is None:
+            reference = found
+        # Share of the reference embedder's top-k that this embedder also returns
+        overlap = [len(set(mine.tolist()) & set(theirs.tolist())) / len(theirs) for mine, theirs in zip(found, reference)]
+        result[f"agreement@{args.k}"] = round(sum(overlap) / len(overlap), 4)
+        results.append(result)
+        print(f"{spec}: query p50 {result['query_ms']['p50']} ms, hit@1 {result['quality']['hit@1']}", file=sys.stderr)
+
+    text = json.dumps({"benchmark": "embedders", "corpus": args.corpus, "examples": len(examples), "k": args.k,
+                       "results": results}, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,318 @@
+import os
+import io
+import sys
+import json
+import time
+import asyncio
+import argparse
+import platform
+import tempfile
+import threading
+import contextlib
+import subprocess
+import tracemalloc
+from collections import Counter
+from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor
+
+# Few-shot retrieval needs the embedding model, which is not what this suite measures
+os.environ.setdefault("FEW_SHOT_K", "0")
+# Replayed questions repeat; with the caches on most requests would never reach the stand-ins
+os.environ.setdefault("RESULT_CACHE", "0")
+os.environ.setdefault("NL_CACHE", "0")
+# Per-request debug lines would bury the report
+os.environ.setdefault("EVENT_LOG_DEBUG", "0")
+
+from metrics import percentile
+from benchmarks.corpus import build_corpus
+from benchmarks.backends import LatencyModel, install, expect_sql, reset_sql
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+RESULT_FORMAT_VERSION = 1
+WARMUP_PREFIX = "warmup-"
+REQUEST_PREFIX = "bench-"
+
+
+def git_commit():
+    """Current commit of the working tree, or None outside a git checkout."""
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              timeout=5, check=True).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def peak_rss_kb():
+    """Peak resident set size of this process in KiB (ru_maxrss is bytes on macOS, KiB on Linux)."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak // 1024 if sys.platform == "darwin" else peak
+
+
+def request_body(entry, default_plant_code):
+    return {"query": entry["query"], "plantCode": entry.get("plant_code") or default_plant_code}
+
+
+def run_flask(corpus, total, concurrency, plant_code, prefix):
+    """Sends ``total`` /chat requests (cycling the corpus) from ``concurrency`` threads to main.app."""
+    import main
+
+    lock = threading.Lock()
+    counter = iter(range(total))
+
+    def worker(_):
+        client = main.app.test_client()  # one cookie jar per simulated user
+        results = []
+        while True:
+            with lock:
+                index = next(counter, None)
+            if index is None:
+                return results
+            entry = corpus[index % len(corpus)]
+            token = expect_sql(entry.get("sql"))
+            start = time.perf_counter()
+            try:
+                response = client.post("/chat", json=request_body(entry, plant_code),
+                                       headers={"X-Request-ID": f"{prefix}{index}"})
+            finally:
+                reset_sql(token)
+            results.append((time.perf_counter() - start, response.status_code))
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        chunks = list(executor.map(worker, range(concurrency)))
+    return [item for chunk in chunks for item in chunk]
+
+
+async def run_asgi(corpus, total, concurrency, plant_code, prefix):
+    """Sends ``total`` /chat requests from ``concurrency`` tasks to asgi_main.app."""
+    import httpx
+    import asgi_main
+
+    counter = iter(range(total))
+
+    async def worker():
+        results = []
+        transport = httpx.ASGITransport(app=asgi_main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+            for index in counter:
+                entry = corpus[index % len(corpus)]
+                token = expect_sql(entry.get("sql"))
+                start = time.perf_counter()
+                try:
+                    response = await client.post("/chat", json=request_body(entry, plant_code),
+                                                 headers={"X-Request-ID": f"{prefix}{index}"})
+                finally:
+                    reset_sql(token)
+                results.append((time.perf_counter() - start, response.status_code))
+        return results
+
+    chunks = await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return [item for chunk in chunks for item in chunk]
+
+
+def send(app, corpus, total, concurrency, plant_code, prefix):
+    if app == "asgi":
+        return asyncio.run(run_asgi(corpus, total, concurrency, plant_code, prefix))
+    return run_flask(corpus, total, concurrency, plant_code, prefix)
+
+
+def read_traces(log_path, prefix):
+    """Per-request traces written to the JSON query log for requests whose id starts with prefix."""
+    traces = []
+    with open(log_path, "r", encoding="utf-8") as f:
+        for line in f:
+            trace = json.loads(line).get("trace") or {}
+            if str(trace.get("request_id", "")).startswith(prefix):
+                traces.append(trace)
+    return traces
+
+
+def distribution_ms(values):
+    return {
+        "count": len(values),
+        "mean": round(sum(values) / len(values) * 1000, 3) if values else 0.0,
+        "p50": round(percentile(values, 50) * 1000, 3),
+        "p95": round(percentile(values, 95) * 1000, 3),
+        "p99": round(percentile(values, 99) * 1000, 3),
+    }
+
+
+def run_benchmark(args):
+    """
+    Runs warm-up and measured requests against the selected app and collects the results.
+
+    Returns:
+        dict: Machine-readable results (see README); stable keys so runs can be diffed.
+    """
+    commit = git_commit()  # before leaving the repo directory
+    corpus = build_corpus(args.corpus, args.query_log, limit=args.corpus_limit, seed=args.seed)
+    if not corpus:
+        raise SystemExit("Benchmark corpus is empty")
+
+    # Import the apps from the repo directory, then let them write their logs into a scratch directory
+    with contextlib.redirect_stdout(io.StringIO()):
+        import main  # noqa: F401
+        if args.app == "asgi":
+            import asgi_main  # noqa: F401
+    import eventlog
+    fixtures = install(LatencyModel(args.llm_latency, args.jitter, args.seed),
+                       LatencyModel(args.db_latency, args.jitter, args.seed + 1),
+                       db_rows=args.db_rows, db_pool_size=args.db_pool_size,
+                       llm_fixtures=args.llm_fixtures, fixture_scale=args.llm_fixture_scale)
+    os.chdir(tempfile.mkdtemp(prefix="benchmark_"))
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        if args.warmup:
+            send(args.app, corpus, args.warmup, min(args.concurrency, args.warmup), args.plant_code, WARMUP_PREFIX)
+
+        if args.tracemalloc:
+            tracemalloc.start(args.tracemalloc_frames)
+        blocks_before = sys.getallocatedblocks()
+        start = time.perf_counter()
+        results = send(args.app, corpus, args.requests, args.concurrency, args.plant_code, REQUEST_PREFIX)
+        elapsed = time.perf_counter() - start
+        blocks_after = sys.getallocatedblocks()
+
+    memory = {
+        "peak_rss_kb": peak_rss_kb(),
+        "allocated_blocks_delta": blocks_after - blocks_before,
+    }
+    if args.tracemalloc:
+        current, peak = tracemalloc.get_traced_memory()
+        top = tracemalloc.take_snapshot().statistics("lineno")[:args.top_allocations]
+        tracemalloc.stop()
+        memory.update(tracemalloc_current_kb=current // 1024, tracemalloc_peak_kb=peak // 1024,
+                      top_allocations=[{"site": str(stat.traceback[0]), "size_kb": round(stat.size / 1024, 1),
+                                        "blocks": stat.count} for stat in top])
+
+    eventlog.get_writer(eventlog.QUERY_EVENT_LOG).flush()
+    traces = read_traces(eventlog.QUERY_EVENT_LOG, REQUEST_PREFIX)
+    stage_seconds = {}
+    for trace in traces:
+        for stage, seconds in trace.get("stages", {}).items():
+            stage_seconds.setdefault(stage, []).append(seconds)
+
+    latencies = [latency for latency, _status in results]
+    statuses = Counter(status for _latency, status in results)
+    return {
+        "format": RESULT_FORMAT_VERSION,
+        "benchmark": "chat",
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "git_commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": {
+            "app": args.app, "requests": args.requests, "concurrency": args.concurrency, "warmup": args.warmup,
+            "llm_latency": args.llm_latency, "db_latency": args.db_latency, "jitter": args.jitter,
+            "db_rows": args.db_rows, "db_pool_size": args.db_pool_size, "seed": args.seed,
+            "llm_fixtures": args.llm_fixtures, "llm_fixture_scale": args.llm_fixture_scale,
+            "env": {key: os.environ[key] for key in ("FEW_SHOT_K", "RESULT_CACHE", "NL_CACHE", "NL_RENDER_POLICY",
+                                                      "SQL_TEMPLATES", "SQL_CACHE_SEMANTIC") if key in os.environ},
+        },
+        "corpus": dict(Counter(entry["source"] for entry in corpus), total=len(corpus)),
+        "requests": len(results),
+        "statuses": {str(status): count for status, count in sorted(statuses.items())},
+        "elapsed_sec": round(elapsed, 3),
+        "req_per_sec": round(len(results) / elapsed, 2) if elapsed else 0.0,
+        "latency_ms": distribution_ms(latencies),
+        "stages_ms": {stage: distribution_ms(values) for stage, values in sorted(stage_seconds.items())},
+        "tokens": {
+            "prompt": sum(trace.get("prompt_tokens", 0) for trace in traces),
+            "completion": sum(trace.get("completion_tokens", 0) for trace in traces),
+            "llm_calls": sum(trace.get("llm_calls", 0) for trace in traces),
+        },
+        "db_rows": sum(trace.get("db_rows", 0) for trace in traces),
+        "llm_fixtures": fixtures.stats() if fixtures is not None else None,
+        "memory": memory,
+    }
+
+
+def compare(current, baseline, threshold_pct, min_ms=1.0):
+    """
+    Compares a run with a baseline run.
+
+    Throughput may not drop, and p95 latency (overall and per stage, ignoring stages faster than
+    min_ms in both runs) may not rise, by more than threshold_pct percent.
+
+    Returns:
+        tuple: (list of report lines, list of regression lines).
+    """
+    lines, regressions = [], []
+
+    def check(name, old, new, higher_is_better):
+        if not old:
+            return
+        change = (new - old) / old * 100
+        line = f"{name}: {old} -> {new} ({change:+.1f}%)"
+        lines.append(line)
+        worse = -change if higher_is_better else change
+        if worse > threshold_pct and (higher_is_better or max(old, new) >= min_ms):
+            regressions.append(line)
+
+    check("req_per_sec", baseline.get("req_per_sec"), current.get("req_per_sec"), True)
+    check("latency p95 ms", baseline.get("latency_ms", {}).get("p95"), current.get("latency_ms", {}).get("p95"), False)
+    for stage, stats in current.get("stages_ms", {}).items():
+        old = baseline.get("stages_ms", {}).get(stage, {}).get("p95")
+        check(f"{stage} p95 ms", old, stats["p95"], False)
+    check("peak_rss_kb", baseline.get("memory", {}).get("peak_rss_kb"), current.get("memory", {}).get("peak_rss_kb"), False)
+    return lines, regressions
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks",
+                                     description="Replay a question corpus through /chat with stubbed LLM and MySQL backends.")
+    parser.add_argument("--app", choices=["flask", "asgi"], default="flask", help="main.app or asgi_main.app.")
+    parser.add_argument("--corpus", default="json.txt", help="Few-shot examples to replay ('' to skip).")
+    parser.add_argument("--query-log", default="query_logs.jsonl", help="Recorded traffic to replay ('' to skip).")
+    parser.add_argument("--corpus-limit", type=int, default=None)
+    parser.add_argument("--requests", type=int, default=500, help="Measured requests (the corpus is cycled).")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--warmup", type=int, default=20, help="Unmeasured requests sent first.")
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="Seconds per stubbed LLM call.")
+    parser.add_argument("--db-latency", type=float, default=0.01, help="Seconds per stubbed query.")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Latency spread as a fraction of the mean.")
+    parser.add_argument("--llm-fixtures", help="Replay recorded LLM fixtures (llmfixtures.py) instead of the stub.")
+    parser.add_argument("--llm-fixture-scale", type=float, default=1.0,
+                        help="Multiplier on recorded LLM latencies (0 = no delay).")
+    parser.add_argument("--db-rows", type=int, default=20, help="Rows returned by non-aggregate queries.")
+    parser.add_argument("--db-pool-size", type=int, default=10)
+    parser.add_argument("--plant-code", default="NE03")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--tracemalloc", action="store_true", help="Trace allocations (slower; adds top sites).")
+    parser.add_argument("--tracemalloc-frames", type=int, default=1)
+    parser.add_argument("--top-allocations", type=int, default=10)
+    parser.add_argument("--output", help="Write the JSON results to this file as well as stdout.")
+    parser.add_argument("--compare", help="Baseline results file to compare against.")
+    parser.add_argument("--threshold", type=float, default=10.0, help="Allowed regression in percent.")
+    parser.add_argument("--fail-on-regression", action="store_true", help="Exit with status 1 on a regression.")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    baseline = None
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+    output = os.path.abspath(args.output) if args.output else None  # run_benchmark changes directory
+
+    results = run_benchmark(args)
+    text = json.dumps(results, indent=2)
+    print(text)
+    if output:
+        with open(output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+
+    if baseline is not None:
+        lines, regressions = compare(results, baseline, args.threshold)
+        print(f"\nCompared with {args.compare} (commit {baseline.get('git_commit')}):", file=sys.stderr)
+        for line in lines:
+            print(("REGRESSION " if line in regressions else "  ") + line, file=sys.stderr)
+        if regressions and args.fail_on_regression:
+            return 1
+    return 0
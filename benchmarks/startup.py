@@ -0,0 +1,119 @@
+import os
+import sys
+import json
+import argparse
+import subprocess
+
+from metrics import percentile
+
+# Runs in a fresh interpreter: import the app, then wait for the retrieval warm-up (see /ready)
+PROBE = """
+import sys, json, time
+start = time.perf_counter()
+import {module}
+imported = time.perf_counter()
+try:
+    from retrieval import readiness
+except ImportError:  # a tree without readiness reporting: ready once imported
+    readiness = lambda: {{"ready": True, "components": {{}}}}
+settled = lambda status: status["ready"] or not any(
+    component["state"] == "loading" for component in status["components"].values())
+while not settled(readiness()) and time.perf_counter() - imported < {ready_timeout}:
+    time.sleep(0.01)
+status = readiness()
+print(json.dumps({{"import_sec": imported - start, "ready_sec": time.perf_counter() - start,
+                  "ready": status["ready"], "components": status["components"]}}))
+"""
+
+
+def parse_importtime(stderr):
+    """
+    Parses ``python -X importtime`` output.
+
+    Returns:
+        dict: module -> (self microseconds, cumulative microseconds); first import of each module only.
+    """
+    modules = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        modules.setdefault(name.strip(), (int(self_us), int(cumulative_us)))
+    return modules
+
+
+def profile_once(module, ready_timeout, repo_dir):
+    """Starts one interpreter, imports ``module`` and returns its timings and per-module import profile."""
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [repo_dir, os.environ.get("PYTHONPATH")])))
+    env.setdefault("EVENT_LOG_DEBUG", "0")
+    completed = subprocess.run([sys.executable, "-X", "importtime", "-c",
+                                PROBE.format(module=module, ready_timeout=ready_timeout)],
+                               cwd=repo_dir, env=env, capture_output=True, text=True, check=True)
+    result = json.loads(completed.stdout.strip().splitlines()[-1])
+    result["modules"] = parse_importtime(completed.stderr)
+    return result
+
+
+def profile_startup(module="main", repeat=5, top=15, ready_timeout=120.0, repo_dir="."):
+    """
+    Measures cold start: time to import the app and time until /ready would report ready.
+
+    Args:
+        module (str): App module to import (main, asgi_main, chatbot, ...).
+        repeat (int): Fresh interpreters to start; timings are reported as p50/max.
+        top (int): Slowest modules (by self time, median over the runs) to list.
+        ready_timeout (float): Seconds to wait for the warm-up before giving up.
+        repo_dir (str): Directory the app is imported from.
+
+    Returns:
+        dict: Machine-readable results; the import profile excludes the interpreter's own startup.
+    """
+    runs = [profile_once(module, ready_timeout, os.path.abspath(repo_dir)) for _ in range(repeat)]
+    self_us = {}
+    for run in runs:
+        for name, (self_time, _cumulative) in run["modules"].items():
+            self_us.setdefault(name, []).append(self_time)
+    slowest = sorted(self_us.items(), key=lambda item: percentile(item[1], 50), reverse=True)[:top]
+    cumulative = {name: percentile([run["modules"][name][1] for run in runs if name in run["modules"]], 50)
+                  for name in self_us}
+
+    def timing(key):
+        values = [run[key] for run in runs]
+        return {"p50": round(percentile(values, 50) * 1000, 1), "max": round(max(values) * 1000, 1)}
+
+    return {
+        "benchmark": "startup",
+        "module": module,
+        "python": sys.version.split()[0],
+        "runs": repeat,
+        "import_ms": timing("import_sec"),
+        "ready_ms": timing("ready_sec"),
+        "ready": all(run["ready"] for run in runs),
+        "components": runs[-1]["components"],
+        "modules_imported": len(runs[-1]["modules"]),
+        "slowest_imports_ms": [{"module": name, "self": round(percentile(values, 50) / 1000, 1),
+                                "cumulative": round(cumulative[name] / 1000, 1)} for name, values in slowest],
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.startup",
+                                     description="Profile the app's cold start (imports and retrieval warm-up).")
+    parser.add_argument("--module", default="main", help="App module to import.")
+    parser.add_argument("--repeat", type=int, default=5, help="Fresh interpreters to start.")
+    parser.add_argument("--top", type=int, default=15, help="Slowest imports to list.")
+    parser.add_argument("--ready-timeout", type=float, default=120.0)
+    parser.add_argument("--output", help="Write the JSON results to this file as well as stdout.")
+    args = parser.parse_args(argv)
+
+    repo_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    text = json.dumps(profile_startup(args.module, args.repeat, args.top, args.ready_timeout, repo_dir), indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
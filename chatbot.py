@@ -15,18 +15,25 @@ import mysql.connector
 import requests
 import re
 import uuid
-import faiss
-import pickle
 from flask import Flask, request, jsonify, make_response, session
 from flask_session import Session
-from sentence_transformers import SentenceTransformer
 from dotenv import load_dotenv
 import logging
 import random
+from dbpool import ConnectionPool, PoolTimeoutError
+from llmclient import chat_completion, completion_content
+from retrieval import retrieve_examples, format_examples
+from sessionstore import create_session_store
+from historycompactor import compact_history
+from tokencount import record_prompt_tokens
+from columnmeta import COLUMN_METADATA
+from resultstream import StreamingResult
+from entityscanner import entity_scanner, convert_natural_dates
+from eventlog import log_line, debug, LogWriterHandler, QUERY_TEXT_LOG
  
 #Setup Logging
 logging.basicConfig(
-    filename="query_logs.txt",
+    handlers=[LogWriterHandler(QUERY_TEXT_LOG)],  # shares query_logs.txt (and its rotation) with log_line()
     level=logging.INFO,
     format="%(asctime)s - %(levelname)s - %(message)s",
 )
@@ -50,13 +57,9 @@ def format_sql_result(sql_result):
     return response
 
 def log_query(query):
-    """Log the generated SQL query with a proper tag."""
-    try:
-        with open("query_logs.txt", "a", encoding="utf-8") as f:
-            f.write(f"[SQL] Generated SQL: {query}\n")  # Correct way to write
-        print(f"Query logged: {query}")  # Debugging
-    except Exception as e:
-        print(f"Error writing to query_logs.txt: {e}")
+    """Log the generated SQL query with a proper tag (queued; written in batches by eventlog.py)."""
+    log_line(f"[SQL] Generated SQL: {query}")
+    debug(f"Query logged: {query}")  # Debugging
  
 def log_error(error_message):
     """Log any database or execution errors with an error tag."""
@@ -75,7 +78,7 @@ def save_session_history():
                 f.write(f"User: {entry['user']}\n")
                 f.write(f"Bot: {entry['bot']}\n\n")
  
-        print(f"Session history saved: {filename}")
+        debug(f"Session history saved: {filename}")
  
 # Load environment variables
 load_dotenv(dotenv_path=r'C:\Users\Saksh\chatbot2\.env', override=True)
@@ -87,18 +90,7 @@ app.config["SESSION_PERMANENT"] = False
 app.config["SESSION_TYPE"] = "filesystem"
 Session(app)
 
-# Load SentenceTransformer model
-embedding_model = SentenceTransformer('sentence-transformers/all-mpnet-base-v2')
- 
-# Load FAISS Index
-try:
-    index = faiss.read_index("plant_data.index")
-    with open("plant_data.metadata", "rb") as f:
-        metadata = pickle.load(f)
-    print("FAISS index loaded successfully.")
-except Exception as e:
-    print(f"Error loading FAISS index: {e}")
-    index, metadata = None, None
+# The SentenceTransformer model and FAISS few-shot index are loaded by retrieval.py on first use
 
 # Load credentials
 MYSQL_HOST = os.getenv("MYSQL_HOST")
@@ -106,11 +98,10 @@ MYSQL_USER = os.getenv("MYSQL_USER")
 MYSQL_PASSWORD = os.getenv("MYSQL_PASSWORD")
 MYSQL_DATABASE = os.getenv("MYSQL_DATABASE")
 GROQ_API_KEY = os.getenv("GROQ_API_KEY")
-LLM_API_ENDPOINT="https://api.groq.com/openai/v1/chat/completions"
 
-print("MYSQL_HOST:", MYSQL_HOST)
-print("MYSQL_USER:", MYSQL_USER)
-print("MYSQL_DATABASE:", MYSQL_DATABASE)
+debug("MYSQL_HOST:", MYSQL_HOST)
+debug("MYSQL_USER:", MYSQL_USER)
+debug("MYSQL_DATABASE:", MYSQL_DATABASE)
 
 # Database Schema (Now included)
 CACHED_DB_SCHEMA = """
@@ -118,58 +109,75 @@ The database 'defined database' has the following structure:
 
 """
  
+def open_db_connection():
+    """Open a new MySQL connection (raises mysql.connector.Error on failure)."""
+    # autocommit stops a reused connection from pinning one REPEATABLE READ snapshot across requests
+    return mysql.connector.connect(
+        host=MYSQL_HOST,
+        user=MYSQL_USER,
+        password=MYSQL_PASSWORD,
+        database=MYSQL_DATABASE,
+        autocommit=True
+    )
+
+# Shared connection pool; connections are opened lazily on first borrow
+db_pool = ConnectionPool(open_db_connection)
+
 def connect_db():
     """Establish a connection to the MySQL database."""
     try:
-        conn = mysql.connector.connect(
-            host=MYSQL_HOST,
-            user=MYSQL_USER,
-            password=MYSQL_PASSWORD,
-            database=MYSQL_DATABASE
-        )
+        conn = open_db_connection()
         return conn
     except mysql.connector.Error as e:
-        print(f"Database connection error: {e}")
+        debug(f"Database connection error: {e}")
         return None
  
-def execute_sql(query):
-    """Execute SQL query and return results as a dictionary."""
-    conn = connect_db()
-    if conn:
-        try:
-            cursor = conn.cursor()
-            cursor.execute(query)
-            results = cursor.fetchall()
-            column_names = [desc[0] for desc in cursor.description]
-            cursor.close()
-            conn.close()
-            return {"columns": column_names, "data": results}  # Corrected return
-        except Exception as e:
-            print(f"Database query error: {e}")
-            return {"columns": [], "data": [], "error": str(e)}
-    else:
-        print("Database connection failed.")
+def execute_sql(query, dedupe=False):
+    """Execute SQL query and return results as a dictionary (rows capped, see resultstream.py).
+
+    With dedupe=True, duplicate rows are dropped while fetching (first occurrence kept).
+    """
+    try:
+        conn = db_pool.acquire()
+    except (mysql.connector.Error, PoolTimeoutError) as e:
+        debug(f"Database connection failed: {e}")
         return {"columns": [], "data": [], "error": "Database connection failed."}
+
+    try:
+        cursor = conn.cursor(buffered=False)
+        cursor.execute(query)
+    except Exception as e:
+        db_pool.release(conn, discard=True)  # Only healthy connections go back into the pool
+        debug(f"Database query error: {e}")
+        return {"columns": [], "data": [], "error": str(e)}
+
+    try:
+        with StreamingResult(cursor, lambda discard: db_pool.release(conn, discard=discard)) as rows:
+            if not dedupe:
+                return rows.to_dict()
+            data = list(dict.fromkeys(tuple(row) for row in rows))
+            result = {"columns": rows.columns, "data": data}
+            if rows.truncated:
+                result.update(truncated=True, truncated_reason=rows.truncated_reason)
+            return result
+    except Exception as e:
+        debug(f"Database query error: {e}")
+        return {"columns": [], "data": [], "error": str(e)}
  
 def query_groq_api(prompt):
     """Send a prompt to the Groq API and extract the SQL query."""
-    url = "https://api.groq.com/openai/v1/chat/completions"
-    headers = {
-        "Authorization": f"Bearer {GROQ_API_KEY}",
-        "Content-Type": "application/json"
-    }
     data = {
         "model": "gemma2-9b-it",
         "messages": [{"role": "user", "content": prompt}]
     }
     try:
-        response = requests.post(url, headers=headers, json=data)
+        response = chat_completion(data, GROQ_API_KEY)
         response.raise_for_status()
-        content = response.json()['choices'][0]['message']['content']
+        content = completion_content(response, data["model"])
         sql_match = re.search(r"```sql\s*(.*?)\s*```", content, re.DOTALL)
         return sql_match.group(1).strip() if sql_match else content.strip()
     except requests.exceptions.RequestException as e:
-        print(f"Groq API error: {e}")
+        debug(f"Groq API error: {e}")
         return "Error generating SQL query."
 
 entity_aliases = """
@@ -181,29 +189,6 @@ entity_aliases = """
 """
 
 
-def convert_natural_dates(nl_query):
-    """Convert natural language date expressions into SQL-compatible DATE_SUB expressions."""
-    # Define common patterns for natural language dates
-    patterns = {
-        r"\b(last|past) (\d+) days?\b": r"DATE_SUB(NOW(), INTERVAL \2 DAY)",
-        r"\b(last|past) (\d+) weeks?\b": r"DATE_SUB(NOW(), INTERVAL \2 WEEK)",
-        r"\b(last|past) (\d+) months?\b": r"DATE_SUB(NOW(), INTERVAL \2 MONTH)",
-        r"\b(last|past) (\d+) years?\b": r"DATE_SUB(NOW(), INTERVAL \2 YEAR)",
-        r"last (\d+) days?": r"DATE_SUB(NOW(), INTERVAL \1 DAY)",
-        r"last (\d+) weeks?": r"DATE_SUB(NOW(), INTERVAL \1 WEEK)",
-        r"last (\d+) months?": r"DATE_SUB(NOW(), INTERVAL \1 MONTH)",
-        r"last (\d+) years?": r"DATE_SUB(NOW(), INTERVAL \1 YEAR)",
-        r"from (\d+) days? ago": r"DATE_SUB(NOW(), INTERVAL \1 DAY)",
-        r"from (\d+) weeks? ago": r"DATE_SUB(NOW(), INTERVAL \1 WEEK)",
-        r"from (\d+) months? ago": r"DATE_SUB(NOW(), INTERVAL \1 MONTH)",
-        r"from (\d+) years? ago": r"DATE_SUB(NOW(), INTERVAL \1 YEAR)",
-    }
- 
-    # Replace each pattern in the query with its corresponding SQL syntax
-    for pattern, replacement in patterns.items():
-        nl_query = re.sub(pattern, replacement, nl_query, flags=re.IGNORECASE)
- 
-    return nl_query
 
 def generate_sql_from_nl(nl_query, session_history=""):
     """Generate an SQL query from a natural language query using the correct schema."""
@@ -212,6 +197,9 @@ def generate_sql_from_nl(nl_query, session_history=""):
     # Build structured entity context
     entity_context = build_entity_context()
 
+    # Retrieve the closest few-shot examples from the FAISS index
+    few_shot_examples = format_examples(retrieve_examples(nl_query))
+
     prompt = f"""
 You are an SQL expert using MySQL. Based on the following database schema:
 
@@ -224,6 +212,8 @@ The following known entity values are available:
 **Entity Aliases:**
 {entity_aliases}
 
+{few_shot_examples}
+
 **Session History:**
 {session_history}
 
@@ -243,8 +233,10 @@ The following known entity values are available:
 - Use COALESCE(column, 0) for SUM().
 Generate a valid MySQL query.
 """
+    prompt_tokens = record_prompt_tokens("chatbot", prompt)
+    logging.info(f"SQL prompt tokens: {prompt_tokens}")
     sql_query = query_groq_api(prompt)
-    print(f"Generated SQL Query: {sql_query}")
+    debug(f"Generated SQL Query: {sql_query}")
     if not sql_query:
         return "Error: Could not generate SQL query due to LLM failure"
     
@@ -259,10 +251,6 @@ The retrieved data has the following columns: {', '.join(column_names)}.
 The data is: {data}.
 Please respond in a concise and natural language format, summarizing the key information for the user."""
 
-    headers = {
-        "Authorization": f"Bearer {GROQ_API_KEY}",
-        "Content-Type": "application/json"
-    }
     payload = {
         "model": "gemma2-9b-it",
         "messages": [{"role": "user", "content": prompt}],
@@ -271,12 +259,12 @@ Please respond in a concise and natural language format, summarizing the key inf
     }
  
     try:
-        response = requests.post(LLM_API_ENDPOINT, headers=headers, json=payload)
+        response = chat_completion(payload, GROQ_API_KEY)
         response.raise_for_status()
-        content = response.json()['choices'][0]['message']['content']
+        content = completion_content(response, payload["model"])
         return content.strip()
     except requests.exceptions.RequestException as e:
-        print(f"LLM API error: {e}")
+        debug(f"LLM API error: {e}")
         return "Error generating natural language response."
 
 def extract_vehicle_number(user_query):
@@ -379,61 +367,6 @@ def generate_follow_up_questions(user_query):
  
     return ["What else can I check?", "Do you need details for a different time period?", "Would you like a summary report?"]
 
-COLUMN_METADATA = {
-    "id": {"label": "ID", "type": "int"},
-    "tripId": {"label": "Trip ID", "type": "string"},
-    "plantCode": {"label": "Plant code", "type": "string"},
-    "plant_name": {"label": "Plant name", "type": "string"},
-    "movementCode": {"label": "Movement code", "type": "string"},
-    "TokenNumber": {"label": "Token number", "type": "string"},
-    "materialType": {"label": "Material type", "type": "string"},
-    "material_code": {"label": "Material code", "type": "string"},
-    "vehicleNumber": {"label": "Vehicle number", "type": "string"},
-    "chassis_number": {"label": "Chassis number", "type": "string"},
-    "vehicle_capacity_min": {"label": "Vehicle capacity (min)", "type": "float"},
-    "vehicle_capacity_max": {"label": "Vehicle capacity (max)", "type": "float"},
-    "vehicle_type": {"label": "Vehicle type", "type": "string"},
-    "transporter_name": {"label": "Transporter name", "type": "string"},
-    "country_code": {"label": "Country code", "type": "string"},
-    "mapPlantStageLocation": {"label": "Plant stage location", "type": "string"},
-    "weightType": {"label": "Weight type", "type": "string"},
-    "weighmentDate": {"label": "Weighment date", "type": "datetime"},
-    "weight": {"label": "Weight", "type": "float"},
-    "isToleranceFailed": {"label": "Tolerance failed", "type": "boolean"},
-    "weighbridgeCode": {"label": "Weighbridge code", "type": "string"},
-    "tolWeightLower": {"label": "Lower weight tolerance", "type": "float"},
-    "tolWeightUpper": {"label": "Upper weight tolerance", "type": "float"},
-    "tolerance_Type": {"label": "Tolerance type", "type": "string"},
-    "minimum_alert": {"label": "Minimum alert", "type": "string"},
-    "maximum_alert": {"label": "Maximum alert", "type": "string"},
-    "tolerance_validation": {"label": "Tolerance validation", "type": "string"},
-    "yardIn": {"label": "Yard-in time", "type": "datetime"},
-    "gateIn": {"label": "Gate-in time", "type": "datetime"},
-    "gateOut": {"label": "Gate-out time", "type": "datetime"},
-    "tareWeight": {"label": "Tare weight", "type": "datetime"},
-    "grossWeight": {"label": "Gross weight", "type": "datetime"},
-    "packingIn": {"label": "Packing-in time", "type": "datetime"},
-    "packingOut": {"label": "Packing-out time", "type": "datetime"},
-    "unloadingIn": {"label": "Unloading-in time", "type": "datetime"},
-    "unloadingOut": {"label": "Unloading-out time", "type": "datetime"},
-    "yardOut": {"label": "Yard-out time", "type": "datetime"},
-    "abortedTime": {"label": "Aborted time", "type": "datetime"},
-    "sealNumber": {"label": "Seal number", "type": "string"},
-    "tw": {"label": "Tare weight", "type": "float"},
-    "gw": {"label": "Gross weight", "type": "float"},
-    "igpNumber": {"label": "IGP number", "type": "string"},
-    "driverId": {"label": "Driver ID", "type": "string"},
-    "abortedRemarks": {"label": "Aborted remarks", "type": "string"},
-    "abortedBy": {"label": "Aborted by", "type": "string"},
-    "status": {"label": "Status", "type": "string"},
-    "dinumber": {"label": "DI number", "type": "string"},
-    "diqty": {"label": "DI quantity", "type": "float"},
-    "ponumber": {"label": "PO number", "type": "string"},
-    "po_qty": {"label": "PO quantity", "type": "float"},
-    "consignmentDate": {"label": "Consignment date", "type": "datetime"},
-    "cityName": {"label": "City name", "type": "string"},
-}
-
 # Initialize entity store
 def initialize_entity_store():
     if 'entities' not in session:
@@ -441,88 +374,35 @@ def initialize_entity_store():
     if 'last_entity' not in session:
         session['last_entity'] = None
 
-# Entity patterns
-entity_patterns = {
-    'tripId': r'trip\s*(?:id|identifier|number)?\s*(?:is|:)?\s*([\w\d\-]+)',
-    'plantCode': r'plant\s*code\s*(?:is|:)?\s*([\w\d\-]+)',
-    'plant_name': r'plant\s*name\s*(?:is|:)?\s*([\w\d\-]+)',
-    'movementCode': r'movement\s*code\s*(?:is|:)?\s*([\w\d\-]+)',
-    'TokenNumber': r'token\s*number\s*(?:is|:)?\s*([\w\d\-]+)',
-    'materialType': r'material\s*type\s*(?:is|:)?\s*([\w\d\-]+)',
-    'material_code': r'material\s*code\s*(?:is|:)?\s*([\w\d\-]+)',
-    'vehicleNumber': r'vehicle\s*number\s*(?:is|:)?\s*([\w\d\-]+)',
-    'chassis_number': r'chassis\s*number\s*(?:is|:)?\s*([\w\d\-]+)',
-    'vehicle_capacity_min': r'vehicle\s*capacity\s*min\s*(?:is|:)?\s*([\d\.]+)',
-    'vehicle_capacity_max': r'vehicle\s*capacity\s*max\s*(?:is|:)?\s*([\d\.]+)',
-    'vehicle_type': r'vehicle\s*type\s*(?:is|:)?\s*([\w\d\-]+)',
-    'transporter_name': r'transporter\s*name\s*(?:is|:)?\s*([\w\d\-]+)',
-    'country_code': r'country\s*code\s*(?:is|:)?\s*([\w\d\-]+)',
-    'mapPlantStageLocation': r'stage\s*location\s*(?:is|:)?\s*([\w\d\-]+)',
-    'yardIn': r'yard\s*in\s*(?:time)?\s*(?:is|:)?\s*([\w\d\-\:]+)',
-    'gateIn': r'gate\s*in\s*(?:time)?\s*(?:is|:)?\s*([\w\d\-\:]+)',
-    'gateOut': r'gate\s*out\s*(?:time)?\s*(?:is|:)?\s*([\w\d\-\:]+)',
-    'tareWeight': r'tare\s*weight\s*(?:time)?\s*(?:is|:)?\s*([\w\d\-\:\s]+)',
-    'grossWeight': r'gross\s*weight\s*(?:time)?\s*(?:is|:)?\s*([\w\d\-\:\s]+)',
-    'packingIn': r'packing\s*in\s*(?:time)?\s*(?:is|:)?\s*([\w\d\-\:]+)',
-    'packingOut': r'packing\s*out\s*(?:time)?\s*(?:is|:)?\s*([\w\d\-\:]+)',
-    'unloadingIn': r'unloading\s*in\s*(?:time)?\s*(?:is|:)?\s*([\w\d\-\:]+)',
-    'unloadingOut': r'unloading\s*out\s*(?:time)?\s*(?:is|:)?\s*([\w\d\-\:]+)',
-    'yardOut': r'yard\s*out\s*(?:time)?\s*(?:is|:)?\s*([\w\d\-\:]+)',
-    'abortedTime': r'aborted\s*time\s*(?:is|:)?\s*([\w\d\-\:]+)',
-    'weightType': r'weight\s*type\s*(?:is|:)?\s*([\w\d\-]+)',
-    'weighmentDate': r'weighment\s*date\s*(?:is|:)?\s*([\w\d\-\:]+)',
-    'weight': r'(?:measured\s*)?weight\s*(?:is|:)?\s*([\d\.]+)',
-    'isToleranceFailed': r'tolerance\s*(?:failed|status)?\s*(?:is|:)?\s*(true|false)',
-    'weighbridgeCode': r'weighbridge\s*code\s*(?:is|:)?\s*([\w\d\-]+)',
-    'tolWeightLower': r'lower\s*tolerance\s*(?:weight)?\s*(?:is|:)?\s*([\d\.]+)',
-    'tolWeightUpper': r'upper\s*tolerance\s*(?:weight)?\s*(?:is|:)?\s*([\d\.]+)',
-    'tolerance_Type': r'tolerance\s*type\s*(?:is|:)?\s*([\w\d\-]+)',
-    'minimum_alert': r'minimum\s*alert\s*(?:is|:)?\s*([\w\d\-]+)',
-    'maximum_alert': r'maximum\s*alert\s*(?:is|:)?\s*([\w\d\-]+)',
-    'tolerance_validation': r'tolerance\s*validation\s*(?:is|:)?\s*([\w\d\-]+)',
-    'sealNumber': r'seal\s*number\s*(?:is|:)?\s*([\w\d\-]+)',
-    'tw': r'tare\s*weight\s*(?:is|:)?\s*([\d\.]+)',
-    'gw': r'gross\s*weight\s*(?:is|:)?\s*([\d\.]+)',
-    'igpNumber': r'igp\s*number\s*(?:is|:)?\s*([\w\d\-]+)',
-    'driverId': r'driver\s*id\s*(?:is|:)?\s*([\w\d\-]+)',
-    'abortedRemarks': r'aborted\s*remarks\s*(?:is|:)?\s*([\w\d\s\-]+)',
-    'abortedBy': r'aborted\s*by\s*(?:is|:)?\s*([\w\d\-]+)',
-    'status': r'status\s*(?:is|:)?\s*([\w\d\-]+)',
-    'dinumber': r'di\s*number\s*(?:is|:)?\s*([\w\d\-]+)',
-    'diqty': r'di\s*quantity\s*(?:is|:)?\s*([\d\.]+)',
-    'ponumber': r'po\s*number\s*(?:is|:)?\s*([\w\d\-]+)',
-    'po_qty': r'po\s*quantity\s*(?:is|:)?\s*([\d\.]+)',
-    'consignmentDate': r'consignment\s*date\s*(?:is|:)?\s*([\w\d\-]+)',
-    'cityName': r'city\s*name\s*(?:is|:)?\s*([\w\d\s\-]+)',
-}
+PRONOUN_PATTERN = re.compile(r'\b(that|it)\b', re.IGNORECASE)
 
 def extract_entities(user_message):
     initialize_entity_store()
     
     session_id = session.get('session_id')  # Get session_id at the top!
+    current_session = session_data.get_or_create(session_id)
 
-    # Flag to check if entity found in this query
-    entity_found = False
-    
-    for entity, pattern in entity_patterns.items():
-        match = re.search(pattern, user_message, re.IGNORECASE)
-        if match:
-            value = match.group(1)
-            session_data[session_id]['entities'][entity] = value
-            session_data[session_id]['last_entity'] = entity
-            entity_found = True
+    # All entity patterns are matched in one scan (see entityscanner.py)
+    found_entities = entity_scanner.extract(user_message)
+    entity_found = bool(found_entities)
+    for entity, value in found_entities.items():
+        current_session['entities'][entity] = value
+        current_session['last_entity'] = entity
+
+    if entity_found:
+        session_data.save(session_id, current_session)
     
     # If no explicit entity found, check for pronouns (contextual reference)
     if not entity_found:
         # Replace pronouns like 'that', 'it' with last known entity value
-        if session_id and session_data[session_id].get('last_entity'):
-            ref_entity = session_data[session_id]['last_entity']
-            ref_value = session_data[session_id]['entities'].get(ref_entity, "")
+        if session_id and current_session.get('last_entity'):
+            ref_entity = current_session['last_entity']
+            ref_value = current_session['entities'].get(ref_entity, "")
             if ref_value:
-                user_message = re.sub(r'\b(that|it)\b', ref_value, user_message, flags=re.IGNORECASE)
+                user_message = PRONOUN_PATTERN.sub(ref_value, user_message)
     
     # Log the current entity store (for debugging)
-    print("Entity Store:", session_data[session_id]['entities'])
+    debug("Entity Store:", current_session['entities'])
     
     return user_message
 
@@ -549,20 +429,22 @@ def build_entity_context():
     session_id = session.get('session_id')  # Get session_id first
     
     entity_context_lines = []
-    for key, value in session_data[session_id]['entities'].items():
+    for key, value in session_data.get_or_create(session_id)['entities'].items():
         label = COLUMN_METADATA.get(key, {}).get('label', key)
         entity_context_lines.append(f"The {label} is {value}.")
     
     return "\n".join(entity_context_lines)
 
-# Initialize a global dictionary to store session data
-session_data = {}
+# Per-session entities and history, bounded and expiring (see sessionstore.py)
+session_data = create_session_store("chatbot")
 
 def get_session_entities():
-    return session_data[session['session_id']]['entities']
+    return session_data.get_or_create(session['session_id'])['entities']
 
 def update_session_entities(entity, value):
-    session_data[session['session_id']]['entities'][entity] = value
+    current_session = session_data.get_or_create(session['session_id'])
+    current_session['entities'][entity] = value
+    session_data.save(session['session_id'], current_session)
 
 def detect_context_switch(user_message):
     # Define a pattern to detect vehicle numbers (e.g., 'MP04HE4034')
@@ -574,16 +456,18 @@ def detect_context_switch(user_message):
         # Check if the detected vehicle number differs from the current context
         if entities.get('vehicleNumber') != vehicle_number:
             # Reset entity store for new context
-            session_data[session['session_id']]['entities'] = {'vehicleNumber': vehicle_number}
-            session_data[session['session_id']]['last_entity']='vehicleNumber'
+            current_session = session_data.get_or_create(session['session_id'])
+            current_session['entities'] = {'vehicleNumber': vehicle_number}
+            current_session['last_entity']='vehicleNumber'
+            session_data.save(session['session_id'], current_session)
             return True
     return False
 
 def update_conversation_history(user_message, bot_response):
-    session_data[session['session_id']]['history'].append({'user': user_message, 'bot': bot_response})
+    session_data.append_turn(session['session_id'], user_message, bot_response)
 
 def get_conversation_history():
-    return session_data[session['session_id']]['history']
+    return session_data.get_or_create(session['session_id'])['history']
 
 def get_bot_response(user_message):
     try:
@@ -592,16 +476,12 @@ def get_bot_response(user_message):
         if not session_id:
             session_id = str(uuid.uuid4())
             session['session_id'] = session_id
-        if session_id not in session_data:
-            session_data[session_id] = {'entities': {}, 'history': []}
+        session_data.get_or_create(session_id)
 
         # Check for predefined response
         predefined_reply = get_response(user_message.lower())
         if predefined_reply:
-            session_data[session_id]['history'].append({
-                "user": user_message,
-                "bot": predefined_reply
-            })
+            session_data.append_turn(session_id, user_message, predefined_reply)
             return predefined_reply
 
         # Initialize entity store
@@ -611,21 +491,19 @@ def get_bot_response(user_message):
         modified_message = extract_entities(user_message)
 
         # Retrieve session-based history
-        history_entries = session_data[session_id]['history']
-        session_history = "\n".join([
-            f"User: {entry['user']} | Bot: {entry['bot']}"
-            for entry in history_entries
-        ])
+        history_entries = session_data.get_or_create(session_id)['history']
 
-        # Build entity context
+        # Build entity context and fit the recent turns into the history token budget
         entity_context = build_entity_context()
-        combined_context = f"{session_history}\n\nEntity Context:\n{entity_context}"
+        combined_context, history_stats = compact_history(history_entries, entity_context)
+        logging.info(f"History: {history_stats['turns_kept']}/{history_stats['turns_total']} turns, "
+                     f"{history_stats['tokens']} tokens (uncompacted {history_stats['tokens_full']})")
 
         # Generate SQL query
         sql_query = generate_sql_from_nl(modified_message, session_history=combined_context)
 
-        # Execute SQL query
-        sql_result = execute_sql(sql_query)
+        # Execute SQL query (duplicate rows are dropped while fetching)
+        sql_result = execute_sql(sql_query, dedupe=True)
 
         if 'error' in sql_result:
             response = f"Error executing query: {sql_result['error']}"
@@ -636,18 +514,13 @@ def get_bot_response(user_message):
             if not data:
                 response = "I couldn't find any data matching your query."
             else:
-                unique_data = [list(row) for row in set(tuple(r) for r in data)]
-                cleaned_result = sql_result.copy()
-                cleaned_result['data'] = unique_data
-
                 # Generate natural response
-                response = generate_natural_response(cleaned_result, columns, modified_message)
+                response = generate_natural_response(sql_result, columns, modified_message)
+                if sql_result.get('truncated'):
+                    response += f"\n\n(Only the first {len(data)} rows were retrieved; the full result was larger.)"
 
         # Update history
-        session_data[session_id]['history'].append({
-            "user": user_message,
-            "bot": response
-        })
+        session_data.append_turn(session_id, user_message, response)
 
         return response
 
@@ -685,7 +558,7 @@ def chat():
     sql_query = generate_sql_from_nl(user_query, past_conversations)
     sql_result = execute_sql(sql_query)  
  
-    print(f"DEBUG: sql_result = {sql_result}")
+    debug(f"DEBUG: sql_result = {sql_result}")
  
     column_names = sql_result.get('columns', [])
     data = sql_result.get('data', [])
@@ -699,7 +572,7 @@ def chat():
  
     response_text = generate_natural_response({'columns': column_names, 'data': data}, column_names) # modified to pass the correct dictionary
  
-    print(f"DEBUG: response_text = {response_text}")  # Debugging line
+    debug(f"DEBUG: response_text = {response_text}")  # Debugging line
  
     # Generate related questions
     suggested_questions = generate_follow_up_questions(user_query)
@@ -708,7 +581,7 @@ def chat():
     session['history'].append({"user": user_query, "bot": response_text})
     session.modified = True  # Ensure session updates are saved
  
-    print(f"Follow-up questions generated: {suggested_questions}")  # Debugging log
+    debug(f"Follow-up questions generated: {suggested_questions}")  # Debugging log
  
     return make_response(jsonify({"response": response_text, "suggestions": suggested_questions}))
 
@@ -0,0 +1,55 @@
+# Display labels and value types for the columns of transactionalplms.vw_trip_info
+COLUMN_METADATA = {
+    "id": {"label": "ID", "type": "int"},
+    "tripId": {"label": "Trip ID", "type": "string"},
+    "plantCode": {"label": "Plant code", "type": "string"},
+    "plant_name": {"label": "Plant name", "type": "string"},
+    "movementCode": {"label": "Movement code", "type": "string"},
+    "TokenNumber": {"label": "Token number", "type": "string"},
+    "materialType": {"label": "Material type", "type": "string"},
+    "material_code": {"label": "Material code", "type": "string"},
+    "vehicleNumber": {"label": "Vehicle number", "type": "string"},
+    "chassis_number": {"label": "Chassis number", "type": "string"},
+    "vehicle_capacity_min": {"label": "Vehicle capacity (min)", "type": "float"},
+    "vehicle_capacity_max": {"label": "Vehicle capacity (max)", "type": "float"},
+    "vehicle_type": {"label": "Vehicle type", "type": "string"},
+    "transporter_name": {"label": "Transporter name", "type": "string"},
+    "country_code": {"label": "Country code", "type": "string"},
+    "mapPlantStageLocation": {"label": "Plant stage location", "type": "string"},
+    "weightType": {"label": "Weight type", "type": "string"},
+    "weighmentDate": {"label": "Weighment date", "type": "datetime"},
+    "weight": {"label": "Weight", "type": "float"},
+    "isToleranceFailed": {"label": "Tolerance failed", "type": "boolean"},
+    "weighbridgeCode": {"label": "Weighbridge code", "type": "string"},
+    "tolWeightLower": {"label": "Lower weight tolerance", "type": "float"},
+    "tolWeightUpper": {"label": "Upper weight tolerance", "type": "float"},
+    "tolerance_Type": {"label": "Tolerance type", "type": "string"},
+    "minimum_alert": {"label": "Minimum alert", "type": "string"},
+    "maximum_alert": {"label": "Maximum alert", "type": "string"},
+    "tolerance_validation": {"label": "Tolerance validation", "type": "string"},
+    "yardIn": {"label": "Yard-in time", "type": "datetime"},
+    "gateIn": {"label": "Gate-in time", "type": "datetime"},
+    "gateOut": {"label": "Gate-out time", "type": "datetime"},
+    "tareWeight": {"label": "Tare weight", "type": "datetime"},
+    "grossWeight": {"label": "Gross weight", "type": "datetime"},
+    "packingIn": {"label": "Packing-in time", "type": "datetime"},
+    "packingOut": {"label": "Packing-out time", "type": "datetime"},
+    "unloadingIn": {"label": "Unloading-in time", "type": "datetime"},
+    "unloadingOut": {"label": "Unloading-out time", "type": "datetime"},
+    "yardOut": {"label": "Yard-out time", "type": "datetime"},
+    "abortedTime": {"label": "Aborted time", "type": "datetime"},
+    "sealNumber": {"label": "Seal number", "type": "string"},
+    "tw": {"label": "Tare weight", "type": "float"},
+    "gw": {"label": "Gross weight", "type": "float"},
+    "igpNumber": {"label": "IGP number", "type": "string"},
+    "driverId": {"label": "Driver ID", "type": "string"},
+    "abortedRemarks": {"label": "Aborted remarks", "type": "string"},
+    "abortedBy": {"label": "Aborted by", "type": "string"},
+    "status": {"label": "Status", "type": "string"},
+    "dinumber": {"label": "DI number", "type": "string"},
+    "diqty": {"label": "DI quantity", "type": "float"},
+    "ponumber": {"label": "PO number", "type": "string"},
+    "po_qty": {"label": "PO quantity", "type": "float"},
+    "consignmentDate": {"label": "Consignment date", "type": "datetime"},
+    "cityName": {"label": "City name", "type": "string"},
+}
@@ -0,0 +1,210 @@
+import os
+import time
+import logging
+from contextlib import contextmanager
+from threading import Condition
+
+# Pool defaults (overridable through the environment)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))  # seconds to wait for a free connection
+DB_POOL_MAX_LIFETIME = float(os.getenv("DB_POOL_MAX_LIFETIME", "1800"))  # recycle connections after N seconds
+DB_POOL_HEALTH_CHECK = os.getenv("DB_POOL_HEALTH_CHECK", "1") not in ("0", "false", "False")
+
+
+class PoolTimeoutError(Exception):
+    """Raised when no connection becomes available within the borrow timeout."""
+
+
+class ConnectionPool:
+    """
+    Thread-safe pool of DB-API connections.
+
+    The pool is driver agnostic: ``connect_fn`` is any zero-argument callable returning a
+    connection object (``mysql.connector.connect`` in production, a fake driver in tests).
+    Connections are opened lazily, health-checked when borrowed and recycled once they
+    exceed ``max_lifetime`` seconds.
+
+    Args:
+        connect_fn (callable): Opens a new connection. Exceptions propagate to the borrower.
+        size (int): Maximum number of open connections.
+        timeout (float): Seconds to wait for a free connection before raising PoolTimeoutError.
+        max_lifetime (float): Seconds after which a connection is closed and replaced (0 disables).
+        health_check (bool): Ping idle connections before handing them out.
+    """
+
+    def __init__(self, connect_fn, size=DB_POOL_SIZE, timeout=DB_POOL_TIMEOUT,
+                 max_lifetime=DB_POOL_MAX_LIFETIME, health_check=DB_POOL_HEALTH_CHECK):
+        if size < 1:
+            raise ValueError("Pool size must be at least 1")
+        self._connect_fn = connect_fn
+        self.size = size
+        self.timeout = timeout
+        self.max_lifetime = max_lifetime
+        self.health_check = health_check
+
+        self._cond = Condition()
+        self._idle = []          # list of (connection, created_at), most recently used last
+        self._created_at = {}    # id(connection) -> created_at for every open connection
+        self._in_use = 0
+
+        # Metrics
+        self._stats = {
+            "created": 0,
+            "destroyed": 0,
+            "borrowed": 0,
+            "timeouts": 0,
+            "failed_health_checks": 0,
+            "recycled": 0,
+            "wait_time_total": 0.0,
+            "wait_time_max": 0.0,
+        }
+
+    # --- internal helpers (call with self._cond held unless noted) ---
+
+    def _open(self):
+        """Opens a new connection. Called WITHOUT the lock held; the slot is reserved by the caller."""
+        conn = self._connect_fn()
+        with self._cond:
+            self._created_at[id(conn)] = time.monotonic()
+            self._stats["created"] += 1
+        return conn
+
+    def _destroy(self, conn):
+        """Closes a connection and forgets it. Called WITHOUT the lock held."""
+        with self._cond:
+            self._created_at.pop(id(conn), None)
+            self._stats["destroyed"] += 1
+        try:
+            conn.close()
+        except Exception as e:
+            logging.warning(f"Error closing pooled connection: {e}")
+
+    def _is_expired(self, conn):
+        if not self.max_lifetime:
+            return False
+        created_at = self._created_at.get(id(conn), 0)
+        return time.monotonic() - created_at > self.max_lifetime
+
+    def _is_healthy(self, conn):
+        """Checks that the server still answers on this connection."""
+        try:
+            if hasattr(conn, "is_connected"):
+                return bool(conn.is_connected())
+            conn.ping()
+            return True
+        except Exception:
+            return False
+
+    # --- public API ---
+
+    def acquire(self):
+        """
+        Borrows a connection, opening a new one if the pool is not yet full.
+
+        Returns:
+            A live connection that must be handed back with release().
+
+        Raises:
+            PoolTimeoutError: If every connection stays busy for longer than the timeout.
+        """
+        start = time.monotonic()
+        deadline = start + self.timeout
+
+        with self._cond:
+            while not self._idle and self._in_use + len(self._idle) >= self.size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._stats["timeouts"] += 1
+                    raise PoolTimeoutError(
+                        f"Timed out after {self.timeout}s waiting for a database connection")
+                self._cond.wait(remaining)
+
+            # Reserve the slot before doing any I/O outside the lock
+            self._in_use += 1
+            conn = self._idle.pop()[0] if self._idle else None
+            expired = conn is not None and self._is_expired(conn)
+
+        if conn is not None:
+            if expired:
+                with self._cond:
+                    self._stats["recycled"] += 1
+                self._destroy(conn)
+                conn = None
+            elif self.health_check and not self._is_healthy(conn):
+                with self._cond:
+                    self._stats["failed_health_checks"] += 1
+                self._destroy(conn)
+                conn = None
+
+        if conn is None:
+            try:
+                conn = self._open()
+            except Exception:
+                with self._cond:
+                    self._in_use -= 1
+                    self._cond.notify()
+                raise
+
+        waited = time.monotonic() - start
+        with self._cond:
+            self._stats["borrowed"] += 1
+            self._stats["wait_time_total"] += waited
+            self._stats["wait_time_max"] = max(self._stats["wait_time_max"], waited)
+        return conn
+
+    def release(self, conn, discard=False):
+        """
+        Returns a borrowed connection to the pool.
+
+        Args:
+            conn: The connection obtained from acquire().
+            discard (bool): Close the connection instead of reusing it (e.g. after a driver error).
+        """
+        with self._cond:
+            expired = self._is_expired(conn)
+            if not discard and not expired:
+                self._idle.append((conn, self._created_at.get(id(conn), time.monotonic())))
+                conn = None
+            elif expired and not discard:
+                self._stats["recycled"] += 1
+            self._in_use -= 1
+            self._cond.notify()
+
+        if conn is not None:
+            self._destroy(conn)
+
+    @contextmanager
+    def connection(self):
+        """Context manager that borrows a connection and discards it if the block raises."""
+        conn = self.acquire()
+        try:
+            yield conn
+        except BaseException:
+            self.release(conn, discard=True)
+            raise
+        else:
+            self.release(conn)
+
+    def close_all(self):
+        """Closes every idle connection. Borrowed connections are closed when released."""
+        with self._cond:
+            idle, self._idle = self._idle, []
+        for conn, _ in idle:
+            self._destroy(conn)
+
+    def metrics(self):
+        """
+        Returns a snapshot of the pool counters.
+
+        Returns:
+            dict: size, in_use, idle, created, destroyed, borrowed, timeouts, failed_health_checks,
+                  recycled, wait_time_total, wait_time_max and wait_time_avg (seconds).
+        """
+        with self._cond:
+            snapshot = dict(self._stats)
+            snapshot["size"] = self.size
+            snapshot["in_use"] = self._in_use
+            snapshot["idle"] = len(self._idle)
+        borrowed = snapshot["borrowed"]
+        snapshot["wait_time_avg"] = snapshot["wait_time_total"] / borrowed if borrowed else 0.0
+        return snapshot
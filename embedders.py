@@ -0,0 +1,275 @@
+import os
+import json
+import argparse
+from collections import OrderedDict
+from threading import Lock
+import numpy as np
+
+BACKENDS = ("sentence-transformers", "onnx")
+ONNX_CONFIG_FILE = "embedder.json"  # written next to the model by export_onnx()
+
+
+class Embedder:
+    """
+    Turns texts into unit-length float32 vectors.
+
+    Attributes:
+        name (str): Model and runtime; vectordb.py rebuilds the index when it changes.
+    """
+
+    name = "embedder"
+
+    def encode(self, texts, batch_size=32):
+        """Returns a (len(texts), dimension) float32 array of unit-length rows."""
+        raise NotImplementedError
+
+    def encode_one(self, text):
+        """Embeds a single text (the per-request query path)."""
+        return self.encode([text])[0]
+
+
+class SentenceTransformerEmbedder(Embedder):
+    """A sentence-transformers model run through PyTorch (needs sentence-transformers)."""
+
+    def __init__(self, model_name):
+        from sentence_transformers import SentenceTransformer
+        self.model = SentenceTransformer(model_name)
+        self.name = model_name
+
+    def encode(self, texts, batch_size=32):
+        vectors = self.model.encode(list(texts), batch_size=batch_size, normalize_embeddings=True,
+                                    show_progress_bar=False)
+        return np.asarray(vectors, dtype="float32")
+
+
+class ONNXEmbedder(Embedder):
+    """
+    A model exported by export_onnx(), run with ONNX Runtime on the CPU.
+
+    Serving needs only onnxruntime and tokenizers (no PyTorch). Pooling and normalization match
+    the sentence-transformers pipeline, so an fp32 export gives the same vectors as the original.
+    """
+
+    def __init__(self, path, threads=0):
+        import onnxruntime
+        from tokenizers import Tokenizer
+
+        with open(os.path.join(path, ONNX_CONFIG_FILE), "r", encoding="utf-8") as f:
+            self.config = json.load(f)
+        self.name = onnx_embedder_name(self.config)
+        self.pooling = self.config.get("pooling", "mean")
+        self.dimension = self.config["dimension"]
+        self.tokenizer = Tokenizer.from_file(os.path.join(path, "tokenizer.json"))
+        self.tokenizer.enable_truncation(self.config["max_length"])
+        self.tokenizer.enable_padding(pad_id=self.config.get("pad_id", 0), pad_token=self.config.get("pad_token", "[PAD]"))
+
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = onnxruntime.InferenceSession(os.path.join(path, self.config["file"]), options,
+                                                    providers=["CPUExecutionProvider"])
+        self.input_names = {model_input.name for model_input in self.session.get_inputs()}
+
+    def encode(self, texts, batch_size=32):
+        texts = list(texts)
+        if not texts:
+            return np.zeros((0, self.dimension), dtype="float32")
+        pooled = []
+        for start in range(0, len(texts), batch_size):
+            encodings = self.tokenizer.encode_batch(texts[start:start + batch_size])
+            input_ids = np.array([encoding.ids for encoding in encodings], dtype="int64")
+            attention_mask = np.array([encoding.attention_mask for encoding in encodings], dtype="int64")
+            feeds = {"input_ids": input_ids, "attention_mask": attention_mask}
+            if "token_type_ids" in self.input_names:
+                feeds["token_type_ids"] = np.zeros_like(input_ids)
+            hidden = self.session.run(None, feeds)[0]  # (batch, tokens, dimension)
+            if self.pooling == "cls":
+                pooled.append(hidden[:, 0])
+            else:
+                mask = attention_mask[..., None].astype("float32")
+                pooled.append((hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None))
+        vectors = np.vstack(pooled).astype("float32")
+        return vectors / np.clip(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12, None)
+
+
+class CachedEmbedder(Embedder):
+    """
+    LRU cache of single-text embeddings in front of another embedder.
+
+    Questions repeat across users, and each request embeds its question twice (semantic SQL cache
+    and few-shot retrieval). Batch encodes (index builds) bypass the cache. Cached vectors are
+    shared between callers and therefore read-only.
+    """
+
+    def __init__(self, inner, size=1024):
+        self.inner = inner
+        self.name = inner.name
+        self.size = size
+        self._cache = OrderedDict()
+        self._lock = Lock()
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+    def encode(self, texts, batch_size=32):
+        return self.inner.encode(texts, batch_size)
+
+    def encode_one(self, text):
+        with self._lock:
+            vector = self._cache.get(text)
+            if vector is not None:
+                self._cache.move_to_end(text)
+                self._stats["hits"] += 1
+                return vector
+            self._stats["misses"] += 1
+
+        vector = np.asarray(self.inner.encode_one(text), dtype="float32")
+        vector.setflags(write=False)
+        with self._lock:
+            self._cache[text] = vector
+            self._cache.move_to_end(text)
+            while len(self._cache) > self.size:
+                self._cache.popitem(last=False)
+                self._stats["evictions"] += 1
+        return vector
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+
+    def stats(self):
+        """Returns hit/miss/eviction counters and the current and maximum number of entries."""
+        with self._lock:
+            return dict(self._stats, entries=len(self._cache), capacity=self.size)
+
+
+def onnx_embedder_name(config):
+    return f"{config['model']} (onnx{', int8' if config.get('quantized') else ''})"
+
+
+def embedder_name(backend, location):
+    """
+    The name an embedder will report, without loading it (vectordb.py compares it with its manifest).
+
+    Args:
+        backend (str): "sentence-transformers" or "onnx".
+        location (str): Model name, or the export directory for onnx.
+    """
+    if backend == "onnx":
+        with open(os.path.join(location, ONNX_CONFIG_FILE), "r", encoding="utf-8") as f:
+            return onnx_embedder_name(json.load(f))
+    return location
+
+
+def create_embedder(backend, location, threads=0):
+    """
+    Loads an embedder.
+
+    Args:
+        backend (str): "sentence-transformers" (location is a model name) or "onnx" (location is
+            a directory written by export_onnx()).
+        location (str): Model name or export directory.
+        threads (int): ONNX Runtime intra-op threads (0 = its default).
+
+    Returns:
+        Embedder: The loaded embedder.
+    """
+    if backend == "sentence-transformers":
+        return SentenceTransformerEmbedder(location)
+    if backend == "onnx":
+        return ONNXEmbedder(location, threads=threads)
+    raise ValueError(f"Unknown embedder backend '{backend}' (expected one of: {', '.join(BACKENDS)})")
+
+
+def parse_embedder_spec(spec):
+    """Splits "backend:location" (e.g. "onnx:models/minilm-int8"); a bare model name means sentence-transformers."""
+    backend, sep, location = spec.partition(":")
+    if sep and backend in BACKENDS:
+        return backend, location
+    return "sentence-transformers", spec
+
+
+def _max_seq_length(model_name, tokenizer):
+    """The model's sentence-transformers max_seq_length, else the tokenizer's own limit."""
+    try:
+        from transformers.utils import cached_file
+        with open(cached_file(model_name, "sentence_bert_config.json"), "r", encoding="utf-8") as f:
+            return int(json.load(f)["max_seq_length"])
+    except Exception:
+        pass
+    limit = tokenizer.model_max_length
+    return limit if 0 < limit <= 100000 else 512  # tokenizers without a limit report a huge sentinel
+
+
+def export_onnx(model_name, output_dir, quantize=True, max_length=None, pooling="mean", opset=17):
+    """
+    Exports a sentence-transformers model to ONNX for ONNXEmbedder.
+
+    Needs torch and transformers (and onnxruntime for quantize); serving the export does not.
+    Quantization is dynamic int8 on the weights, which shrinks the model about 4x and speeds up
+    CPU inference; check its retrieval quality with ``python -m benchmarks.embedders``.
+
+    Args:
+        model_name (str): Hugging Face model, e.g. "sentence-transformers/all-MiniLM-L6-v2".
+        output_dir (str): Directory for the model, tokenizer.json and embedder.json.
+        quantize (bool): Also write and use an int8 copy of the model.
+        max_length (int, optional): Tokens kept per text. Defaults to the model's sentence-transformers
+            max_seq_length (e.g. 384 for all-mpnet-base-v2, 256 for all-MiniLM-L6-v2), so the export
+            truncates as the original does.
+        pooling (str): "mean" (the sentence-transformers default) or "cls".
+        opset (int): ONNX opset version.
+
+    Returns:
+        str: output_dir.
+    """
+    import torch
+    from transformers import AutoModel, AutoTokenizer
+
+    os.makedirs(output_dir, exist_ok=True)
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    model = AutoModel.from_pretrained(model_name).eval()
+    if max_length is None:
+        max_length = _max_seq_length(model_name, tokenizer)
+    sample = tokenizer(["warm-up"], return_tensors="pt")
+    model_path = os.path.join(output_dir, "model.onnx")
+    axes = {0: "batch", 1: "tokens"}
+    with torch.no_grad():
+        torch.onnx.export(model, (sample["input_ids"], sample["attention_mask"]), model_path,
+                          input_names=["input_ids", "attention_mask"], output_names=["last_hidden_state"],
+                          dynamic_axes={"input_ids": axes, "attention_mask": axes, "last_hidden_state": axes},
+                          opset_version=opset)
+
+    model_file = "model.onnx"
+    if quantize:
+        from onnxruntime.quantization import quantize_dynamic, QuantType
+        quantize_dynamic(model_path, os.path.join(output_dir, "model.int8.onnx"), weight_type=QuantType.QInt8)
+        model_file = "model.int8.onnx"
+
+    tokenizer.save_pretrained(output_dir)  # includes tokenizer.json (fast tokenizer)
+    config = {
+        "model": model_name,
+        "file": model_file,
+        "quantized": quantize,
+        "pooling": pooling,
+        "max_length": max_length,
+        "dimension": model.config.hidden_size,
+        "pad_id": tokenizer.pad_token_id,
+        "pad_token": tokenizer.pad_token,
+    }
+    with open(os.path.join(output_dir, ONNX_CONFIG_FILE), "w", encoding="utf-8") as f:
+        json.dump(config, f, indent=2)
+    return output_dir
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export a sentence-transformers model to ONNX for CPU serving.")
+    parser.add_argument("model", help='e.g. "sentence-transformers/all-MiniLM-L6-v2"')
+    parser.add_argument("output_dir")
+    parser.add_argument("--no-quantize", action="store_true", help="Keep fp32 weights.")
+    parser.add_argument("--max-length", type=int, help="Tokens kept per text (default: the model's max_seq_length).")
+    parser.add_argument("--pooling", choices=["mean", "cls"], default="mean")
+    args = parser.parse_args()
+
+    export_onnx(args.model, args.output_dir, quantize=not args.no_quantize, max_length=args.max_length,
+                pooling=args.pooling)
+    print(f"Exported {args.model} to {args.output_dir}; serve it with EMBEDDER_BACKEND=onnx "
+          f"EMBEDDING_ONNX_PATH={args.output_dir}")
@@ -0,0 +1,230 @@
+import re
+import time
+
+# Entity patterns: column name -> regex whose first group is the value (matched case-insensitively)
+ENTITY_PATTERNS = {
+    'tripId': r'trip\s*(?:id|identifier|number)?\s*(?:is|:)?\s*([\w\d\-]+)',
+    'plantCode': r'plant\s*code\s*(?:is|:)?\s*([\w\d\-]+)',
+    'plant_name': r'plant\s*name\s*(?:is|:)?\s*([\w\d\-]+)',
+    'movementCode': r'movement\s*code\s*(?:is|:)?\s*([\w\d\-]+)',
+    'TokenNumber': r'token\s*number\s*(?:is|:)?\s*([\w\d\-]+)',
+    'materialType': r'material\s*type\s*(?:is|:)?\s*([\w\d\-]+)',
+    'material_code': r'material\s*code\s*(?:is|:)?\s*([\w\d\-]+)',
+    'vehicleNumber': r'vehicle\s*number\s*(?:is|:)?\s*([\w\d\-]+)',
+    'chassis_number': r'chassis\s*number\s*(?:is|:)?\s*([\w\d\-]+)',
+    'vehicle_capacity_min': r'vehicle\s*capacity\s*min\s*(?:is|:)?\s*([\d\.]+)',
+    'vehicle_capacity_max': r'vehicle\s*capacity\s*max\s*(?:is|:)?\s*([\d\.]+)',
+    'vehicle_type': r'vehicle\s*type\s*(?:is|:)?\s*([\w\d\-]+)',
+    'transporter_name': r'transporter\s*name\s*(?:is|:)?\s*([\w\d\-]+)',
+    'country_code': r'country\s*code\s*(?:is|:)?\s*([\w\d\-]+)',
+    'mapPlantStageLocation': r'stage\s*location\s*(?:is|:)?\s*([\w\d\-]+)',
+    'yardIn': r'yard\s*in\s*(?:time)?\s*(?:is|:)?\s*([\w\d\-\:]+)',
+    'gateIn': r'gate\s*in\s*(?:time)?\s*(?:is|:)?\s*([\w\d\-\:]+)',
+    'gateOut': r'gate\s*out\s*(?:time)?\s*(?:is|:)?\s*([\w\d\-\:]+)',
+    'tareWeight': r'tare\s*weight\s*(?:time)?\s*(?:is|:)?\s*([\w\d\-\:\s]+)',
+    'grossWeight': r'gross\s*weight\s*(?:time)?\s*(?:is|:)?\s*([\w\d\-\:\s]+)',
+    'packingIn': r'packing\s*in\s*(?:time)?\s*(?:is|:)?\s*([\w\d\-\:]+)',
+    'packingOut': r'packing\s*out\s*(?:time)?\s*(?:is|:)?\s*([\w\d\-\:]+)',
+    'unloadingIn': r'unloading\s*in\s*(?:time)?\s*(?:is|:)?\s*([\w\d\-\:]+)',
+    'unloadingOut': r'unloading\s*out\s*(?:time)?\s*(?:is|:)?\s*([\w\d\-\:]+)',
+    'yardOut': r'yard\s*out\s*(?:time)?\s*(?:is|:)?\s*([\w\d\-\:]+)',
+    'abortedTime': r'aborted\s*time\s*(?:is|:)?\s*([\w\d\-\:]+)',
+    'weightType': r'weight\s*type\s*(?:is|:)?\s*([\w\d\-]+)',
+    'weighmentDate': r'weighment\s*date\s*(?:is|:)?\s*([\w\d\-\:]+)',
+    'weight': r'(?:measured\s*)?weight\s*(?:is|:)?\s*([\d\.]+)',
+    'isToleranceFailed': r'tolerance\s*(?:failed|status)?\s*(?:is|:)?\s*(true|false)',
+    'weighbridgeCode': r'weighbridge\s*code\s*(?:is|:)?\s*([\w\d\-]+)',
+    'tolWeightLower': r'lower\s*tolerance\s*(?:weight)?\s*(?:is|:)?\s*([\d\.]+)',
+    'tolWeightUpper': r'upper\s*tolerance\s*(?:weight)?\s*(?:is|:)?\s*([\d\.]+)',
+    'tolerance_Type': r'tolerance\s*type\s*(?:is|:)?\s*([\w\d\-]+)',
+    'minimum_alert': r'minimum\s*alert\s*(?:is|:)?\s*([\w\d\-]+)',
+    'maximum_alert': r'maximum\s*alert\s*(?:is|:)?\s*([\w\d\-]+)',
+    'tolerance_validation': r'tolerance\s*validation\s*(?:is|:)?\s*([\w\d\-]+)',
+    'sealNumber': r'seal\s*number\s*(?:is|:)?\s*([\w\d\-]+)',
+    'tw': r'tare\s*weight\s*(?:is|:)?\s*([\d\.]+)',
+    'gw': r'gross\s*weight\s*(?:is|:)?\s*([\d\.]+)',
+    'igpNumber': r'igp\s*number\s*(?:is|:)?\s*([\w\d\-]+)',
+    'driverId': r'driver\s*id\s*(?:is|:)?\s*([\w\d\-]+)',
+    'abortedRemarks': r'aborted\s*remarks\s*(?:is|:)?\s*([\w\d\s\-]+)',
+    'abortedBy': r'aborted\s*by\s*(?:is|:)?\s*([\w\d\-]+)',
+    'status': r'status\s*(?:is|:)?\s*([\w\d\-]+)',
+    'dinumber': r'di\s*number\s*(?:is|:)?\s*([\w\d\-]+)',
+    'diqty': r'di\s*quantity\s*(?:is|:)?\s*([\d\.]+)',
+    'ponumber': r'po\s*number\s*(?:is|:)?\s*([\w\d\-]+)',
+    'po_qty': r'po\s*quantity\s*(?:is|:)?\s*([\d\.]+)',
+    'consignmentDate': r'consignment\s*date\s*(?:is|:)?\s*([\w\d\-]+)',
+    'cityName': r'city\s*name\s*(?:is|:)?\s*([\w\d\s\-]+)',
+}
+
+# Natural-language date ranges rewritten into MySQL expressions, in application order
+DATE_PATTERNS = [(re.compile(pattern, re.IGNORECASE), replacement) for pattern, replacement in [
+    (r"\b(last|past) (\d+) days?\b", r"DATE_SUB(NOW(), INTERVAL \2 DAY)"),
+    (r"\b(last|past) (\d+) weeks?\b", r"DATE_SUB(NOW(), INTERVAL \2 WEEK)"),
+    (r"\b(last|past) (\d+) months?\b", r"DATE_SUB(NOW(), INTERVAL \2 MONTH)"),
+    (r"\b(last|past) (\d+) years?\b", r"DATE_SUB(NOW(), INTERVAL \2 YEAR)"),
+    (r"last (\d+) days?", r"DATE_SUB(NOW(), INTERVAL \1 DAY)"),
+    (r"last (\d+) weeks?", r"DATE_SUB(NOW(), INTERVAL \1 WEEK)"),
+    (r"last (\d+) months?", r"DATE_SUB(NOW(), INTERVAL \1 MONTH)"),
+    (r"last (\d+) years?", r"DATE_SUB(NOW(), INTERVAL \1 YEAR)"),
+    (r"from (\d+) days? ago", r"DATE_SUB(NOW(), INTERVAL \1 DAY)"),
+    (r"from (\d+) weeks? ago", r"DATE_SUB(NOW(), INTERVAL \1 WEEK)"),
+    (r"from (\d+) months? ago", r"DATE_SUB(NOW(), INTERVAL \1 MONTH)"),
+    (r"from (\d+) years? ago", r"DATE_SUB(NOW(), INTERVAL \1 YEAR)"),
+]]
+# Every date pattern mentions one of these words; messages without them skip the substitutions
+DATE_TRIGGER = re.compile(r"last|past|ago", re.IGNORECASE)
+
+# First literal word of a pattern, optionally after one optional "(?:word\s*)?" group
+_LEADING_KEYWORD = re.compile(r"^(?:\(\?:[a-z]+\\s\*\)\?)?([a-z]+)(?![?*+{])")
+
+
+def convert_natural_dates(nl_query):
+    """Convert natural language date expressions into SQL-compatible DATE_SUB expressions."""
+    if not DATE_TRIGGER.search(nl_query):
+        return nl_query
+    for pattern, replacement in DATE_PATTERNS:
+        nl_query = pattern.sub(replacement, nl_query)
+    return nl_query
+
+
+def leading_keyword(pattern):
+    """Lowercase literal every match of the pattern starts with (after an optional prefix word), or None."""
+    match = _LEADING_KEYWORD.match(pattern)
+    return match.group(1).lower() if match else None
+
+
+def trie_pattern(words):
+    """Regex alternation of words arranged as a trie, so each position branches on one character."""
+    trie = {}
+    for word in words:
+        node = trie
+        for ch in word:
+            node = node.setdefault(ch, {})
+        node[""] = {}
+
+    def build(node):
+        branches = [re.escape(ch) + build(child) for ch, child in sorted(node.items()) if ch]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        return f"(?:{body})?" if "" in node else body
+
+    return build(trie)
+
+
+class EntityScanner:
+    """
+    Extracts entity values from a message with patterns compiled once.
+
+    Each pattern starts with a literal keyword ("trip", "vehicle", "gate", ...). One scan of the
+    lowercased message with a trie-shaped lookahead alternation of those keywords finds every
+    keyword occurrence, overlapping ones included; only the patterns behind them are run.
+    The result is the same as running every pattern with re.search, in pattern order.
+    """
+
+    def __init__(self, patterns=None):
+        patterns = ENTITY_PATTERNS if patterns is None else patterns
+        self.patterns = [(entity, re.compile(pattern, re.IGNORECASE)) for entity, pattern in patterns.items()]
+        self.keyword_patterns = {}  # keyword -> indexes into self.patterns
+        self.always = []  # patterns without a usable keyword are always run
+        for index, pattern in enumerate(patterns.values()):
+            keyword = leading_keyword(pattern)
+            if keyword is None:
+                self.always.append(index)
+            else:
+                self.keyword_patterns.setdefault(keyword, []).append(index)
+        keywords = sorted(self.keyword_patterns)
+        # A keyword found at a position implies the shorter keywords that are its prefixes
+        self.implied = {keyword: [other for other in keywords if other != keyword and keyword.startswith(other)]
+                        for keyword in keywords}
+        self.scanner = re.compile("(?=(" + trie_pattern(keywords) + "))") if keywords else None
+
+    def candidates(self, message):
+        """Indexes of the patterns whose keyword occurs in the message, in pattern order."""
+        found = set(self.always)
+        if self.scanner is not None:
+            for keyword in {match.group(1) for match in self.scanner.finditer(message.lower())}:
+                found.update(self.keyword_patterns[keyword])
+                for prefix in self.implied[keyword]:
+                    found.update(self.keyword_patterns[prefix])
+        return sorted(found)
+
+    def extract(self, message):
+        """
+        Finds the entity values mentioned in a message.
+
+        Args:
+            message (str): The user message.
+
+        Returns:
+            dict: entity -> first captured value, in pattern order (the last key is the last entity found).
+        """
+        entities = {}
+        for index in self.candidates(message):
+            entity, pattern = self.patterns[index]
+            match = pattern.search(message)
+            if match:
+                entities[entity] = match.group(1)
+        return entities
+
+
+entity_scanner = EntityScanner()
+
+
+if __name__ == "__main__":
+    # Micro-benchmark: one-pass scanner vs. the per-pattern re.search loop on json.txt questions
+    # plus messages that mention entities; also checks both give identical results.
+    import json
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Compare EntityScanner with the per-pattern regex loop.")
+    parser.add_argument("--corpus", default="json.txt", help="JSON list of {input: question} examples.")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    with open(args.corpus, "r", encoding="utf-8") as f:
+        messages = [example["input"] for example in json.load(f)]
+    messages += [
+        "vehicle number is KA01AB1234, what is its current stage location?",
+        "trip id TRP-20931 gate in time is 10:30 and gate out time is 14:05",
+        "Show the tare weight is 14.2 and gross weight is 41.7 for DI number 800123",
+        "transporter name ABC, material code MC-12, status: C",
+        "Is the tolerance failed: true for weighbridge code WB3?",
+        "po number 4500012345 po quantity 30.5 consignment date 2024-05-01",
+        "hi, can you help me?",
+    ]
+
+    def per_pattern_loop(message):
+        entities = {}
+        for entity, pattern in ENTITY_PATTERNS.items():
+            match = re.search(pattern, message, re.IGNORECASE)
+            if match:
+                entities[entity] = match.group(1)
+        return entities
+
+    mismatches = [m for m in messages if per_pattern_loop(m) != entity_scanner.extract(m)]
+
+    def timed(fn):
+        best = float("inf")
+        for _ in range(3):
+            start = time.perf_counter()
+            for _ in range(args.repeat):
+                for message in messages:
+                    fn(message)
+            best = min(best, time.perf_counter() - start)
+        return best / (args.repeat * len(messages)) * 1e6
+
+    loop_us = timed(per_pattern_loop)
+    scanner_us = timed(entity_scanner.extract)
+    candidates = sum(len(entity_scanner.candidates(m)) for m in messages) / len(messages)
+    print(json.dumps({
+        "messages": len(messages),
+        "patterns": len(ENTITY_PATTERNS),
+        "avg_patterns_run": round(candidates, 2),
+        "per_pattern_loop_us": round(loop_us, 2),
+        "scanner_us": round(scanner_us, 2),
+        "speedup": round(loop_us / scanner_us, 2),
+        "mismatches": len(mismatches),
+    }, indent=2))
+    for message in mismatches:
+        print("MISMATCH:", message)
@@ -0,0 +1,289 @@
+import os
+import sys
+import json
+import gzip
+import time
+import queue
+import atexit
+import shutil
+import logging
+import threading
+from datetime import datetime, timezone
+
+# Buffered log settings (overridable through the environment)
+EVENT_LOG_QUEUE_SIZE = int(os.getenv("EVENT_LOG_QUEUE_SIZE", "10000"))  # pending records per file; full = drop
+EVENT_LOG_BATCH_SIZE = int(os.getenv("EVENT_LOG_BATCH_SIZE", "256"))  # records per write
+EVENT_LOG_FLUSH_INTERVAL = float(os.getenv("EVENT_LOG_FLUSH_INTERVAL", "1.0"))  # seconds a partial batch may wait
+EVENT_LOG_MAX_BYTES = int(os.getenv("EVENT_LOG_MAX_BYTES", str(50 * 1024 * 1024)))  # rotate above this size; 0 = off
+EVENT_LOG_ROTATE_INTERVAL = int(os.getenv("EVENT_LOG_ROTATE_INTERVAL", "86400"))  # rotate after this many seconds; 0 = off
+EVENT_LOG_BACKUPS = int(os.getenv("EVENT_LOG_BACKUPS", "7"))  # rotated files kept per log
+EVENT_LOG_GZIP = os.getenv("EVENT_LOG_GZIP", "0") == "1"  # compress rotated files
+EVENT_LOG_DEBUG = os.getenv("EVENT_LOG_DEBUG", "1") == "1"  # debug() messages to stdout; 0 drops them
+
+QUERY_EVENT_LOG = "query_logs.jsonl"  # structured chat/feedback events
+QUERY_TEXT_LOG = "query_logs.txt"  # generated SQL, one line per query
+STDOUT = "-"
+
+
+class AsyncLogWriter:
+    """
+    Appends records to one file from a background thread.
+
+    write() only enqueues, so callers never wait on the disk. The writer thread takes up to
+    ``batch_size`` records at a time (or whatever arrived within ``flush_interval``), serializes
+    them (dicts as JSON lines) and writes them with one write and flush. The file is rotated to
+    ``<path>.<timestamp>`` (gzip-compressed if enabled) once it would exceed ``max_bytes``, or when
+    a write falls in a later ``rotate_interval`` period (aligned to the epoch, so UTC midnight for a
+    day) than the file's last write; the file's mtime carries that across restarts. Only the
+    newest ``backups`` rotated files are kept. When the queue is full the record is dropped and counted instead of blocking the request.
+    Path "-" writes to stdout without rotation.
+    """
+
+    def __init__(self, path, queue_size=EVENT_LOG_QUEUE_SIZE, batch_size=EVENT_LOG_BATCH_SIZE,
+                 flush_interval=EVENT_LOG_FLUSH_INTERVAL, max_bytes=EVENT_LOG_MAX_BYTES,
+                 rotate_interval=EVENT_LOG_ROTATE_INTERVAL, backups=EVENT_LOG_BACKUPS, compress=EVENT_LOG_GZIP):
+        self.path = path
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self.max_bytes = max_bytes
+        self.rotate_interval = rotate_interval
+        self.backups = backups
+        self.compress = compress
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._lock = threading.Lock()
+        self._stats = {"enqueued": 0, "dropped": 0, "written": 0, "batches": 0, "bytes": 0,
+                       "rotations": 0, "write_errors": 0}
+        self._file = None
+        self._last_write = 0.0
+        self._size = 0
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name=f"log-writer:{path}", daemon=True)
+        self._thread.start()
+
+    def write(self, record):
+        """
+        Queues a record (a dict, written as one JSON line, or a string) without blocking.
+
+        Returns:
+            bool: False if the queue was full and the record was dropped.
+        """
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            with self._lock:
+                self._stats["dropped"] += 1
+            return False
+        with self._lock:
+            self._stats["enqueued"] += 1
+        return True
+
+    def _next_batch(self):
+        """Blocks for the first record, then collects more until the batch is full or the interval ends."""
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size and batch[-1] is not None:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self._queue.get(timeout=max(remaining, 0)) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            stop = batch[-1] is None
+            records = [record for record in batch if record is not None]
+            if records:
+                self._write_batch(records)
+            for _ in batch:
+                self._queue.task_done()
+            if stop:
+                self._close_file()
+                return
+
+    @staticmethod
+    def _serialize(record):
+        if isinstance(record, dict):
+            return json.dumps(record, default=str) + "\n"
+        record = str(record)
+        return record if record.endswith("\n") else record + "\n"
+
+    def _write_batch(self, records):
+        data = "".join(self._serialize(record) for record in records)
+        try:
+            if self.path == STDOUT:
+                sys.stdout.write(data)
+                sys.stdout.flush()
+            else:
+                encoded = data.encode("utf-8")
+                self._maybe_rotate(len(encoded))
+                if self._file is None:
+                    self._open_file()
+                self._file.write(encoded)
+                self._file.flush()
+                self._size += len(encoded)
+                self._last_write = time.time()
+        except Exception as e:
+            logging.error(f"Log write to {self.path} failed, {len(records)} records lost: {e}")
+            self._close_file()
+            with self._lock:
+                self._stats["write_errors"] += 1
+                self._stats["dropped"] += len(records)
+            return
+        with self._lock:
+            self._stats["written"] += len(records)
+            self._stats["batches"] += 1
+            self._stats["bytes"] += len(data)
+
+    def _open_file(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(self.path, "ab")
+        self._size = self._file.tell()
+        self._last_write = os.fstat(self._file.fileno()).st_mtime
+
+    def _close_file(self):
+        if self._file is not None:
+            try:
+                self._file.close()
+            except OSError:
+                pass
+            self._file = None
+
+    def _maybe_rotate(self, incoming):
+        if self._file is None and os.path.exists(self.path):
+            self._open_file()
+        if self._file is None or self._size == 0:
+            return
+        too_big = self.max_bytes > 0 and self._size + incoming > self.max_bytes
+        too_old = self.rotate_interval > 0 and self._period(time.time()) != self._period(self._last_write)
+        if too_big or too_old:
+            self.rotate()
+
+    def _period(self, timestamp):
+        return int(timestamp // self.rotate_interval)
+
+    def rotate(self):
+        """Renames the current file to <path>.<timestamp> (then gzips it) and prunes old backups."""
+        self._close_file()
+        if not os.path.exists(self.path):
+            return
+        stamp = datetime.now(timezone.utc).strftime("%Y%m%d-%H%M%S")
+        target = f"{self.path}.{stamp}"
+        suffix = 1
+        while os.path.exists(target) or os.path.exists(target + ".gz"):
+            target = f"{self.path}.{stamp}.{suffix}"
+            suffix += 1
+        os.replace(self.path, target)
+        if self.compress:
+            with open(target, "rb") as src, gzip.open(target + ".gz", "wb") as dst:
+                shutil.copyfileobj(src, dst)
+            os.remove(target)
+        with self._lock:
+            self._stats["rotations"] += 1
+        self._prune_backups()
+
+    def _prune_backups(self):
+        directory = os.path.dirname(self.path) or "."
+        prefix = os.path.basename(self.path) + "."
+        rotated = sorted((name for name in os.listdir(directory) if name.startswith(prefix)),
+                         key=lambda name: os.path.getmtime(os.path.join(directory, name)))
+        for name in rotated[:max(len(rotated) - self.backups, 0)]:
+            try:
+                os.remove(os.path.join(directory, name))
+            except OSError as e:
+                logging.error(f"Could not remove old log {name}: {e}")
+
+    def flush(self, timeout=5.0):
+        """Waits (up to timeout seconds) until every queued record has been written."""
+        deadline = time.monotonic() + timeout
+        while self._queue.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(0.01)
+        return not self._queue.unfinished_tasks
+
+    def close(self, timeout=5.0):
+        """Writes what is queued, then stops the writer thread."""
+        if self._closed:
+            return
+        self._closed = True
+        try:
+            self._queue.put(None, timeout=timeout)
+        except queue.Full:
+            logging.error(f"Log queue for {self.path} still full at shutdown; pending records dropped")
+            return
+        self._thread.join(timeout)
+
+    def stats(self):
+        """Returns enqueue/drop/write counters and the current queue depth."""
+        with self._lock:
+            stats = dict(self._stats)
+        stats["queued"] = self._queue.qsize()
+        return stats
+
+
+_writers = {}
+_writers_lock = threading.Lock()
+
+
+def get_writer(path):
+    """Returns the shared AsyncLogWriter for a path, starting it on first use."""
+    with _writers_lock:
+        writer = _writers.get(path)
+        if writer is None:
+            writer = _writers[path] = AsyncLogWriter(path)
+        return writer
+
+
+class LogWriterHandler(logging.Handler):
+    """
+    logging handler that formats records and queues them on the shared writer for a path.
+
+    Lets ``logging`` output share a file with log_line() without a second open file handle,
+    which would keep writing to the renamed file after the writer rotates it.
+    """
+
+    def __init__(self, path, level=logging.NOTSET):
+        super().__init__(level)
+        self.path = path
+
+    def emit(self, record):
+        try:
+            get_writer(self.path).write(self.format(record))
+        except Exception:
+            self.handleError(record)
+
+
+def log_event(event, path=QUERY_EVENT_LOG):
+    """Queues a structured event (a dict) for the JSON-lines log, adding a UTC timestamp if missing."""
+    if "timestamp" not in event:
+        event = {"timestamp": datetime.now(timezone.utc).isoformat(), **event}
+    return get_writer(path).write(event)
+
+
+def log_line(line, path=QUERY_TEXT_LOG):
+    """Queues one line of text for a plain log file."""
+    return get_writer(path).write(line)
+
+
+def debug(*parts):
+    """print() replacement for request-path debug output: queued and written to stdout in batches."""
+    if EVENT_LOG_DEBUG:
+        get_writer(STDOUT).write(" ".join(str(part) for part in parts))
+
+
+def log_stats():
+    """Returns the counters of every open log writer, keyed by path."""
+    with _writers_lock:
+        writers = dict(_writers)
+    return {path: writer.stats() for path, writer in writers.items()}
+
+
+@atexit.register
+def close_all():
+    """Drains and stops every writer (registered to run at interpreter exit)."""
+    with _writers_lock:
+        writers = list(_writers.values())
+    for writer in writers:
+        writer.close()
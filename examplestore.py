@@ -0,0 +1,146 @@
+import json
+import mmap
+import pickle
+import numpy as np
+
+# Columnar few-shot metadata file:
+#   MAGIC | uint32 header length | JSON header (padded to 8 bytes) | sections
+# Sections are raw arrays at the offsets listed in the header: the sorted int64 example IDs and, per
+# field, int64 end offsets into a UTF-8 blob plus a uint8 null mask. Readers mmap the file, so
+# every worker shares one copy of the pages and nothing is unpickled or copied per process.
+MAGIC = b"FSEXMPL1"
+FORMAT_VERSION = 1
+ALIGNMENT = 8
+
+
+def _pad(length):
+    return -length % ALIGNMENT
+
+
+def write_example_store(path, examples):
+    """
+    Writes few-shot examples in the columnar format.
+
+    Args:
+        path (str): Output file (written in place; wrap in an atomic replace when readers exist).
+        examples (dict): Example ID (int) -> dict of field name -> str (or None).
+    """
+    ids = np.array(sorted(examples), dtype="int64")
+    fields = sorted({field for item in examples.values() for field in item})
+    arrays = [("ids", ids.tobytes())]
+    for field in fields:
+        values = [examples[int(example_id)].get(field) for example_id in ids]
+        encoded = [value.encode("utf-8") if value is not None else b"" for value in values]
+        arrays.append((f"{field}.ends", np.cumsum([len(data) for data in encoded], dtype="int64").tobytes()))
+        arrays.append((f"{field}.nulls", np.array([value is None for value in values], dtype="uint8").tobytes()))
+        arrays.append((f"{field}.data", b"".join(encoded)))
+
+    # Section offsets depend on the header size, which depends on the offsets: lay out with a
+    # provisional header and grow it until the offsets it states fit
+    header_size = 0
+    while True:
+        position = len(MAGIC) + 4 + header_size + _pad(len(MAGIC) + 4 + header_size)
+        sections = {}
+        for name, data in arrays:
+            sections[name] = [position, len(data)]
+            position += len(data) + _pad(len(data))
+        header = json.dumps({"version": FORMAT_VERSION, "count": len(ids), "fields": fields,
+                             "sections": sections}).encode("utf-8")
+        if len(header) <= header_size:
+            break
+        header_size = len(header) + 64
+
+    with open(path, "wb") as f:
+        f.write(MAGIC)
+        f.write(np.uint32(header_size).tobytes())
+        f.write(header.ljust(header_size))
+        f.write(b"\0" * _pad(len(MAGIC) + 4 + header_size))
+        for _name, data in arrays:
+            f.write(data)
+            f.write(b"\0" * _pad(len(data)))
+
+
+class ExampleStore:
+    """
+    Read-only, memory-mapped view of a columnar few-shot metadata file.
+
+    Behaves like the dict of examples it was written from for lookups (get, in, len, items);
+    each lookup decodes only the requested row.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mmap[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path} is not a few-shot example store")
+        header_size = int(np.frombuffer(self._mmap, dtype="uint32", count=1, offset=len(MAGIC))[0])
+        header = json.loads(self._mmap[len(MAGIC) + 4:len(MAGIC) + 4 + header_size].decode("utf-8"))
+        if header.get("version") != FORMAT_VERSION:
+            raise ValueError(f"{path}: unsupported example store version {header.get('version')}")
+        self.fields = header["fields"]
+        self._count = header["count"]
+        self._sections = header["sections"]
+        self._ids = self._array("ids", "int64")
+        self._columns = {field: (self._array(f"{field}.ends", "int64"), self._array(f"{field}.nulls", "uint8"),
+                                 self._sections[f"{field}.data"][0]) for field in self.fields}
+
+    def _array(self, name, dtype):
+        offset, length = self._sections[name]
+        return np.frombuffer(self._mmap, dtype=dtype, count=length // np.dtype(dtype).itemsize, offset=offset)
+
+    def _position(self, example_id):
+        position = int(np.searchsorted(self._ids, example_id))
+        if position < self._count and self._ids[position] == example_id:
+            return position
+        return None
+
+    def _row(self, position):
+        row = {}
+        for field, (ends, nulls, data_offset) in self._columns.items():
+            if nulls[position]:
+                continue
+            start = int(ends[position - 1]) if position else 0
+            row[field] = self._mmap[data_offset + start:data_offset + int(ends[position])].decode("utf-8")
+        return row
+
+    def get(self, example_id, default=None):
+        position = self._position(example_id)
+        return self._row(position) if position is not None else default
+
+    def __contains__(self, example_id):
+        return self._position(example_id) is not None
+
+    def __len__(self):
+        return self._count
+
+    def keys(self):
+        return [int(example_id) for example_id in self._ids]
+
+    def items(self):
+        for position, example_id in enumerate(self._ids):
+            yield int(example_id), self._row(position)
+
+    def to_dict(self):
+        """A plain, mutable copy (for incremental index builds)."""
+        return dict(self.items())
+
+    def close(self):
+        self._ids = None
+        self._columns = {}
+        self._mmap.close()
+
+
+def load_metadata(path):
+    """
+    Opens few-shot metadata in either format.
+
+    Returns:
+        ExampleStore for columnar files; the unpickled dict (or list, for the oldest builds) otherwise.
+    """
+    with open(path, "rb") as f:
+        magic = f.read(len(MAGIC))
+    if magic == MAGIC:
+        return ExampleStore(path)
+    with open(path, "rb") as f:
+        return pickle.load(f)
@@ -0,0 +1,88 @@
+import os
+import re
+from tokencount import count_tokens
+
+# History compaction settings for SQL prompts (overridable through the environment)
+HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", "600"))  # tokens for history + entity state
+HISTORY_WINDOW = int(os.getenv("HISTORY_WINDOW", "6"))  # most recent turns considered
+HISTORY_BOT_MAX_LINES = int(os.getenv("HISTORY_BOT_MAX_LINES", "2"))  # lines of each bot answer kept
+
+_TABLE_ROW = re.compile(r"^\s*\|.*\|\s*$")
+_CODE_FENCE = re.compile(r"```.*?```", re.DOTALL)
+
+
+def condense_bot_reply(text, max_lines=HISTORY_BOT_MAX_LINES):
+    """
+    Shrinks a bot answer to what helps resolve follow-up questions.
+
+    Markdown tables and fenced blocks are dropped and only the first max_lines
+    non-empty lines (usually the summary sentence) are kept.
+
+    Args:
+        text (str): The bot answer as stored in the session history.
+        max_lines (int): Number of lines to keep.
+
+    Returns:
+        str: The condensed answer on a single line.
+    """
+    if not text:
+        return ""
+    text = _CODE_FENCE.sub(" ", str(text))
+    lines = [line.strip() for line in text.splitlines() if line.strip() and not _TABLE_ROW.match(line)]
+    kept = " ".join(lines[:max_lines])
+    if len(lines) > max_lines:
+        kept += f" (+{len(lines) - max_lines} more lines)"
+    return kept
+
+
+def format_turn(entry):
+    return f"User: {entry.get('user', '')} | Bot: {condense_bot_reply(entry.get('bot', ''))}"
+
+
+def compact_history(history, entity_context="", budget=HISTORY_TOKEN_BUDGET, window=HISTORY_WINDOW):
+    """
+    Builds the session-history section of the SQL prompt within a token budget.
+
+    The entity state from build_entity_context() is always kept. After that, the most recent
+    turns (at most `window`) are added newest first until the budget is used up, and then
+    emitted in chronological order.
+
+    Args:
+        history (list): Session history entries ({"user": ..., "bot": ...}), oldest first.
+        entity_context (str): Known entity values, one per line.
+        budget (int): Maximum tokens for the whole section.
+        window (int): Maximum number of recent turns to consider.
+
+    Returns:
+        tuple: (section text, stats dict with turns_total, turns_kept, tokens_full and tokens).
+               tokens_full is what joining every turn verbatim would have cost.
+    """
+    history = history or []
+    entity_section = f"Entity Context:\n{entity_context}" if entity_context else ""
+    used = count_tokens(entity_section)
+
+    kept = []
+    for entry in reversed(history[-window:] if window > 0 else []):
+        line = format_turn(entry)
+        cost = count_tokens(line)
+        if used + cost > budget:
+            break
+        kept.append(line)
+        used += cost
+    kept.reverse()
+
+    parts = []
+    if kept:
+        parts.append("\n".join(kept))
+    if entity_section:
+        parts.append(entity_section)
+    section = "\n\n".join(parts)
+
+    full = "\n".join(f"User: {entry.get('user', '')} | Bot: {entry.get('bot', '')}" for entry in history)
+    stats = {
+        "turns_total": len(history),
+        "turns_kept": len(kept),
+        "tokens_full": count_tokens(full) + count_tokens(entity_section),
+        "tokens": count_tokens(section),
+    }
+    return section, stats
@@ -0,0 +1,319 @@
+import os
+import json
+import time
+import asyncio
+import logging
+from threading import Lock
+from urllib.parse import urlsplit
+import requests
+from requests.adapters import HTTPAdapter
+from metrics import HistogramFamily
+from tracing import record_llm_usage
+from llmfixtures import (LLM_FIXTURE_MODE, LLM_FIXTURE_PATH, FixtureAdapter, AsyncFixtureTransport,
+                         get_store as get_fixture_store)
+
+# Endpoint and connection settings (point LLM_API_ENDPOINT at a local stub server for tests)
+LLM_API_ENDPOINT = os.getenv("LLM_API_ENDPOINT", "https://api.groq.com/openai/v1/chat/completions")
+LLM_CONNECT_TIMEOUT = float(os.getenv("LLM_CONNECT_TIMEOUT", "5"))
+LLM_READ_TIMEOUT = float(os.getenv("LLM_READ_TIMEOUT", "60"))
+LLM_POOL_MAXSIZE = int(os.getenv("LLM_POOL_MAXSIZE", "10"))  # keep-alive connections per endpoint
+LLM_ENDPOINT_POOL_MAXSIZE = int(os.getenv("LLM_ENDPOINT_POOL_MAXSIZE", "0"))  # cap for the LLM_API_ENDPOINT host; 0 = LLM_POOL_MAXSIZE
+
+# Latency of every chat completion call, labelled by model (e.g. gemma2-9b-it, llama3-8b-8192)
+LLM_LATENCY = HistogramFamily("llm_request_seconds", "model")
+# Time to the first streamed token, which is what the user perceives on /chat/stream
+LLM_FIRST_TOKEN = HistogramFamily("llm_first_token_seconds", "model")
+
+_session = None
+_session_lock = Lock()
+_endpoint_limits = {}  # URL prefix -> max pooled connections
+_async_client = None
+_async_loop = None  # event loop the async client was created on
+_async_transport = None
+_async_slots = None  # bounds concurrent async calls, whatever transport the client uses
+
+
+def _origin(url):
+    parts = urlsplit(url)
+    return f"{parts.scheme}://{parts.netloc}/"
+
+
+def _current_limits():
+    """Endpoint limits from set_endpoint_limit(), plus LLM_ENDPOINT_POOL_MAXSIZE for the configured endpoint."""
+    limits = dict(_endpoint_limits)
+    if LLM_ENDPOINT_POOL_MAXSIZE > 0:
+        limits.setdefault(_origin(LLM_API_ENDPOINT), LLM_ENDPOINT_POOL_MAXSIZE)
+    return limits
+
+
+def _pool_limit(url):
+    """Connections allowed to url: the longest matching endpoint limit (as requests matches mounts), else LLM_POOL_MAXSIZE."""
+    limits = _current_limits()
+    matches = [prefix for prefix in limits if url.lower().startswith(prefix.lower())]
+    return limits[max(matches, key=len)] if matches else LLM_POOL_MAXSIZE
+
+
+def _build_session():
+    session = requests.Session()
+    # Default adapter for any endpoint without an explicit limit
+    default_adapter = HTTPAdapter(pool_connections=4, pool_maxsize=LLM_POOL_MAXSIZE, pool_block=True)
+    session.mount("https://", default_adapter)
+    session.mount("http://", default_adapter)
+    for prefix, maxsize in _current_limits().items():
+        session.mount(prefix, HTTPAdapter(pool_connections=1, pool_maxsize=maxsize, pool_block=True))
+    if LLM_FIXTURE_MODE:
+        # Record through (or replay instead of) the adapter that would otherwise serve the endpoint
+        inner = session.get_adapter(LLM_API_ENDPOINT)
+        session.mount(LLM_API_ENDPOINT, FixtureAdapter(get_fixture_store(LLM_FIXTURE_PATH), LLM_FIXTURE_MODE, inner))
+    return session
+
+
+def get_session():
+    """Returns the process-wide keep-alive session, creating it on first use."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = _build_session()
+        return _session
+
+
+def set_endpoint_limit(url_prefix, maxsize):
+    """
+    Caps the number of pooled keep-alive connections for one endpoint.
+
+    Overrides LLM_ENDPOINT_POOL_MAXSIZE for that prefix. The async client is rebuilt on its next
+    use so it honours the new limit too.
+
+    Args:
+        url_prefix (str): URL prefix the limit applies to, e.g. "https://api.groq.com/".
+        maxsize (int): Maximum concurrent connections; extra callers block until one is free.
+    """
+    global _session
+    with _session_lock:
+        _endpoint_limits[url_prefix] = maxsize
+        if _session is not None:
+            _session.mount(url_prefix, HTTPAdapter(pool_connections=1, pool_maxsize=maxsize, pool_block=True))
+    configure_async(_async_transport)
+
+
+def configure(endpoint=None, connect_timeout=None, read_timeout=None, pool_maxsize=None):
+    """
+    Overrides the client settings at runtime (e.g. to target a local stub server) and
+    drops the current session so the next call picks up the new configuration.
+    """
+    global _session, LLM_API_ENDPOINT, LLM_CONNECT_TIMEOUT, LLM_READ_TIMEOUT, LLM_POOL_MAXSIZE
+    with _session_lock:
+        if endpoint is not None:
+            LLM_API_ENDPOINT = endpoint
+        if connect_timeout is not None:
+            LLM_CONNECT_TIMEOUT = connect_timeout
+        if read_timeout is not None:
+            LLM_READ_TIMEOUT = read_timeout
+        if pool_maxsize is not None:
+            LLM_POOL_MAXSIZE = pool_maxsize
+        if _session is not None:
+            _session.close()
+        _session = None
+    configure_async(_async_transport)
+
+
+def chat_completion(payload, api_key, timeout=None):
+    """
+    Posts a chat completion request over the shared keep-alive session.
+
+    Args:
+        payload (dict): OpenAI-compatible request body; payload["model"] labels the latency histogram.
+        api_key (str): Bearer token for the endpoint.
+        timeout (tuple, optional): (connect, read) seconds. Defaults to LLM_CONNECT_TIMEOUT/LLM_READ_TIMEOUT.
+
+    Returns:
+        requests.Response: The raw response; callers decide how to handle HTTP errors and read the
+            body with completion_content(), which also records the token usage.
+    """
+    headers = {
+        "Authorization": f"Bearer {api_key}",
+        "Content-Type": "application/json"
+    }
+    if timeout is None:
+        timeout = (LLM_CONNECT_TIMEOUT, LLM_READ_TIMEOUT)
+
+    model = payload.get("model", "unknown")
+    start = time.perf_counter()
+    try:
+        return get_session().post(LLM_API_ENDPOINT, headers=headers, json=payload, timeout=timeout)
+    finally:
+        elapsed = time.perf_counter() - start
+        LLM_LATENCY.observe(model, elapsed)
+        logging.debug(f"LLM call to {model} took {elapsed:.3f}s")
+
+
+def completion_content(response, model):
+    """
+    Parses a completion response body once, records its token usage and returns the message text.
+
+    Args:
+        response (requests.Response or httpx.Response): A successful chat_completion()/achat_completion() response.
+        model (str): Model name the usage is recorded under.
+
+    Returns:
+        str: choices[0].message.content.
+
+    Raises:
+        ValueError: The body is not JSON (json.JSONDecodeError is a subclass).
+        KeyError, IndexError: The body has no message content.
+    """
+    body = response.json()
+    record_llm_usage(model, body.get("usage"))
+    return body['choices'][0]['message']['content']
+
+
+def stream_chat_completion(payload, api_key, timeout=None):
+    """
+    Streams a chat completion over the shared keep-alive session (OpenAI-compatible SSE).
+
+    Args:
+        payload (dict): Request body; "stream": true is added automatically.
+        api_key (str): Bearer token for the endpoint.
+        timeout (tuple, optional): (connect, read) seconds; read applies between chunks.
+
+    Yields:
+        str: Content deltas in the order the model produces them.
+
+    Raises:
+        requests.exceptions.RequestException: On connection or HTTP errors.
+    """
+    headers = {
+        "Authorization": f"Bearer {api_key}",
+        "Content-Type": "application/json",
+        "Accept": "text/event-stream"
+    }
+    if timeout is None:
+        timeout = (LLM_CONNECT_TIMEOUT, LLM_READ_TIMEOUT)
+
+    model = payload.get("model", "unknown")
+    start = time.perf_counter()
+    first_token_seen = False
+    usage = None
+    try:
+        with get_session().post(LLM_API_ENDPOINT, headers=headers, json=dict(payload, stream=True),
+                                timeout=timeout, stream=True) as response:
+            response.raise_for_status()
+            for line in response.iter_lines():
+                line = line.decode("utf-8").strip()
+                if not line.startswith("data:"):
+                    continue  # blank separators, comments and keep-alives
+                data = line[len("data:"):].strip()
+                if data == "[DONE]":
+                    break
+                chunk = json.loads(data)
+                # Usage arrives with the last chunk ("usage", or Groq's "x_groq": {"usage": ...})
+                usage = chunk.get("usage") or (chunk.get("x_groq") or {}).get("usage") or usage
+                choices = chunk.get("choices") or []
+                delta = choices[0].get("delta", {}).get("content") if choices else None
+                if not delta:
+                    continue
+                if not first_token_seen:
+                    first_token_seen = True
+                    LLM_FIRST_TOKEN.observe(model, time.perf_counter() - start)
+                yield delta
+    finally:
+        elapsed = time.perf_counter() - start
+        LLM_LATENCY.observe(model, elapsed)
+        record_llm_usage(model, usage)
+        logging.debug(f"LLM stream from {model} took {elapsed:.3f}s")
+
+
+def get_async_client():
+    """
+    Returns the shared httpx.AsyncClient (created on first use inside the running event loop).
+
+    httpx is only needed by the ASGI entry point, so it is imported lazily. The client's pool
+    gets the same limit as the sync session's adapter for LLM_API_ENDPOINT.
+    """
+    global _async_client, _async_loop, _async_slots
+    if _async_client is None:
+        import httpx
+        maxsize = _pool_limit(LLM_API_ENDPOINT)
+        limits = httpx.Limits(max_connections=maxsize, max_keepalive_connections=maxsize)
+        timeout = httpx.Timeout(LLM_READ_TIMEOUT, connect=LLM_CONNECT_TIMEOUT)
+        transport = _async_transport
+        if transport is None and LLM_FIXTURE_MODE:
+            transport = AsyncFixtureTransport(get_fixture_store(LLM_FIXTURE_PATH), LLM_FIXTURE_MODE,
+                                              httpx.AsyncHTTPTransport(limits=limits))
+        # httpx ignores ``limits`` when given a transport, so calls are also bounded here
+        _async_slots = asyncio.Semaphore(maxsize)
+        _async_client = httpx.AsyncClient(limits=limits, timeout=timeout, transport=transport)
+        _async_loop = asyncio.get_running_loop()
+    return _async_client
+
+
+def _close_async_client(client, loop):
+    """Closes a dropped async client on the loop that owns its connections."""
+    try:
+        if loop is not None and loop.is_running():
+            # Scheduled rather than awaited: the caller may be that loop's own thread
+            asyncio.run_coroutine_threadsafe(client.aclose(), loop)
+        elif loop is not None and not loop.is_closed():
+            loop.run_until_complete(client.aclose())
+        else:
+            asyncio.run(client.aclose())
+    except Exception as e:
+        logging.warning(f"Could not close the previous async LLM client: {e}")
+
+
+def configure_async(transport=None):
+    """
+    Closes and drops the async client so the next call rebuilds it, optionally on a custom httpx
+    transport (e.g. httpx.MockTransport for load tests).
+    """
+    global _async_client, _async_loop, _async_transport
+    client, loop = _async_client, _async_loop
+    _async_transport = transport
+    _async_client = _async_loop = None
+    if client is not None:
+        _close_async_client(client, loop)
+
+
+async def aclose_async_client():
+    global _async_client, _async_loop
+    if _async_client is not None:
+        client = _async_client
+        _async_client = _async_loop = None
+        await client.aclose()
+
+
+async def achat_completion(payload, api_key, timeout=None):
+    """
+    Async counterpart of chat_completion() built on a pooled httpx.AsyncClient.
+
+    At most as many calls as the endpoint's pool limit run at once; the others wait for a slot.
+
+    Returns:
+        httpx.Response: The raw response; callers decide how to handle HTTP errors and read the
+            body with completion_content().
+    """
+    headers = {
+        "Authorization": f"Bearer {api_key}",
+        "Content-Type": "application/json"
+    }
+    model = payload.get("model", "unknown")
+    start = time.perf_counter()
+    try:
+        kwargs = {"timeout": timeout} if timeout is not None else {}
+        client = get_async_client()
+        async with _async_slots:
+            return await client.post(LLM_API_ENDPOINT, headers=headers, json=payload, **kwargs)
+    finally:
+        elapsed = time.perf_counter() - start
+        LLM_LATENCY.observe(model, elapsed)
+        logging.debug(f"LLM call to {model} took {elapsed:.3f}s")
+
+
+def latency_snapshot():
+    """Returns the per-model latency histograms as plain dicts."""
+    return LLM_LATENCY.snapshot()
+
+
+def first_token_snapshot():
+    """Returns the per-model time-to-first-token histograms of streamed calls as plain dicts."""
+    return LLM_FIRST_TOKEN.snapshot()
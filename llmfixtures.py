@@ -0,0 +1,299 @@
+import os
+import io
+import json
+import time
+import asyncio
+import hashlib
+import logging
+from threading import Lock
+import requests
+from requests.adapters import BaseAdapter
+
+# Record/replay of LLM calls (overridable through the environment)
+LLM_FIXTURE_MODE = os.getenv("LLM_FIXTURE_MODE", "")  # "" (off), "record" or "replay"
+LLM_FIXTURE_PATH = os.getenv("LLM_FIXTURE_PATH", "llm_fixtures.jsonl")
+LLM_FIXTURE_LATENCY_SCALE = float(os.getenv("LLM_FIXTURE_LATENCY_SCALE", "1.0"))  # 0 = replay without delay
+LLM_FIXTURE_ON_MISS = os.getenv("LLM_FIXTURE_ON_MISS", "error")  # replay miss: "error" or "passthrough"
+
+
+def fixture_key(payload):
+    """Hash of a chat completion request (model, messages, sampling settings, stream flag)."""
+    canonical = json.dumps(payload, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def prompt_preview(payload, limit=120):
+    text = " ".join(message.get("content", "") for message in payload.get("messages", []))
+    return " ".join(text.split())[:limit]
+
+
+class FixtureStore:
+    """
+    Recorded LLM exchanges, keyed by fixture_key(request payload).
+
+    Stored as JSON lines (one exchange per line, later lines win) so recordings can be appended
+    to, diffed and shipped with a benchmark. Each exchange keeps the status, headers, the body
+    (or, for streamed calls, every chunk with its offset from the request start) and the total
+    elapsed time, so replay can reproduce the original pacing.
+    """
+
+    def __init__(self, path=LLM_FIXTURE_PATH):
+        self.path = path
+        self._lock = Lock()
+        self._fixtures = {}
+        self._stats = {"hits": 0, "misses": 0, "recorded": 0}
+        self.load()
+
+    def load(self):
+        """(Re)reads the fixture file; a missing file means no fixtures yet."""
+        fixtures = {}
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                for line_number, line in enumerate(f, 1):
+                    try:
+                        fixture = json.loads(line)
+                        fixtures[fixture["key"]] = fixture
+                    except (ValueError, KeyError, TypeError):
+                        logging.error(f"{self.path}:{line_number}: invalid LLM fixture, skipped")
+        except FileNotFoundError:
+            pass
+        with self._lock:
+            self._fixtures = fixtures
+
+    def get(self, key):
+        with self._lock:
+            fixture = self._fixtures.get(key)
+            self._stats["hits" if fixture is not None else "misses"] += 1
+        return fixture
+
+    def put(self, fixture):
+        line = json.dumps(fixture, ensure_ascii=False) + "\n"
+        with self._lock:
+            self._fixtures[fixture["key"]] = fixture
+            self._stats["recorded"] += 1
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._fixtures)
+
+    def stats(self):
+        """Returns replay hit/miss and record counters and the number of fixtures."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["fixtures"] = len(self._fixtures)
+        return stats
+
+
+def new_fixture(key, payload, status, headers, elapsed, body=None, chunks=None):
+    fixture = {
+        "key": key,
+        "model": payload.get("model", "unknown"),
+        "prompt": prompt_preview(payload),
+        "status": status,
+        "headers": {"Content-Type": headers.get("Content-Type", "application/json")},
+        "elapsed": round(elapsed, 4),
+        "recorded_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+    if chunks is not None:
+        fixture["chunks"] = chunks  # [[seconds since request start, text], ...]
+    else:
+        fixture["body"] = body
+    return fixture
+
+
+class _ReplayStream:
+    """urllib3-like raw stream that yields recorded chunks at their recorded offsets (scaled)."""
+
+    def __init__(self, chunks, scale):
+        self.chunks = chunks
+        self.scale = scale
+        self.start = time.perf_counter()
+
+    def stream(self, chunk_size=None, decode_content=None):
+        for offset, text in self.chunks:
+            delay = offset * self.scale - (time.perf_counter() - self.start)
+            if delay > 0:
+                time.sleep(delay)
+            yield text.encode("latin-1")
+
+    def read(self, amt=None, decode_content=None):
+        return b"".join(self.stream())
+
+    def close(self):
+        pass
+
+    def release_conn(self):
+        pass
+
+
+class _RecordingStream:
+    """
+    Wraps a live raw stream and saves each chunk with its offset when the stream ends or is
+    closed (callers stop reading at "data: [DONE]", which has been received by then).
+    """
+
+    def __init__(self, raw, start, on_complete):
+        self.raw = raw
+        self.start = start
+        self.on_complete = on_complete
+        self.chunks = []
+        self.saved = False
+
+    def stream(self, chunk_size=None, decode_content=None):
+        for chunk in self.raw.stream(chunk_size, decode_content=decode_content):
+            self.chunks.append([round(time.perf_counter() - self.start, 4), chunk.decode("latin-1")])
+            yield chunk
+        self._save()
+
+    def _save(self):
+        if not self.saved and self.chunks:
+            self.saved = True
+            self.on_complete(self.chunks, time.perf_counter() - self.start)
+
+    def close(self):
+        self._save()
+        self.raw.close()
+
+    def release_conn(self):
+        release = getattr(self.raw, "release_conn", None)
+        if release is not None:
+            release()
+
+
+class FixtureAdapter(BaseAdapter):
+    """
+    requests transport that records LLM calls through ``inner`` or replays them from a FixtureStore.
+
+    In "record" mode every exchange is forwarded and saved (streamed ones once the stream has been
+    read to the end). In "replay" mode the recorded response is returned after its original
+    latency times ``scale``; streamed responses replay chunk by chunk with their recorded spacing.
+    A replay miss raises ConnectionError (the callers' usual network-error path) unless
+    ``on_miss`` is "passthrough".
+    """
+
+    def __init__(self, store, mode, inner=None, scale=LLM_FIXTURE_LATENCY_SCALE, on_miss=LLM_FIXTURE_ON_MISS):
+        super().__init__()
+        self.store = store
+        self.mode = mode
+        self.inner = inner
+        self.scale = scale
+        self.on_miss = on_miss
+
+    def send(self, request, stream=False, **kwargs):
+        payload = json.loads(request.body or b"{}")
+        key = fixture_key(payload)
+        if self.mode == "replay":
+            fixture = self.store.get(key)
+            if fixture is not None:
+                return self._replay(request, fixture)
+            if self.on_miss != "passthrough" or self.inner is None:
+                raise requests.exceptions.ConnectionError(
+                    f"No LLM fixture for {payload.get('model')} request {key[:12]} in {self.store.path}", request=request)
+            return self.inner.send(request, stream=stream, **kwargs)
+
+        start = time.perf_counter()
+        response = self.inner.send(request, stream=stream, **kwargs)
+        if stream:
+            def save(chunks, elapsed):
+                self.store.put(new_fixture(key, payload, response.status_code, response.headers, elapsed, chunks=chunks))
+            response.raw = _RecordingStream(response.raw, start, save)
+        else:
+            self.store.put(new_fixture(key, payload, response.status_code, response.headers,
+                                       time.perf_counter() - start, body=response.content.decode("utf-8", "replace")))
+        return response
+
+    def _replay(self, request, fixture):
+        response = requests.Response()
+        response.status_code = fixture["status"]
+        response.headers.update(fixture.get("headers", {}))
+        response.encoding = "utf-8"
+        response.url = request.url
+        response.request = request
+        if "chunks" in fixture:
+            response.raw = _ReplayStream(fixture["chunks"], self.scale)
+        else:
+            time.sleep(fixture["elapsed"] * self.scale)
+            response.raw = io.BytesIO(fixture["body"].encode("utf-8"))
+            response._content = fixture["body"].encode("utf-8")
+        return response
+
+    def close(self):
+        if self.inner is not None:
+            self.inner.close()
+
+
+class AsyncFixtureTransport:
+    """httpx async transport with the same record/replay behaviour as FixtureAdapter (non-streamed calls)."""
+
+    def __init__(self, store, mode, inner=None, scale=LLM_FIXTURE_LATENCY_SCALE, on_miss=LLM_FIXTURE_ON_MISS):
+        self.store = store
+        self.mode = mode
+        self.inner = inner
+        self.scale = scale
+        self.on_miss = on_miss
+
+    async def handle_async_request(self, request):
+        import httpx
+
+        payload = json.loads(await request.aread() or b"{}")
+        key = fixture_key(payload)
+        if self.mode == "replay":
+            fixture = self.store.get(key)
+            if fixture is not None:
+                await asyncio.sleep(fixture["elapsed"] * self.scale)
+                body = fixture["body"] if "body" in fixture else "".join(text for _offset, text in fixture["chunks"])
+                return httpx.Response(fixture["status"], headers=fixture.get("headers", {}),
+                                      content=body.encode("utf-8"), request=request)
+            if self.on_miss != "passthrough" or self.inner is None:
+                raise httpx.ConnectError(
+                    f"No LLM fixture for {payload.get('model')} request {key[:12]} in {self.store.path}", request=request)
+            return await self.inner.handle_async_request(request)
+
+        start = time.perf_counter()
+        response = await self.inner.handle_async_request(request)
+        content = await response.aread()
+        self.store.put(new_fixture(key, payload, response.status_code, response.headers,
+                                   time.perf_counter() - start, body=content.decode("utf-8", "replace")))
+        # The body is already decoded, so only the content type carries over
+        return httpx.Response(response.status_code, content=content, request=request,
+                              headers={"Content-Type": response.headers.get("Content-Type", "application/json")})
+
+    async def aclose(self):
+        if self.inner is not None:
+            await self.inner.aclose()
+
+
+_store = None
+_store_lock = Lock()
+
+
+def get_store(path=LLM_FIXTURE_PATH):
+    """Returns the process-wide FixtureStore (created on first use)."""
+    global _store
+    with _store_lock:
+        if _store is None or _store.path != path:
+            _store = FixtureStore(path)
+        return _store
+
+
+if __name__ == "__main__":
+    # Summary of a fixture file: exchanges and recorded latency per model
+    import argparse
+    from metrics import percentile
+
+    parser = argparse.ArgumentParser(description="Summarize recorded LLM fixtures.")
+    parser.add_argument("path", nargs="?", default=LLM_FIXTURE_PATH)
+    args = parser.parse_args()
+
+    store = FixtureStore(args.path)
+    by_model = {}
+    for fixture in store._fixtures.values():
+        by_model.setdefault(fixture["model"], []).append(fixture["elapsed"])
+    print(json.dumps({
+        "path": args.path,
+        "fixtures": len(store),
+        "models": {model: {"count": len(values), "p50_sec": percentile(values, 50), "p95_sec": percentile(values, 95)}
+                   for model, values in sorted(by_model.items())},
+    }, indent=2))
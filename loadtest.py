@@ -0,0 +1,205 @@
+# Load-test harness for /chat: compares concurrent-request throughput of the Flask app (main.py,
+# one thread per in-flight request) and the ASGI app (asgi_main.py, one event loop) against
+# stubbed LLM and MySQL backends with injected latency. Nothing leaves the machine.
+#
+#   python loadtest.py --requests 200 --concurrency 50 --llm-latency 0.3 --db-latency 0.05
+import os
+import io
+import sys
+import json
+import time
+import asyncio
+import argparse
+import tempfile
+import contextlib
+from concurrent.futures import ThreadPoolExecutor
+
+# Few-shot retrieval needs the embedding model, which is not what this harness measures
+os.environ.setdefault("FEW_SHOT_K", "0")
+# Every request must reach the (stubbed) database for pool contention to show up
+os.environ.setdefault("RESULT_CACHE", "0")
+# The stubbed COUNT result would otherwise be answered without the (stubbed) answer model
+os.environ.setdefault("NL_RENDER_POLICY", "off")
+# Per-request debug lines would bury the report (they are queued, so this does not change timings much)
+os.environ.setdefault("EVENT_LOG_DEBUG", "0")
+
+import httpx
+import requests
+from requests.adapters import BaseAdapter
+from metrics import percentile
+
+STUB_SQL = ("SELECT COUNT(DISTINCT vehicleNumber) AS vehicle_count FROM transactionalplms.vw_trip_info "
+            "WHERE mapPlantStageLocation = 'YARD-IN'")
+STUB_ANSWER = "Sure! Here's the info you requested:\n- There are 42 vehicles in the YARD-IN stage.\nHope this helps!"
+
+
+def stub_completion(payload):
+    """Deterministic chat completion: SQL for the SQL model, prose for everything else."""
+    content = f"```sql\n{STUB_SQL}\n```" if payload.get("model") == "gemma2-9b-it" else STUB_ANSWER
+    return {"choices": [{"message": {"role": "assistant", "content": content}}],
+            "usage": {"prompt_tokens": 0, "completion_tokens": 0}}
+
+
+class StubLLMAdapter(BaseAdapter):
+    """requests transport that answers chat completions locally after a fixed delay."""
+
+    def __init__(self, latency):
+        super().__init__()
+        self.latency = latency
+
+    def send(self, request, **kwargs):
+        time.sleep(self.latency)
+        response = requests.Response()
+        response.status_code = 200
+        response._content = json.dumps(stub_completion(json.loads(request.body))).encode("utf-8")
+        response.headers["Content-Type"] = "application/json"
+        response.encoding = "utf-8"
+        response.url = request.url
+        response.request = request
+        return response
+
+    def close(self):
+        pass
+
+
+def async_stub_transport(latency):
+    """httpx transport that answers chat completions locally after a fixed (non-blocking) delay."""
+    async def handler(request):
+        await asyncio.sleep(latency)
+        return httpx.Response(200, json=stub_completion(json.loads(request.content)))
+    return httpx.MockTransport(handler)
+
+
+class FakeCursor:
+    def __init__(self, latency):
+        self.latency = latency
+        self.description = [("vehicle_count",)]
+
+    def execute(self, query, params=None):
+        time.sleep(self.latency)  # blocking, like the real driver
+        self.rows = [(42,)]
+
+    def fetchall(self):
+        rows, self.rows = self.rows, []
+        return rows
+
+    def fetchmany(self, size=1):
+        rows, self.rows = self.rows[:size], self.rows[size:]
+        return rows
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    def __init__(self, latency):
+        self.latency = latency
+
+    def cursor(self, *args, **kwargs):
+        return FakeCursor(self.latency)
+
+    def is_connected(self):
+        return True
+
+    def close(self):
+        pass
+
+
+def install_stubs(llm_latency, db_latency, db_pool_size):
+    import llmclient
+    import sqlgen
+    from dbpool import ConnectionPool
+
+    session = llmclient.get_session()
+    adapter = StubLLMAdapter(llm_latency)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    llmclient.configure_async(async_stub_transport(llm_latency))
+    sqlgen.db_pool = ConnectionPool(lambda: FakeConnection(db_latency), size=db_pool_size)
+
+
+def summarize(mode, latencies, statuses, elapsed, concurrency):
+    return {
+        "mode": mode,
+        "requests": len(latencies),
+        "concurrency": concurrency,
+        "ok": sum(1 for status in statuses if status == 200),
+        "elapsed_sec": round(elapsed, 3),
+        "req_per_sec": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 1),
+    }
+
+
+def run_flask(total, concurrency, plant_code):
+    import main
+
+    def worker(worker_id, count):
+        client = main.app.test_client()  # one cookie jar per simulated user
+        results = []
+        for i in range(count):
+            query = f"How many vehicles are in YARD-IN for shift {worker_id}-{i}?"
+            start = time.perf_counter()
+            response = client.post("/chat", json={"query": query, "plantCode": plant_code})
+            results.append((time.perf_counter() - start, response.status_code))
+        return results
+
+    per_worker = [total // concurrency + (1 if i < total % concurrency else 0) for i in range(concurrency)]
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        chunks = list(executor.map(worker, range(concurrency), per_worker))
+    elapsed = time.perf_counter() - start
+    results = [item for chunk in chunks for item in chunk]
+    return summarize("flask-threads", [r[0] for r in results], [r[1] for r in results], elapsed, concurrency)
+
+
+async def run_asgi(total, concurrency, plant_code):
+    import asgi_main
+
+    async def worker(worker_id, count):
+        transport = httpx.ASGITransport(app=asgi_main.app)
+        results = []
+        async with httpx.AsyncClient(transport=transport, base_url="http://loadtest") as client:
+            for i in range(count):
+                query = f"How many vehicles are in YARD-IN for shift {worker_id}-{i}?"
+                start = time.perf_counter()
+                response = await client.post("/chat", json={"query": query, "plantCode": plant_code})
+                results.append((time.perf_counter() - start, response.status_code))
+        return results
+
+    per_worker = [total // concurrency + (1 if i < total % concurrency else 0) for i in range(concurrency)]
+    start = time.perf_counter()
+    chunks = await asyncio.gather(*(worker(i, n) for i, n in enumerate(per_worker)))
+    elapsed = time.perf_counter() - start
+    results = [item for chunk in chunks for item in chunk]
+    return summarize("asgi-async", [r[0] for r in results], [r[1] for r in results], elapsed, concurrency)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Concurrent /chat throughput against stubbed LLM and DB backends.")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--llm-latency", type=float, default=0.3, help="Seconds per stubbed LLM call.")
+    parser.add_argument("--db-latency", type=float, default=0.05, help="Seconds per stubbed query.")
+    parser.add_argument("--db-pool-size", type=int, default=10)
+    parser.add_argument("--plant-code", default="NE03")
+    parser.add_argument("--mode", choices=["both", "flask", "asgi"], default="both")
+    args = parser.parse_args()
+
+    # Import the apps from the repo directory, then write their logs into a scratch directory
+    with contextlib.redirect_stdout(io.StringIO()):
+        import main  # noqa: F401
+        import asgi_main  # noqa: F401
+    install_stubs(args.llm_latency, args.db_latency, args.db_pool_size)
+    os.chdir(tempfile.mkdtemp(prefix="loadtest_"))
+
+    reports = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        if args.mode in ("both", "flask"):
+            reports.append(run_flask(args.requests, args.concurrency, args.plant_code))
+        if args.mode in ("both", "asgi"):
+            reports.append(asyncio.run(run_asgi(args.requests, args.concurrency, args.plant_code)))
+
+    for report in reports:
+        print(json.dumps(report))
+    sys.exit(0 if all(report["ok"] == report["requests"] for report in reports) else 1)
@@ -1,4 +1,4 @@
-from flask import Flask, request, jsonify, session
+from flask import Flask, request, jsonify, session, Response, stream_with_context, g
 import uuid
 from datetime import timedelta, datetime, timezone
 import logging
@@ -9,7 +9,16 @@ import mysql.connector
 import re
 import json
 from sqlgen import generate_sql_from_nl, execute_sql, get_response, extract_plant_from_query
-from nlgen import generate_natural_language_response
+from sessionstore import create_session_store
+from nlgen import (generate_natural_language_response, stream_natural_language_response, finalize_nl_response,
+                   NLGenerationError)
+from eventlog import log_event, debug, QUERY_EVENT_LOG
+from tracing import (REQUEST_ID_HEADER, new_request_id, start_trace, use_trace, current_trace, finish_trace,
+                     stage)
+from metrics import render_prometheus, PROMETHEUS_CONTENT_TYPE
+from retrieval import FEW_SHOT_K, RETRIEVAL_WARMUP, warm_up, readiness
+from sqlcache import SQL_CACHE_SEMANTIC
+from tokencount import warm_up as warm_up_tokenizer
 
 app = Flask(__name__)
 CORS(app)
@@ -30,45 +39,55 @@ logging.basicConfig(
 )
 
 # --- NEW: JSON Logging Setup ---
-JSON_LOG_FILE = "query_logs.jsonl"  # Separate log for structured data
+JSON_LOG_FILE = QUERY_EVENT_LOG  # Separate log for structured data, written in batches (see eventlog.py)
 # --- End of JSON Logging Setup ---
 
-# Global session_data (existing)
-session_data = {}
+# Per-session entities and history, bounded and expiring (see sessionstore.py)
+session_data = create_session_store("main")
+
+# Load the embedding model, few-shot index and prompt tokenizer before the first request needs them (see /ready)
+if RETRIEVAL_WARMUP != "off":
+    warm_up(model=FEW_SHOT_K > 0 or SQL_CACHE_SEMANTIC, index=FEW_SHOT_K > 0,
+            background=RETRIEVAL_WARMUP != "blocking")
+    warm_up_tokenizer(background=RETRIEVAL_WARMUP != "blocking")
 
 def get_session():
     """Gets or initializes the user session."""
     if 'session_id' not in session:
         session['session_id'] = str(uuid.uuid4())
-        session_data[session['session_id']] = {
-            "entities": {},
-            "history": []
-        }
 
     session_id = session['session_id']
-    current_session = session_data.get(session_id)
-
-    if current_session is None:
-        current_session = {
-            "entities": {},
-            "history": []
-        }
-        session_data[session_id] = current_session
+    current_session = session_data.get_or_create(session_id)
 
     return session_id, current_session
 
 @app.before_request
 def before_request():
-    """Ensure session is initialized before processing any request."""
-    get_session()
+    """Ensure session is initialized before processing any request, and start its trace."""
+    g.trace = start_trace(new_request_id(request.headers.get(REQUEST_ID_HEADER)))
+    if request.endpoint not in ("metrics", "ready"):  # scrapes and probes should not create chat sessions
+        get_session()
+
+@app.after_request
+def after_request(response):
+    """Returns the request id; streamed responses finish their trace when the stream ends."""
+    trace = g.get("trace")
+    if trace is not None:
+        response.headers[REQUEST_ID_HEADER] = trace.request_id
+        if not response.is_streamed:
+            finish_trace(trace, request.endpoint or "unknown")
+    return response
 
 def extract_vehicle_number(user_query):
     match = re.search(r'\b[A-Z]{2}\d{2}[A-Z]{2}\d{4}\b', user_query)
     return match.group(0) if match else "the vehicle"
 
 # --- NEW:  JSON Logging Function ---
-def log_query_json(user_query, sql_query, bot_response, error=None, feedback=None):
-    """Logs query details to a JSON file."""
+def log_query_json(user_query, sql_query, bot_response, error=None, feedback=None, session_id=None, plant_code=None):
+    """
+    Queues query details for the JSON log; the write happens on the log writer thread.
+    Session fields default to the current Flask session.
+    """
     try:
         log_entry = {
             "timestamp": datetime.now(timezone.utc).isoformat(),
@@ -76,21 +95,31 @@ def log_query_json(user_query, sql_query, bot_response, error=None, feedback=Non
             "sql_query": sql_query,
             "bot_response": bot_response,
             "error": str(error) if error else None,
-            "session_id": session.get('session_id'),
-            "plant_code": session.get('plant_code'),
-            "feedback": feedback  # Added feedback field
+            "session_id": session_id if session_id is not None else session.get('session_id'),
+            "plant_code": plant_code if plant_code is not None else session.get('plant_code'),
+            "feedback": feedback,  # Added feedback field
         }
-        with open(JSON_LOG_FILE, "a") as f:
-            f.write(json.dumps(log_entry) + "\n")
+        trace = current_trace()
+        if trace is not None:
+            log_entry["request_id"] = trace.request_id  # same value as the X-Request-ID response header
+            log_entry["trace"] = trace.to_dict()
+        log_event(log_entry, JSON_LOG_FILE)
     except Exception as e:
         logging.error(f"JSON Log Error: {e}")
 # --- End of JSON Logging Function ---
 
-@app.route("/chat", methods=["POST"])
-def chat():
-    """Handles user queries, generates SQL, executes it, and generates a natural language response."""
+def start_chat_turn(data):
+    """
+    Validates a chat request and resolves its plant code (shared by /chat and /chat/stream).
 
-    data = request.get_json()
+    Args:
+        data (dict): The JSON request body.
+
+    Returns:
+        tuple: (user_query, plant_code, current_session, early_response). early_response is a
+               finished JSON response (validation error, predefined reply or unauthorized plant)
+               that should be returned as-is, or None to continue with the SQL pipeline.
+    """
     user_query = data.get("query")
     plant_code = data.get("plantCode")
 
@@ -99,48 +128,63 @@ def chat():
     # Update plant code if provided
     if plant_code:
         session['plant_code'] = plant_code
-        print(f"plant_code set in session: {session['plant_code']}")
+        debug(f"plant_code set in session: {session['plant_code']}")
     else:
         plant_code = session.get('plant_code')
-        print(f"plant_code retrieved from session: {plant_code}")
+        debug(f"plant_code retrieved from session: {plant_code}")
 
     if not plant_code:
-        return jsonify({"response": "Error: Plant code must be provided."}), 400
+        return user_query, plant_code, current_session, (jsonify({"response": "Error: Plant code must be provided."}), 400)
 
     vehicle_number = extract_vehicle_number(user_query)
     if vehicle_number:
         current_session['entities']['vehicle_number'] = vehicle_number
+        session_data.save(session_id, current_session)
 
     logging.info(f"\n==== New Chat ====\nUser: {user_query}")
 
     if not user_query:
-        return jsonify({"response": "Please enter a valid question."}), 400
+        return user_query, plant_code, current_session, (jsonify({"response": "Please enter a valid question."}), 400)
 
-    predefined_reply = get_response(user_query.lower())
+    with stage("get_response"):
+        predefined_reply = get_response(user_query.lower())
     if predefined_reply:
         current_session['history'].append({"user": user_query, "bot": predefined_reply})
+        session_data.save(session_id, current_session)
         logging.info(f"Bot: {predefined_reply}")
         log_query_json(user_query, "N/A", predefined_reply) # JSON Log for predefined reply
-        return jsonify({"response": predefined_reply, "query": user_query})
+        return user_query, plant_code, current_session, jsonify({"response": predefined_reply, "query": user_query})
 
-    queried_plant_code, queried_plant_name = extract_plant_from_query(user_query)
+    with stage("extract_plant"):
+        queried_plant_code, queried_plant_name = extract_plant_from_query(user_query)
 
     if queried_plant_code:
         if queried_plant_code != session.get('plant_code'):
-            return jsonify({
+            return user_query, plant_code, current_session, (jsonify({
                 "response": "Oops! It looks like you're trying to access information from a plant you're not authorized to. Please check the plant you're trying to query or contact support if you think there's a mistake."
-            }), 200
+            }), 200)
         else:
             session['plant_code'] = queried_plant_code
-            print(f"plant_code updated in session: {session['plant_code']}")
+            debug(f"plant_code updated in session: {session['plant_code']}")
     else:
         plant_code = session.get('plant_code')
-        print(f"plant_code retrieved from session: {plant_code}")
+        debug(f"plant_code retrieved from session: {plant_code}")
+
+    return user_query, plant_code, current_session, None
+
+@app.route("/chat", methods=["POST"])
+def chat():
+    """Handles user queries, generates SQL, executes it, and generates a natural language response."""
+
+    user_query, plant_code, current_session, early_response = start_chat_turn(request.get_json())
+    if early_response is not None:
+        return early_response
 
     try:
-        sql_query = generate_sql_from_nl(user_query, plant_code=plant_code)
+        with stage("generate_sql"):
+            sql_query = generate_sql_from_nl(user_query, plant_code=plant_code)
 
-        print(f"SQL Query from generate_sql_from_nl: {sql_query}")
+        debug(f"SQL Query from generate_sql_from_nl: {sql_query}")
 
         if sql_query.strip().lower().startswith("sorry") or "could you please clarify" in sql_query.lower():
             log_query_json(user_query, "N/A", sql_query) # JSON Log for clarification/sorry
@@ -151,20 +195,23 @@ def chat():
             log_query_json(user_query, "N/A", "Error in SQL generation", error=sql_query['error'])  # JSON Log
             return jsonify({"response": "Sorry, I could not understand your query.", "query": user_query}), 200
 
-        sql_result = execute_sql(sql_query, plant_code=plant_code)
+        with stage("execute_sql"):
+            sql_result = execute_sql(sql_query, plant_code=plant_code)
         if "error" in sql_result:
             logging.error(f"SQL Execution Error: {sql_result['error']}")
             log_query_json(user_query, sql_query, "Error in SQL execution", error=sql_result['error'])  # JSON Log
             return jsonify(
                 {"response": "Sorry, I encountered an error while querying the database.", "query": user_query}), 500
 
-        nl_response = generate_natural_language_response(sql_result, user_query)
-        if "error" in nl_response:
-            logging.error(f"NLG Error: {nl_response['error']}")
-            log_query_json(user_query, sql_query, "Error in NL generation", error=nl_response['error'])  # JSON Log
+        with stage("generate_nl"):
+            nl_response = generate_natural_language_response(sql_result, user_query)
+        if nl_response.startswith("Error:"):
+            logging.error(f"NLG Error: {nl_response}")
+            log_query_json(user_query, sql_query, "Error in NL generation", error=nl_response)  # JSON Log
             return jsonify({"response": "Sorry, I could not generate a response.", "query": user_query}), 500
 
         current_session['history'].append({"user": user_query, "bot": nl_response})
+        session_data.save(session['session_id'], current_session)
         logging.info(f"Bot: {nl_response}")
         log_query_json(user_query, sql_query, nl_response)  # JSON Log (Success)
         return jsonify({"response": nl_response, "query": user_query})
@@ -186,6 +233,90 @@ def chat():
         return jsonify({"response": "Sorry, I cannot process your query at the moment. Please try again later.",
                         "query": user_query}), 500
 
+def sse_event(event, data):
+    """Formats one Server-Sent Event with a JSON payload."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@app.route("/chat/stream", methods=["POST"])
+def chat_stream():
+    """
+    Streaming version of /chat over Server-Sent Events.
+
+    Emits "status" events for each pipeline stage, "token" events with pieces of the answer as
+    Llama 3 produces them, then one "done" event with the final response (or "error" on failure).
+    Requests answered before the pipeline starts (validation errors, predefined replies) get
+    the same JSON response as /chat.
+    """
+
+    user_query, plant_code, current_session, early_response = start_chat_turn(request.get_json())
+    if early_response is not None:
+        return early_response
+
+    trace = g.trace
+
+    def generate():
+        use_trace(trace)  # the body is produced after after_request has run
+        try:
+            yield sse_event("status", {"stage": "generating_sql", "message": "Understanding your question..."})
+            with stage("generate_sql"):
+                sql_query = generate_sql_from_nl(user_query, plant_code=plant_code)
+
+            if sql_query.strip().lower().startswith("sorry") or "could you please clarify" in sql_query.lower():
+                log_query_json(user_query, "N/A", sql_query)
+                yield sse_event("done", {"response": sql_query, "query": user_query})
+                return
+
+            yield sse_event("status", {"stage": "querying_database", "message": "Fetching data..."})
+            with stage("execute_sql"):
+                sql_result = execute_sql(sql_query, plant_code=plant_code)
+            if "error" in sql_result:
+                logging.error(f"SQL Execution Error: {sql_result['error']}")
+                log_query_json(user_query, sql_query, "Error in SQL execution", error=sql_result['error'])
+                yield sse_event("error", {"response": "Sorry, I encountered an error while querying the database.",
+                                          "query": user_query})
+                return
+
+            yield sse_event("status", {"stage": "generating_response", "message": "Writing the answer..."})
+            pieces = []
+            with stage("generate_nl"):
+                for piece in stream_natural_language_response(sql_result, user_query):
+                    pieces.append(piece)
+                    yield sse_event("token", {"text": piece})
+            nl_response = finalize_nl_response("".join(pieces).strip())
+
+            current_session['history'].append({"user": user_query, "bot": nl_response})
+            session_data.save(session['session_id'], current_session)
+            logging.info(f"Bot: {nl_response}")
+            log_query_json(user_query, sql_query, nl_response)
+            yield sse_event("done", {"response": nl_response, "query": user_query})
+
+        except NLGenerationError as nl_error:
+            # Tokens already sent are incomplete; the client replaces them with this message
+            logging.error(f"NLG Error: {nl_error}")
+            log_query_json(user_query, sql_query, "Error in NL generation", error=str(nl_error))
+            yield sse_event("error", {"response": "Sorry, I could not generate a response.", "query": user_query})
+        except mysql.connector.Error as db_error:
+            logging.error(f"Database error: {str(db_error)}")
+            log_query_json(user_query, "N/A", "Database Connection Error", error=str(db_error))
+            yield sse_event("error", {"response": "Sorry, I'm having trouble connecting to the database. Please try again later.",
+                                      "query": user_query})
+        except requests.exceptions.RequestException as api_error:
+            logging.error(f"LLM API error: {str(api_error)}")
+            log_query_json(user_query, "N/A", "LLM API Error", error=str(api_error))
+            yield sse_event("error", {"response": "Sorry, I'm unable to process your request due to an API issue. Please try again later.",
+                                      "query": user_query})
+        except Exception as e:
+            logging.exception("An unexpected error occurred: ", exc_info=True)
+            log_query_json(user_query, "N/A", "Unexpected Error", error=str(e))
+            yield sse_event("error", {"response": "Sorry, I cannot process your query at the moment. Please try again later.",
+                                      "query": user_query})
+        finally:
+            finish_trace(trace, "chat_stream")
+
+    # stream_with_context keeps the Flask session readable while the generator runs
+    return Response(stream_with_context(generate()), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
 @app.route("/feedback", methods=["POST"])
 def feedback():
     """Handles user feedback on bot responses."""
@@ -220,11 +351,22 @@ def feedback():
     except Exception as e:
         return jsonify({"message": f"Error: {str(e)}"}), 500
 
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    """Prometheus scrape endpoint: per-stage, LLM, token, row and cache-path histograms."""
+    return Response(render_prometheus(), mimetype=None, content_type=PROMETHEUS_CONTENT_TYPE)
+
+@app.route("/ready", methods=["GET"])
+def ready():
+    """Readiness probe: 503 until the warmed-up retrieval components are loaded, or if one failed."""
+    status = readiness()
+    return jsonify(status), 200 if status["ready"] else 503
+
 @app.route("/clear_history", methods=["POST"])
 def clear_history():
     """Clears the conversation history for the current session."""
     session_id, _ = get_session()
-    session_data[session_id] = {'entities': {}, 'history': []}
+    session_data.reset(session_id)
     return jsonify({"message": "Conversation history cleared."}), 200
 
 if __name__ == "__main__":
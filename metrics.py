@@ -0,0 +1,136 @@
+import math
+from collections import deque
+from threading import Lock
+
+# Default latency buckets in seconds (Prometheus-style upper bounds)
+DEFAULT_LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Number of recent observations kept for percentile estimates
+PERCENTILE_WINDOW = 2048
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Every HistogramFamily by name, for the /metrics exposition
+_registry = {}
+_registry_lock = Lock()
+
+
+def percentile(values, pct):
+    """
+    Returns the pct-th percentile (0-100) of a list of numbers using nearest-rank.
+
+    Returns:
+        float: The percentile value, or 0.0 for an empty list.
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100.0 * len(ordered)))
+    return ordered[rank - 1]
+
+
+class Histogram:
+    """Thread-safe cumulative histogram with a sliding window for p50/p95/p99 estimates."""
+
+    def __init__(self, buckets=DEFAULT_LATENCY_BUCKETS, window=PERCENTILE_WINDOW):
+        self.buckets = tuple(sorted(buckets))
+        self._lock = Lock()
+        self._bucket_counts = [0] * len(self.buckets)
+        self._count = 0
+        self._sum = 0.0
+        self._recent = deque(maxlen=window)
+
+    def observe(self, value):
+        with self._lock:
+            self._count += 1
+            self._sum += value
+            self._recent.append(value)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    self._bucket_counts[i] += 1
+                    break
+
+    def snapshot(self):
+        """
+        Returns:
+            dict: count, sum, cumulative bucket counts keyed by upper bound, and p50/p95/p99
+                  over the recent window.
+        """
+        with self._lock:
+            counts = list(self._bucket_counts)
+            recent = list(self._recent)
+            total, total_sum = self._count, self._sum
+        cumulative, running = {}, 0
+        for bound, count in zip(self.buckets, counts):
+            running += count
+            cumulative[bound] = running
+        cumulative[float("inf")] = total
+        return {
+            "count": total,
+            "sum": total_sum,
+            "buckets": cumulative,
+            "p50": percentile(recent, 50),
+            "p95": percentile(recent, 95),
+            "p99": percentile(recent, 99),
+        }
+
+
+class HistogramFamily:
+    """A set of histograms keyed by a label value (e.g. model name or pipeline stage)."""
+
+    def __init__(self, name, label, buckets=DEFAULT_LATENCY_BUCKETS):
+        self.name = name
+        self.label = label
+        self.buckets = buckets
+        self._lock = Lock()
+        self._histograms = {}
+        with _registry_lock:
+            _registry[name] = self
+
+    def labels(self, value):
+        with self._lock:
+            histogram = self._histograms.get(value)
+            if histogram is None:
+                histogram = self._histograms[value] = Histogram(self.buckets)
+            return histogram
+
+    def observe(self, value, amount):
+        self.labels(value).observe(amount)
+
+    def snapshot(self):
+        with self._lock:
+            items = list(self._histograms.items())
+        return {value: histogram.snapshot() for value, histogram in items}
+
+
+def _label_value(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _bound(bound):
+    return "+Inf" if bound == float("inf") else repr(float(bound))
+
+
+def render_prometheus(families=None):
+    """
+    Renders histogram families in the Prometheus text exposition format.
+
+    Args:
+        families (list, optional): HistogramFamily objects; defaults to every family created so far.
+
+    Returns:
+        str: One "# TYPE <name> histogram" block per family with _bucket/_sum/_count series.
+    """
+    if families is None:
+        with _registry_lock:
+            families = [_registry[name] for name in sorted(_registry)]
+    lines = []
+    for family in families:
+        lines.append(f"# TYPE {family.name} histogram")
+        for value, snapshot in sorted(family.snapshot().items(), key=lambda item: str(item[0])):
+            label = f'{family.label}="{_label_value(value)}"'
+            for bound, count in snapshot["buckets"].items():
+                lines.append(f'{family.name}_bucket{{{label},le="{_bound(bound)}"}} {count}')
+            lines.append(f"{family.name}_sum{{{label}}} {snapshot['sum']}")
+            lines.append(f"{family.name}_count{{{label}}} {snapshot['count']}")
+    return "\n".join(lines) + "\n"
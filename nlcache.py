@@ -0,0 +1,165 @@
+import os
+import re
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+
+# Natural-language answer cache settings (overridable through the environment)
+NL_CACHE_ENABLED = os.getenv("NL_CACHE", "1") == "1"
+NL_CACHE_MAX_ENTRIES = int(os.getenv("NL_CACHE_MAX_ENTRIES", "500"))  # in memory, least recently used evicted
+NL_CACHE_TTL = float(os.getenv("NL_CACHE_TTL", "1800"))  # seconds
+NL_CACHE_PATH = os.getenv("NL_CACHE_PATH", "")  # SQLite file that keeps answers across restarts; empty = memory only
+NL_CACHE_DISK_MAX_ENTRIES = int(os.getenv("NL_CACHE_DISK_MAX_ENTRIES", "5000"))
+
+
+def normalize_user_query(user_query):
+    """Lowercases a question and reduces it to its words, so punctuation and spacing do not change the key."""
+    return " ".join(re.findall(r"[a-z0-9]+", (user_query or "").lower()))
+
+
+def nl_cache_key(user_query, columns, data):
+    """
+    Stable hash of a question and the result it is answered from.
+
+    Args:
+        user_query (str): The original user query.
+        columns (list): Result column names.
+        data (list): Result rows.
+
+    Returns:
+        str: Hex SHA-256 digest of the normalized query, the columns and the serialized rows.
+    """
+    digest = hashlib.sha256()
+    digest.update(normalize_user_query(user_query).encode("utf-8"))
+    digest.update(b"\x00")
+    digest.update(json.dumps([list(columns), [list(row) for row in data]], default=str,
+                             separators=(",", ":")).encode("utf-8"))
+    return digest.hexdigest()
+
+
+class NLCache:
+    """
+    LRU + TTL cache of natural-language answers keyed by nl_cache_key().
+
+    Entries live in memory (at most ``max_entries``). With a ``path`` they are also written
+    through to a SQLite file, so answers survive restarts and are shared by workers using the
+    same file; a memory miss then falls back to the file and promotes the entry.
+    """
+
+    def __init__(self, max_entries=NL_CACHE_MAX_ENTRIES, ttl=NL_CACHE_TTL, path=NL_CACHE_PATH,
+                 disk_max_entries=NL_CACHE_DISK_MAX_ENTRIES, enabled=NL_CACHE_ENABLED):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.path = path or None
+        self.disk_max_entries = disk_max_entries
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._entries = OrderedDict()  # key -> (response, created_at)
+        self._stats = {"hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0, "expirations": 0}
+        if self.enabled and self.path:
+            try:
+                self._conn().execute(
+                    "CREATE TABLE IF NOT EXISTS nl_responses ("
+                    " key TEXT PRIMARY KEY, response TEXT NOT NULL, created_at REAL NOT NULL)")
+                self._conn().execute("CREATE INDEX IF NOT EXISTS nl_responses_age ON nl_responses (created_at)")
+            except sqlite3.Error as e:
+                print(f"NL cache file {self.path} unavailable, caching in memory only: {e}")
+                logging.error(f"NL cache file {self.path} unavailable, caching in memory only: {e}")
+                self.path = None
+
+    def _conn(self):
+        # sqlite3 connections cannot be shared across threads, so keep one per thread
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _remember(self, key, response, created_at):
+        with self._lock:
+            self._entries[key] = (response, created_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    def _load_from_disk(self, key, now):
+        try:
+            row = self._conn().execute("SELECT response, created_at FROM nl_responses WHERE key = ?",
+                                       (key,)).fetchone()
+        except sqlite3.Error as e:
+            logging.error(f"NL cache read failed: {e}")
+            return None
+        if row is None:
+            return None
+        if now - row[1] > self.ttl:
+            with self._lock:
+                self._stats["expirations"] += 1
+            return None
+        return row
+
+    def get(self, key):
+        """Returns the cached answer for a key, or None."""
+        if not self.enabled:
+            return None
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if now - entry[1] <= self.ttl:
+                    self._entries.move_to_end(key)
+                    self._stats["hits"] += 1
+                    return entry[0]
+                del self._entries[key]
+                self._stats["expirations"] += 1
+        if self.path:
+            row = self._load_from_disk(key, now)
+            if row is not None:
+                self._remember(key, row[0], row[1])
+                with self._lock:
+                    self._stats["disk_hits"] += 1
+                return row[0]
+        with self._lock:
+            self._stats["misses"] += 1
+        return None
+
+    def put(self, key, response):
+        """Caches an answer (in memory, and on disk when a path is configured)."""
+        if not self.enabled or not response:
+            return
+        now = time.time()
+        self._remember(key, response, now)
+        if self.path:
+            try:
+                conn = self._conn()
+                conn.execute("INSERT OR REPLACE INTO nl_responses (key, response, created_at) VALUES (?, ?, ?)",
+                             (key, response, now))
+                conn.execute("DELETE FROM nl_responses WHERE created_at < ?", (now - self.ttl,))
+                conn.execute("DELETE FROM nl_responses WHERE key NOT IN ("
+                             " SELECT key FROM nl_responses ORDER BY created_at DESC LIMIT ?)",
+                             (self.disk_max_entries,))
+            except sqlite3.Error as e:
+                logging.error(f"NL cache write failed: {e}")
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+        if self.path:
+            self._conn().execute("DELETE FROM nl_responses")
+
+    def stats(self):
+        """Returns hit/miss counters, the hit rate and the number of entries in memory."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = len(self._entries)
+        stats["backend"] = "sqlite" if self.path else "memory"
+        lookups = stats["hits"] + stats["disk_hits"] + stats["misses"]
+        stats["hit_rate"] = (stats["hits"] + stats["disk_hits"]) / lookups if lookups else 0.0
+        return stats
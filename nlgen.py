@@ -1,8 +1,17 @@
 import os
+import re
+import time
 from dotenv import load_dotenv
 import json
 import logging
 import requests
+from llmclient import chat_completion, completion_content, stream_chat_completion
+from nlcache import NLCache, nl_cache_key
+from columnmeta import COLUMN_METADATA
+from metrics import HistogramFamily
+from resultsummary import summarize_result
+from tokencount import record_prompt_tokens
+from eventlog import debug, LogWriterHandler, QUERY_TEXT_LOG
 from decimal import Decimal
 from datetime import datetime
 
@@ -11,14 +20,19 @@ load_dotenv()
 
 # Setup Logging
 logging.basicConfig(
-    filename="query_logs.txt",
+    handlers=[LogWriterHandler(QUERY_TEXT_LOG)],  # shares query_logs.txt (and its rotation) with log_line()
     level=logging.INFO,
     format="%(asctime)s - %(levelname)s - %(message)s",
 )
 
 # Load credentials
 NLGEN_GROQ_API_KEY = os.getenv("NLGEN_GROQ_API_KEY")  # Groq API Key
-LLM_API_ENDPOINT = "https://api.groq.com/openai/v1/chat/completions"  # Groq's OpenAI compatible endpoint
+
+# When answers are rendered locally instead of by Llama 3: "off" (always the LLM), "simple" (counts,
+# yes/no and vehicle/transporter lists) or "tabular" (also small record sets of descriptive columns)
+NL_RENDER_POLICY = os.getenv("NL_RENDER_POLICY", "tabular")
+NL_RENDER_MAX_ROWS = int(os.getenv("NL_RENDER_MAX_ROWS", "20"))  # larger results go to the LLM
+NL_RENDER_MAX_COLUMNS = int(os.getenv("NL_RENDER_MAX_COLUMNS", "6"))
 
 STATUS_MAPPING = {  # Define status mapping
     "A": "Active",
@@ -29,6 +43,29 @@ STATUS_MAPPING = {  # Define status mapping
 with open("predefined_responses.json", "r") as f:
     predefined_responses = json.load(f)
 
+# Answers already generated for the same question and result rows (see nlcache.py)
+nl_cache = NLCache()
+
+UNHELPFUL_RESPONSES = {"n/a", "null", "none", "i don't know", "no data", "no response"}
+
+# Latency of each answer path: "render" (local), "cache" (nlcache hit) or "llm"
+NL_PATH_LATENCY = HistogramFamily("nl_generation_seconds", "path")
+
+
+class NLGenerationError(Exception):
+    """Raised when a streamed answer fails partway, after some pieces may already have been sent."""
+
+RENDER_OPENING = "Sure! Here's the info you requested:"
+RENDER_CLOSING = "Hope this helps!"
+LIST_COLUMNS = {"vehicleNumber", "transporter_name"}
+YES_NO_VALUES = {"yes": "Yes", "no": "No"}
+COUNT_WORDS = {"count", "cnt", "total"}
+# Column and question words that call for the LLM's summaries, unit conversions and anomaly notes
+ANALYTICAL_COLUMN_WORDS = {"tat", "avg", "average", "sum", "ratio", "percent", "percentage", "min", "max",
+                           "diff", "duration", "minutes", "hours", "days"}
+ANALYTICAL_QUERY_WORDS = {"why", "compare", "comparison", "trend", "trends", "analyze", "analyse", "analysis",
+                          "insight", "insights", "explain", "summary", "summarize", "summarise", "average", "tat"}
+
 
 def format_bot_response(column_name, value, structured=False):
     """
@@ -50,7 +87,8 @@ def format_bot_response(column_name, value, structured=False):
     # Improved: Dynamically create pretty column name
     pretty_col = column_name.replace("_", " ").title()  # Basic transformation
 
-    if "tat" in column_name.lower() and value < 0:
+    # "tat" also matches e.g. "status"; only numeric values can be negative TATs
+    if "tat" in column_name.lower() and isinstance(value, (int, float)) and value < 0:
         value = abs(value)  # Convert negative TAT to positive for logical consistency
         if structured:
             return f"Turnaround Time: {value} minutes (Note: There was an anomaly in the data indicating a negative value.)"
@@ -147,38 +185,124 @@ def convert_decimal_to_float(obj):
     return obj
 
 
-def generate_natural_language_response(sql_result, user_query):
+def nl_path_snapshot():
+    """Returns request counts and latency histograms (incl. p50/p95) per answer path."""
+    return NL_PATH_LATENCY.snapshot()
+
+
+def column_words(column):
+    """Lowercase words of a column name, splitting camelCase, underscores and SQL punctuation."""
+    return set(re.findall(r"[a-z]+", re.sub(r"([a-z])([A-Z])", r"\1 \2", column).lower()))
+
+
+def column_label(column):
+    """Display label for a result column: COLUMN_METADATA label, "Count of ..." or a tidied name."""
+    meta = COLUMN_METADATA.get(column)
+    if meta:
+        return meta["label"]
+    count_match = re.fullmatch(r"\s*count\s*\(\s*(?:distinct\s+)?([\w.]+|\*)\s*\)\s*", column, re.IGNORECASE)
+    if count_match:
+        inner = count_match.group(1).split(".")[-1]
+        return "Count" if inner == "*" else f"Count of {column_label(inner).lower()}"
+    return column.replace("_", " ").strip().capitalize()
+
+
+def format_cell(column, value):
+    """One "Label: value" item of a rendered record."""
+    if column not in COLUMN_METADATA:
+        return format_bot_response(column, value, structured=True)
+    if isinstance(value, Decimal):
+        value = int(value) if value == value.to_integral_value() else float(value)
+    if value is None:
+        value = "Not available"
+    elif "status" in column.lower():
+        value = STATUS_MAPPING.get(str(value).upper(), value)
+    elif isinstance(value, datetime):
+        value = value.strftime("%B %d, %Y, %I:%M %p")
+    return f"{column_label(column)}: {value}"
+
+
+def render_simple_response(columns, data, user_query, policy=None, truncated=False):
     """
-    Generates a natural language response from the structured SQL output using Llama 3 via Groq.
+    Builds the markdown answer locally for result shapes that do not need the LLM.
+
+    Handles single COUNT values, yes/no results (e.g. CASE WHEN EXISTS ... 'yes'/'no') and lists of
+    vehicle numbers or transporter names; with the "tabular" policy also small record sets whose
+    columns are not aggregates. Large results, analytical columns (TAT, averages, ratios, ...) and
+    analytical questions are left to the LLM.
 
     Args:
-        sql_result (dict): The dictionary returned by execute_sql (dictionary with "columns" and "data").
+        columns (list): Result column names.
+        data (list): Result rows (non-empty).
         user_query (str): The original user query.
+        policy (str, optional): "off", "simple" or "tabular". Defaults to NL_RENDER_POLICY.
+        truncated (bool, optional): The result was cut short by execute_sql's caps; left to the LLM.
 
     Returns:
-        str: The natural language response.
+        str: The answer in the same shape the LLM is asked for, or None to use the LLM.
     """
+    policy = policy or NL_RENDER_POLICY
+    if policy not in ("simple", "tabular") or truncated or not columns or not data:
+        return None
+    if len(data) > NL_RENDER_MAX_ROWS or len(columns) > NL_RENDER_MAX_COLUMNS:
+        return None
+    if set(re.findall(r"[a-z]+", user_query.lower())) & ANALYTICAL_QUERY_WORDS:
+        return None
+    if any(column_words(column) & ANALYTICAL_COLUMN_WORDS for column in columns):
+        return None
+
+    lines = None
+    if len(columns) == 1:
+        column = columns[0]
+        values = [row[0] for row in data]
+        value = values[0]
+        if len(values) == 1 and isinstance(value, str) and value.strip().lower() in YES_NO_VALUES:
+            answer = YES_NO_VALUES[value.strip().lower()]
+            lines = [f"- **{answer}**" if column.lower() == "result" else f"- {column_label(column)}: **{answer}**"]
+        elif (len(values) == 1 and column_words(column) & COUNT_WORDS
+              and isinstance(value, (int, Decimal)) and not isinstance(value, bool)):
+            lines = [f"- {column_label(column)}: **{int(value):,}**"]
+        elif column in LIST_COLUMNS:
+            unique_values = list(dict.fromkeys(str(v) for v in values if v is not None))
+            if unique_values:
+                label = column_label(column).lower()
+                count = len(unique_values)
+                lines = [f"There {'is' if count == 1 else 'are'} {count} {label}{'' if count == 1 else 's'}:"]
+                lines += [f"- {v}" for v in unique_values]
+    elif policy == "tabular" and not any(column_words(column) & COUNT_WORDS for column in columns):
+        rows = list(dict.fromkeys(tuple(row) for row in data))
+        lines = ["- " + ", ".join(format_cell(column, value) for column, value in zip(columns, row))
+                 for row in rows]
+
+    if not lines:
+        return None
+    return "\n".join([RENDER_OPENING] + lines + [RENDER_CLOSING])
+
+
+def build_nl_payload(columns, data, user_query, truncated=False):
+    """
+    Builds the Llama 3 chat completion request that turns query results into prose.
 
-    if "error" in sql_result:
-        return f"Sorry, there was an error: {sql_result['error']}"
-
-    columns = sql_result.get("columns", [])
-    data = sql_result.get("data", [])
-
-    if not columns or not data:
-        return "I found no matching results in the database."
+    Args:
+        columns (list): Result column names.
+        data (iterable): Result rows (a list, or a StreamingResult consumed as it is read).
+        user_query (str): The original user query.
+        truncated (bool, optional): execute_sql stopped fetching at its row/byte cap.
 
-    # 1. Prepare Data Representation (for Llama 3 prompt)
-    data_string = ""
-    for row in data:
-        row_dict = dict(zip(columns, row))
-        # Convert Decimal objects to float and datetime objects to string
-        for key, val in row_dict.items():
-            if isinstance(val, Decimal):
-                row_dict[key] = float(val)  # Convert Decimal to float
-            elif isinstance(val, datetime):
-                row_dict[key] = val.strftime("%Y-%m-%d %H:%M:%S")  # Convert datetime to string
-        data_string += json.dumps(row_dict) + "\n"
+    Returns:
+        dict: The chat completion request body.
+    """
+    # 1. Prepare Data Representation (for Llama 3 prompt): columnar, capped by a token budget
+    data_string, summary_stats = summarize_result(columns, data)
+    logging.info(f"NLG result section: {summary_stats}")
+    truncation_note = ""
+    if summary_stats["rows_omitted"]:
+        truncation_note = (f"\n    Note: only {summary_stats['rows_shown']} of {summary_stats['rows_total']} rows are listed; "
+                           f"{summary_stats['rows_omitted']} rows were omitted. List the rows shown, tell the user "
+                           f"how many more exist, and use the summary for totals.\n")
+    if truncated:
+        truncation_note += ("\n    Note: the query matched more rows than could be retrieved, so these results are "
+                            "incomplete. Tell the user the list is partial and suggest narrowing the question.\n")
 
     # 2. Construct Prompt (for Llama 3)
     prompt = f"""
@@ -186,11 +310,11 @@ def generate_natural_language_response(sql_result, user_query):
     Here is the original user query:
     "{user_query}"
 
-    Here is the data from the database:
-    ```json
+    Here is the data from the database (column names first, then one row per line with values separated by " | "):
+    ```
     {data_string}
     ```
-    Use the data to answer the user's query clearly and concisely. Respond in markdown format with the following guidelines:
+{truncation_note}    Use the data to answer the user's query clearly and concisely. Respond in markdown format with the following guidelines:
     **MANDATORY: Opening Sentence Rules**
     - Your response MUST begin with a **natural, friendly sentence** that directly reflects the user’s query.
     - DO NOT use or prepend **any** of the following:
@@ -242,13 +366,13 @@ def generate_natural_language_response(sql_result, user_query):
         • Vehicle Number: X, Material Code: Y, Capacity: Z, Transporter: T
     
     ** Absolutely do NOT mention or suggest any value (e.g., material codes, transporter names, vehicle numbers) that is not explicitly present in the provided data.**
-    - Only use exact values that exist in the JSON. Do not create, assume, or infer possible values.
+    - Only use exact values that exist in the data. Do not create, assume, or infer possible values.
     - Do not list any value if its count is zero or it doesn't exist in the data.
     - If the user asks about something (e.g., “COMPAM”) and it's **not in the data**, respond: “COMPAM is not present in the data.”
 
     **Row Formatting (MANDATORY):**
     - You must include all rows from the data — do not skip, summarize, or limit them unless the user says "top N".
-    - Each dictionary in the data represents one record (e.g., one vehicle).
+    - Each row line in the data represents one record (e.g., one vehicle).
     - Present each record as **one bullet point**, containing all important fields.
     - DO NOT list fields one by one across bullets (e.g., vehicle number on 5 bullets).
     - DO NOT repeat the same field (like Vehicle Number or Material Code) unless it occurs in a **different record**.
@@ -281,10 +405,6 @@ def generate_natural_language_response(sql_result, user_query):
     """
 
     # 3. Call Llama 3 API (via Groq)
-    headers = {
-        "Authorization": f"Bearer {NLGEN_GROQ_API_KEY}",
-        "Content-Type": "application/json",
-    }
     payload = {
         "model": "llama3-8b-8192",
         "messages": [
@@ -299,36 +419,152 @@ def generate_natural_language_response(sql_result, user_query):
         ]
         # "messages": [{"role": "user", "content": prompt}]
     }
+    record_prompt_tokens("nlgen", prompt)
+    return payload
+
+
+def is_unhelpful_response(llm_response):
+    """True for blank or placeholder LLM output that should not be shown (or cached)."""
+    return not llm_response or not llm_response.strip() or llm_response.lower() in UNHELPFUL_RESPONSES
+
+
+def finalize_nl_response(llm_response):
+    """Replaces blank or unhelpful LLM output with a fallback message."""
+    if is_unhelpful_response(llm_response):
+        logging.warning(
+            f"LLM returned an unhelpful or blank response: '{llm_response!r}'")  # Use !r for raw representation
+        fallback_message = "Sorry, I couldn't generate a helpful response for that query. Please try rephrasing or asking something different."
+        logging.info(f"Returning fallback response: '{fallback_message}'")
+        return fallback_message
+    logging.info(f"[Groq/Llama 3 NLG Response]: {llm_response}")
+    return llm_response  # Return response generated by LLM with the footer
+
+
+def generate_natural_language_response(sql_result, user_query):
+    """
+    Generates a natural language response from the structured SQL output using Llama 3 via Groq.
+
+    Args:
+        sql_result (dict): The dictionary returned by execute_sql (dictionary with "columns" and "data").
+        user_query (str): The original user query.
+
+    Returns:
+        str: The natural language response.
+    """
+
+    if "error" in sql_result:
+        return f"Sorry, there was an error: {sql_result['error']}"
+
+    columns = sql_result.get("columns", [])
+    data = sql_result.get("data", [])
+    truncated = sql_result.get("truncated", False)  # execute_sql hit its row/byte cap
+
+    if not columns or not data:
+        return "I found no matching results in the database."
+
+    start = time.perf_counter()
+    rendered_response = render_simple_response(columns, data, user_query, truncated=truncated)
+    if rendered_response is not None:
+        NL_PATH_LATENCY.observe("render", time.perf_counter() - start)
+        return rendered_response
+
+    cache_key = nl_cache_key(user_query, columns, data)
+    cached_response = nl_cache.get(cache_key)
+    if cached_response is not None:
+        NL_PATH_LATENCY.observe("cache", time.perf_counter() - start)
+        return cached_response
+
+    payload = build_nl_payload(columns, data, user_query, truncated=truncated)
 
     try:
-        response = requests.post(LLM_API_ENDPOINT, headers=headers, json=payload,
-                                 timeout=60)  # Adjust timeout as needed
+        response = chat_completion(payload, NLGEN_GROQ_API_KEY)  # Timeouts come from llmclient settings
         response.raise_for_status()
-        llm_response = response.json()['choices'][0]['message']['content'].strip()
-
-        if not llm_response or not llm_response.strip() or llm_response.lower() in {"n/a", "null", "none",
-                                                                                    "i don't know", "no data",
-                                                                                    "no response"}:
-            logging.warning(
-                f"LLM returned an unhelpful or blank response: '{llm_response!r}'")  # Use !r for raw representation
-            fallback_message = "Sorry, I couldn't generate a helpful response for that query. Please try rephrasing or asking something different."
-            logging.info(f"Returning fallback response: '{fallback_message}'")
-            return fallback_message
-        logging.info(f"[Groq/Llama 3 NLG Response]: {llm_response}")
-        return llm_response  # Return response generated by LLM with the footer
+        llm_response = completion_content(response, payload["model"]).strip()
+        NL_PATH_LATENCY.observe("llm", time.perf_counter() - start)
+        if not is_unhelpful_response(llm_response):
+            nl_cache.put(cache_key, llm_response)
+        return finalize_nl_response(llm_response)
     except requests.exceptions.RequestException as e:
         error_message = f"Groq/Llama 3 API error: {e}"
-        print(error_message)
+        debug(error_message)
         logging.error(error_message)
         return f"Error: I encountered an error communicating with the language model: {e}"
     except json.JSONDecodeError as e:
         error_message = f"JSON Decode Error: {e}.  Response Text: {response.text}"
-        print(error_message)
+        debug(error_message)
         logging.error(error_message)
         return "Error: Invalid JSON response from Groq API."
     except Exception as e:
         error_message = f"Unexpected error in generate_natural_language_response: {e}"
-        print(error_message)
+        debug(error_message)
         logging.error(error_message)
         return f"Error: An unexpected error occurred: {e}"
 
+
+
+
+def stream_natural_language_response(sql_result, user_query):
+    """
+    Streaming counterpart of generate_natural_language_response.
+
+    Args:
+        sql_result (dict): The dictionary returned by execute_sql (dictionary with "columns" and "data").
+        user_query (str): The original user query.
+
+    Yields:
+        str: Pieces of the response as Llama 3 produces them. Answers that do not come from the
+             model (SQL errors, empty results, locally rendered or cached answers, API failures)
+             are yielded as a single piece.
+             Pass the joined text through finalize_nl_response() for the final answer.
+
+    Raises:
+        NLGenerationError: The Groq stream failed; the pieces already yielded are incomplete.
+    """
+
+    if "error" in sql_result:
+        yield f"Sorry, there was an error: {sql_result['error']}"
+        return
+
+    columns = sql_result.get("columns", [])
+    data = sql_result.get("data", [])
+    truncated = sql_result.get("truncated", False)  # execute_sql hit its row/byte cap
+
+    if not columns or not data:
+        yield "I found no matching results in the database."
+        return
+
+    start = time.perf_counter()
+    rendered_response = render_simple_response(columns, data, user_query, truncated=truncated)
+    if rendered_response is not None:
+        NL_PATH_LATENCY.observe("render", time.perf_counter() - start)
+        yield rendered_response
+        return
+
+    cache_key = nl_cache_key(user_query, columns, data)
+    cached_response = nl_cache.get(cache_key)
+    if cached_response is not None:
+        NL_PATH_LATENCY.observe("cache", time.perf_counter() - start)
+        yield cached_response
+        return
+
+    payload = build_nl_payload(columns, data, user_query, truncated=truncated)
+
+    pieces = []
+    try:
+        for delta in stream_chat_completion(payload, NLGEN_GROQ_API_KEY):
+            pieces.append(delta)
+            yield delta
+        NL_PATH_LATENCY.observe("llm", time.perf_counter() - start)
+        llm_response = "".join(pieces).strip()
+        if not is_unhelpful_response(llm_response):
+            nl_cache.put(cache_key, llm_response)
+    except requests.exceptions.RequestException as e:
+        error_message = f"Groq/Llama 3 API error: {e}"
+        debug(error_message)
+        logging.error(error_message)
+        raise NLGenerationError(error_message) from e
+    except json.JSONDecodeError as e:
+        error_message = f"JSON Decode Error in stream: {e}"
+        debug(error_message)
+        logging.error(error_message)
+        raise NLGenerationError(error_message) from e
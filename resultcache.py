@@ -0,0 +1,251 @@
+import os
+import re
+import sys
+import time
+import threading
+from datetime import date
+from collections import OrderedDict
+
+# Result cache settings (overridable through the environment); a TTL of 0 disables caching for that class
+RESULT_CACHE_ENABLED = os.getenv("RESULT_CACHE", "1") == "1"
+RESULT_CACHE_MAX_BYTES = int(os.getenv("RESULT_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+RESULT_CACHE_MAX_ENTRY_BYTES = int(os.getenv("RESULT_CACHE_MAX_ENTRY_BYTES", str(4 * 1024 * 1024)))
+RESULT_CACHE_TTLS = {
+    "live": float(os.getenv("RESULT_CACHE_TTL_LIVE", "30")),  # current stage/status of vehicles
+    "today": float(os.getenv("RESULT_CACHE_TTL_TODAY", "120")),  # relative to the current date/time
+    "historical": float(os.getenv("RESULT_CACHE_TTL_HISTORICAL", "3600")),  # fixed date ranges in the past
+    "default": float(os.getenv("RESULT_CACHE_TTL_DEFAULT", "60")),
+}
+RESULT_CACHE_WAIT_TIMEOUT = float(os.getenv("RESULT_CACHE_WAIT_TIMEOUT", "30"))  # max wait on an identical query
+
+_DATE_LITERAL = re.compile(r"'(\d{4})-(\d{2})-(\d{2})")
+_RELATIVE_TIME = re.compile(r"\b(CURRENT_DATE|CURDATE|CURRENT_TIMESTAMP|NOW|SYSDATE|UTC_DATE|INTERVAL)\b", re.IGNORECASE)
+_LIVE_STATE = re.compile(r"\b(mapPlantStageLocation|status)\b", re.IGNORECASE)
+
+# Date predicates: the column (bare, or wrapped in a function such as DATE()) and the date it is compared to
+_COLUMN = r"(?:\w+\s*\(\s*)?([\w.`]+)(?:\s*\))?"
+_DATE = r"'(\d{4}-\d{2}-\d{2})[^']*'"
+_BETWEEN = re.compile(_COLUMN + r"\s+(NOT\s+)?BETWEEN\s+" + _DATE + r"\s+AND\s+" + _DATE, re.IGNORECASE)
+_IN_LIST = re.compile(_COLUMN + r"\s+(NOT\s+)?IN\s*\(([^)]*)\)", re.IGNORECASE)
+_COMPARISON = re.compile(_COLUMN + r"\s*(<=|>=|<>|!=|=|<|>|\bNOT\s+LIKE\b|\bLIKE\b)\s*" + _DATE, re.IGNORECASE)
+_REVERSED_COMPARISON = re.compile(_DATE + r"\s*(<=|>=|<>|!=|=|<|>)\s*" + _COLUMN, re.IGNORECASE)
+_OR = re.compile(r"\bOR\b", re.IGNORECASE)
+_REVERSED_OPERATORS = {"<": ">", "<=": ">=", ">": "<", ">=": "<="}
+
+
+def _parse_date(text):
+    try:
+        return date.fromisoformat(text)
+    except ValueError:
+        return None
+
+
+def _date_upper_bounds(sql):
+    """
+    Finds each date-filtered column's upper bound.
+
+    Returns:
+        dict or None: column -> latest date it can match (the tightest of its upper bounds), or
+        None for a column that is only bounded below (``>=``) or negated. None overall if a date
+        literal is used in a way that is not recognized, or if the query has an OR: the
+        predicates are then not all ANDed, and one branch can leave a column unbounded.
+    """
+    if _OR.search(sql):
+        return None
+    bounds, covered = {}, 0
+
+    def bound(column, upper):
+        column = column.strip("`").lower()
+        current = bounds.get(column)
+        bounds[column] = min(current, upper) if current and upper else current or upper
+
+    for column, negated, first, last in _BETWEEN.findall(sql):
+        covered += 2
+        bound(column, None if negated else _parse_date(last))
+    remaining = _BETWEEN.sub(" ", sql)
+    for column, negated, values in _IN_LIST.findall(remaining):
+        dates = [_parse_date(found) for found in re.findall(_DATE, values)]
+        covered += len(dates)
+        if dates:
+            bound(column, None if negated or None in dates else max(dates))
+    remaining = _IN_LIST.sub(" ", remaining)
+    for column, operator, value in _COMPARISON.findall(remaining):
+        covered += 1
+        operator = " ".join(operator.upper().split())
+        bound(column, _parse_date(value) if operator in ("<", "<=", "=", "LIKE") else None)
+    for value, operator, column in _REVERSED_COMPARISON.findall(_COMPARISON.sub(" ", remaining)):
+        covered += 1
+        operator = _REVERSED_OPERATORS.get(operator, operator)
+        bound(column, _parse_date(value) if operator in ("<", "<=", "=") else None)
+    return bounds if covered == len(_DATE_LITERAL.findall(sql)) else None
+
+
+def classify_query(sql, today=None):
+    """
+    Puts a query in a freshness class.
+
+    Returns:
+        str: "historical" if every date-filtered column has an upper bound before today
+             (BETWEEN, <, <= or = a past date), so no new rows can match; "live" if it reads the
+             current stage/status of vehicles; "today" if it is relative to the current date/time;
+             otherwise "default". An open-ended range (only >= a past date) still counts today's
+             rows, so it is never historical.
+    """
+    today = today or date.today()
+    relative = bool(_RELATIVE_TIME.search(sql))
+    if not relative and _DATE_LITERAL.search(sql):
+        bounds = _date_upper_bounds(sql)
+        if bounds and all(upper is not None and upper < today for upper in bounds.values()):
+            return "historical"
+    if _LIVE_STATE.search(sql):
+        return "live"
+    if relative:
+        return "today"
+    return "default"
+
+
+def estimate_result_bytes(result):
+    """Approximate memory held by an execute_sql result (columns + rows)."""
+    columns = result.get("columns", [])
+    data = result.get("data", [])
+    size = sys.getsizeof(columns) + sum(sys.getsizeof(column) for column in columns) + sys.getsizeof(data)
+    for row in data:
+        size += sys.getsizeof(row) + sum(sys.getsizeof(value) for value in row)
+    return size
+
+
+class _Flight:
+    """One in-progress query that identical concurrent requests wait on."""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+
+
+class ResultCache:
+    """
+    Cache of execute_sql results keyed by (final SQL, parameters, plant code).
+
+    Each entry lives for the TTL of its query class (see classify_query). Memory is bounded by
+    ``max_bytes``, evicting the least recently used entries, and oversized results are not cached.
+    Concurrent identical misses are coalesced: one caller runs the query and the others wait for
+    its result instead of hitting the database again. Error results are never cached.
+    """
+
+    def __init__(self, max_bytes=RESULT_CACHE_MAX_BYTES, max_entry_bytes=RESULT_CACHE_MAX_ENTRY_BYTES,
+                 ttls=None, wait_timeout=RESULT_CACHE_WAIT_TIMEOUT, enabled=RESULT_CACHE_ENABLED):
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes
+        self.ttls = dict(RESULT_CACHE_TTLS, **(ttls or {}))
+        self.wait_timeout = wait_timeout
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (result, expires_at, size, query_class)
+        self._inflight = {}  # key -> _Flight
+        self._bytes = 0
+        self._stats = {"hits": 0, "misses": 0, "coalesced": 0, "evictions": 0, "expirations": 0,
+                       "uncacheable": 0, "invalidations": 0}
+        self._class_stats = {name: {"hits": 0, "misses": 0} for name in self.ttls}
+
+    @staticmethod
+    def _copy(result):
+        # Shallow copy so callers can replace keys without touching the cached entry
+        return dict(result)
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry[2]
+
+    def _store(self, key, result, query_class):
+        ttl = self.ttls.get(query_class, 0)
+        size = estimate_result_bytes(result)
+        with self._lock:
+            if ttl <= 0 or size > self.max_entry_bytes:
+                self._stats["uncacheable"] += 1
+                return
+            self._remove(key)
+            self._entries[key] = (result, time.monotonic() + ttl, size, query_class)
+            self._bytes += size
+            while self._bytes > self.max_bytes and self._entries:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self._stats["evictions"] += 1
+
+    def get_or_execute(self, sql, params, plant_code, run):
+        """
+        Returns the cached result for a query, or runs it (once across concurrent callers).
+
+        Args:
+            sql (str): Final SQL as sent to the database.
+            params (tuple or None): Bound parameters.
+            plant_code (str): Plant code the query was scoped to.
+            run (callable): Executes the query and returns the execute_sql result dict.
+
+        Returns:
+            dict: {"columns": [...], "data": [...]} or {"error": ...}.
+        """
+        if not self.enabled:
+            return run()
+
+        key = (sql, tuple(params) if params else (), plant_code)
+        query_class = classify_query(sql)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[1] > now:
+                    self._entries.move_to_end(key)
+                    self._stats["hits"] += 1
+                    self._class_stats[entry[3]]["hits"] += 1
+                    return self._copy(entry[0])
+                self._remove(key)
+                self._stats["expirations"] += 1
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = _Flight()
+                self._inflight[key] = flight
+                self._stats["misses"] += 1
+                self._class_stats[query_class]["misses"] += 1
+            else:
+                self._stats["coalesced"] += 1
+
+        if not leader:
+            if flight.event.wait(self.wait_timeout) and flight.result is not None:
+                return self._copy(flight.result)
+            return run()  # the first caller failed or is too slow; run it ourselves
+
+        try:
+            result = run()
+            flight.result = result
+            if "error" not in result:
+                self._store(key, result, query_class)
+            return self._copy(result)
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            flight.event.set()
+
+    def invalidate(self, plant_code=None):
+        """Drops all entries, or only those of one plant."""
+        with self._lock:
+            keys = [key for key in self._entries if plant_code is None or key[2] == plant_code]
+            for key in keys:
+                self._remove(key)
+            self._stats["invalidations"] += len(keys)
+
+    def clear(self):
+        self.invalidate()
+
+    def stats(self):
+        """Returns hit/miss/coalesced counters, hit rate, memory use and per-class hits/misses."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = len(self._entries)
+            stats["bytes"] = self._bytes
+            stats["max_bytes"] = self.max_bytes
+            stats["by_class"] = {name: dict(counts) for name, counts in self._class_stats.items()}
+        lookups = stats["hits"] + stats["misses"] + stats["coalesced"]
+        stats["hit_rate"] = (stats["hits"] + stats["coalesced"]) / lookups if lookups else 0.0
+        return stats
@@ -0,0 +1,106 @@
+import os
+import sys
+import logging
+from tracing import record_db_rows
+
+# Result size limits enforced while rows are fetched (overridable through the environment)
+SQL_MAX_ROWS = int(os.getenv("SQL_MAX_ROWS", "5000"))
+SQL_MAX_RESULT_BYTES = int(os.getenv("SQL_MAX_RESULT_BYTES", str(16 * 1024 * 1024)))
+SQL_FETCH_BATCH_SIZE = int(os.getenv("SQL_FETCH_BATCH_SIZE", "500"))
+
+
+def row_bytes(row):
+    """Approximate memory held by one fetched row."""
+    return sys.getsizeof(row) + sum(sys.getsizeof(value) for value in row)
+
+
+class StreamingResult:
+    """
+    Rows of an executed query, fetched from an unbuffered (server-side) cursor in batches.
+
+    Rows are read with fetchmany() as the result is iterated, so only one batch is held by the
+    driver at a time. Fetching stops once ``max_rows`` rows or ``max_bytes`` bytes were returned
+    and more rows remain; ``truncated`` and ``truncated_reason`` ("rows" or "bytes") report it.
+    The connection is handed back through ``release(discard)`` when the rows run out, the result
+    is closed, or a cap is hit; a stream left with unread rows is discarded rather than reused.
+    A result can be iterated only once; use to_dict() for the execute_sql dict.
+    """
+
+    def __init__(self, cursor, release, max_rows=SQL_MAX_ROWS, max_bytes=SQL_MAX_RESULT_BYTES,
+                 batch_size=SQL_FETCH_BATCH_SIZE):
+        self.columns = [desc[0] for desc in cursor.description]
+        self.max_rows = max_rows
+        self.max_bytes = max_bytes
+        self.batch_size = batch_size
+        self.row_count = 0
+        self.bytes = 0
+        self.truncated = False
+        self.truncated_reason = None
+        self._cursor = cursor
+        self._release = release
+        self._iterated = False
+        self._exhausted = False
+        self._closed = False
+
+    def __iter__(self):
+        if self._iterated:
+            raise RuntimeError("StreamingResult can only be iterated once")
+        self._iterated = True
+        try:
+            while not self._closed:
+                batch = self._cursor.fetchmany(self.batch_size)
+                if not batch:
+                    self._exhausted = True
+                    return
+                for row in batch:
+                    if self.row_count >= self.max_rows:
+                        self._truncate("rows")
+                        return
+                    size = row_bytes(row)
+                    if self.bytes + size > self.max_bytes:
+                        self._truncate("bytes")
+                        return
+                    self.row_count += 1
+                    self.bytes += size
+                    yield row
+        finally:
+            self.close()
+
+    def _truncate(self, reason):
+        self.truncated = True
+        self.truncated_reason = reason
+        logging.warning(f"Query result truncated at {self.row_count} rows / {self.bytes} bytes (limit: {reason})")
+
+    def close(self):
+        """Stops fetching and releases the connection (discarded if rows were left unread)."""
+        if self._closed:
+            return
+        self._closed = True
+        record_db_rows(self.row_count)
+        discard = not self._exhausted
+        try:
+            self._cursor.close()
+        except Exception:
+            discard = True  # e.g. "Unread result found" on an abandoned unbuffered cursor
+        self._release(discard)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def to_dict(self):
+        """
+        Fetches the (capped) rows into the dict returned by execute_sql.
+
+        Returns:
+            dict: {"columns": [...], "data": [...]}, plus "truncated": True, "truncated_reason"
+                  and "row_limit"/"byte_limit" when the caps cut the result short.
+        """
+        data = list(self)
+        result = {"columns": self.columns, "data": data}
+        if self.truncated:
+            result.update(truncated=True, truncated_reason=self.truncated_reason,
+                          row_limit=self.max_rows, byte_limit=self.max_bytes)
+        return result
@@ -0,0 +1,118 @@
+import os
+from decimal import Decimal
+from datetime import date, datetime
+from collections import Counter
+from tokencount import count_tokens
+
+# Result serialization settings for the NLG prompt (overridable through the environment)
+NL_RESULT_TOKEN_BUDGET = int(os.getenv("NL_RESULT_TOKEN_BUDGET", "1500"))  # tokens for the listed rows
+NL_RESULT_TOP_VALUES = int(os.getenv("NL_RESULT_TOP_VALUES", "5"))  # most common values listed per text column
+
+CELL_SEPARATOR = " | "
+
+
+def format_cell_value(value):
+    """Compact, prompt-friendly text for one result value."""
+    if value is None:
+        return "null"
+    if isinstance(value, Decimal):
+        value = float(value)
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    if isinstance(value, datetime):
+        return value.strftime("%Y-%m-%d %H:%M:%S")
+    if isinstance(value, (bytes, bytearray)):
+        value = value.decode("utf-8", errors="replace")
+    return str(value).replace("\n", " ").replace("|", "/")
+
+
+class ColumnStats:
+    """Running aggregates for one column: row/null counts, distinct values, min/max and common values."""
+
+    def __init__(self, name):
+        self.name = name
+        self.nulls = 0
+        self.values = Counter()
+        self.minimum = None
+        self.maximum = None
+        self.ordered = True  # False once values of incomparable types were seen
+
+    def add(self, value):
+        if value is None:
+            self.nulls += 1
+            return
+        if isinstance(value, Decimal):
+            value = float(value)
+        self.values[value] += 1
+        if isinstance(value, (int, float, date)) and not isinstance(value, bool) and self.ordered:
+            try:
+                if self.minimum is None or value < self.minimum:
+                    self.minimum = value
+                if self.maximum is None or value > self.maximum:
+                    self.maximum = value
+            except TypeError:
+                self.ordered = False
+
+    def describe(self, top_values=NL_RESULT_TOP_VALUES):
+        parts = [f"{len(self.values)} distinct"]
+        if self.nulls:
+            parts.append(f"{self.nulls} null")
+        if self.ordered and self.minimum is not None:
+            parts.append(f"min {format_cell_value(self.minimum)}, max {format_cell_value(self.maximum)}")
+        elif self.values and top_values > 0:
+            common = self.values.most_common(top_values)
+            if common[0][1] > 1:  # all-unique columns (e.g. vehicle numbers) have no common values
+                parts.append("most common: " + ", ".join(f"{format_cell_value(value)} ({count})"
+                                                         for value, count in common))
+        return f"- {self.name}: " + "; ".join(parts)
+
+
+def summarize_result(columns, rows, budget=NL_RESULT_TOKEN_BUDGET):
+    """
+    Serializes a query result for the NLG prompt within a token budget.
+
+    Column names are written once, followed by one " | "-separated line per row until the budget
+    is used up. Aggregates are collected for every row in the same pass; if rows were left out,
+    the section says how many and adds per-column counts, distinct counts and min/max (or the
+    most common values) across the whole result.
+
+    Args:
+        columns (list): Result column names.
+        rows (iterable): Result rows; consumed once, so a generator or cursor works.
+        budget (int): Maximum tokens for the listed rows.
+
+    Returns:
+        tuple: (section text, stats dict with rows_total, rows_shown, rows_omitted and tokens).
+    """
+    header = "Columns: " + CELL_SEPARATOR.join(columns)
+    stats = [ColumnStats(column) for column in columns]
+    lines = []
+    used = count_tokens(header)
+    rows_total = 0
+    full = False
+    for row in rows:
+        rows_total += 1
+        for column_stats, value in zip(stats, row):
+            column_stats.add(value)
+        if full:
+            continue
+        line = CELL_SEPARATOR.join(format_cell_value(value) for value in row)
+        cost = count_tokens(line)
+        if lines and used + cost > budget:
+            full = True
+            continue
+        lines.append(line)
+        used += cost
+
+    omitted = rows_total - len(lines)
+    parts = [header, f"Rows ({len(lines)} of {rows_total}):", "\n".join(lines)]
+    if omitted:
+        parts.append(f"{omitted} more rows were omitted. Summary of all {rows_total} rows:")
+        parts.append("\n".join(column_stats.describe() for column_stats in stats))
+    section = "\n".join(part for part in parts if part)
+    return section, {
+        "rows_total": rows_total,
+        "rows_shown": len(lines),
+        "rows_omitted": omitted,
+        "tokens": count_tokens(section),
+    }
@@ -0,0 +1,260 @@
+import os
+import time
+import logging
+import threading
+from threading import Lock
+
+# Few-shot retrieval settings (overridable through the environment)
+EMBEDDING_MODEL_NAME = os.getenv("EMBEDDING_MODEL", "sentence-transformers/all-mpnet-base-v2")
+EMBEDDER_BACKEND = os.getenv("EMBEDDER_BACKEND", "sentence-transformers")  # or "onnx" (see embedders.py)
+EMBEDDING_ONNX_PATH = os.getenv("EMBEDDING_ONNX_PATH", "models/embedder-onnx")  # written by `python embedders.py`
+EMBEDDING_THREADS = int(os.getenv("EMBEDDING_THREADS", "0"))  # ONNX Runtime threads; 0 = its default
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "1024"))  # cached query embeddings; 0 disables
+FEW_SHOT_INDEX_PATH = os.getenv("FEW_SHOT_INDEX_PATH", "plant_data.index")
+FEW_SHOT_METADATA_PATH = os.getenv("FEW_SHOT_METADATA_PATH", "plant_data.metadata")
+FEW_SHOT_K = int(os.getenv("FEW_SHOT_K", "3"))
+FEW_SHOT_MIN_SIMILARITY = float(os.getenv("FEW_SHOT_MIN_SIMILARITY", "0.3"))  # cosine similarity cutoff
+FEW_SHOT_INDEX_MMAP = os.getenv("FEW_SHOT_INDEX_MMAP", "1") == "1"  # map the index read-only, shared by workers
+RETRIEVAL_WARMUP = os.getenv("RETRIEVAL_WARMUP", "background")  # "background", "blocking" or "off" (load on first use)
+
+# The embedder and the index load independently, so a warm-up of one never waits on the other
+_model_lock = Lock()
+_index_lock = Lock()
+_embedder = None
+_loaded_index = None  # (index, metadata) once a load has been attempted, (None, None) if it failed
+
+_status_lock = Lock()
+_status = {
+    "embedding_model": {"state": "not_loaded", "required": False, "backend": EMBEDDER_BACKEND},
+    "few_shot_index": {"state": "not_loaded", "required": False, "path": FEW_SHOT_INDEX_PATH},
+}
+
+
+def _set_status(component, state, **details):
+    """Records a component's load state: not_loaded, loading, ready, failed or disabled."""
+    with _status_lock:
+        _status[component] = dict(_status[component], state=state, **details)
+
+
+def embedder_location():
+    """The configured model: a model name, or the ONNX export directory for the onnx backend."""
+    return EMBEDDING_ONNX_PATH if EMBEDDER_BACKEND == "onnx" else EMBEDDING_MODEL_NAME
+
+
+def get_embedder():
+    """
+    Returns the configured Embedder (see embedders.py), loading it on first use.
+
+    Single-text embeddings go through an LRU cache of EMBEDDING_CACHE_SIZE entries.
+    Raises if the model cannot be loaded.
+    """
+    global _embedder
+    embedder = _embedder
+    if embedder is not None:
+        return embedder
+    with _model_lock:
+        if _embedder is None:
+            _set_status("embedding_model", "loading")
+            start = time.perf_counter()
+            try:
+                from embedders import create_embedder, CachedEmbedder
+                embedder = create_embedder(EMBEDDER_BACKEND, embedder_location(), threads=EMBEDDING_THREADS)
+                if EMBEDDING_CACHE_SIZE > 0:
+                    embedder = CachedEmbedder(embedder, EMBEDDING_CACHE_SIZE)
+            except Exception as e:
+                _set_status("embedding_model", "failed", name=embedder_location(), error=str(e))
+                raise
+            _set_status("embedding_model", "ready", name=embedder.name,
+                        load_sec=round(time.perf_counter() - start, 3), error=None)
+            _embedder = embedder
+        return _embedder
+
+
+def embed_query(text):
+    """Embeds a single text as a unit-length float32 vector (cached)."""
+    return get_embedder().encode_one(text)
+
+
+def embedding_cache_stats():
+    """Hit/miss counters of the query embedding cache, or None if it is disabled or not loaded yet."""
+    embedder = _embedder
+    return embedder.stats() if embedder is not None and hasattr(embedder, "stats") else None
+
+
+def _read_index(faiss, path):
+    """Reads the index memory-mapped when enabled and supported, so processes share its pages."""
+    if FEW_SHOT_INDEX_MMAP:
+        # IO_FLAG_MMAP_IFC (faiss >= 1.8) maps flat, SQ and PQ codes; older releases only map IVF lists
+        mmap_flag = getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP)
+        try:
+            return faiss.read_index(path, mmap_flag | faiss.IO_FLAG_READ_ONLY)
+        except RuntimeError as e:
+            logging.warning(f"Memory-mapping {path} failed ({e}); reading it into memory")
+    return faiss.read_index(path)
+
+
+def load_index():
+    """
+    Loads the FAISS index and its metadata built by vectordb.py (once per process).
+
+    Returns:
+        tuple: (index, metadata), or (None, None) if the files are missing or unreadable.
+    """
+    global _loaded_index
+    loaded = _loaded_index
+    if loaded is not None:
+        return loaded
+    with _index_lock:
+        if _loaded_index is None:
+            _set_status("few_shot_index", "loading")
+            start = time.perf_counter()
+            try:
+                import faiss
+                from examplestore import load_metadata
+                index = _read_index(faiss, FEW_SHOT_INDEX_PATH)
+                metadata = load_metadata(FEW_SHOT_METADATA_PATH)
+                print("FAISS index loaded successfully.")
+                _set_status("few_shot_index", "ready", load_sec=round(time.perf_counter() - start, 3),
+                            vectors=index.ntotal, error=None)
+                _loaded_index = (index, metadata)
+            except Exception as e:
+                print(f"Error loading FAISS index: {e}")
+                logging.error(f"Error loading FAISS index: {e}")
+                _set_status("few_shot_index", "failed", error=str(e))
+                _loaded_index = (None, None)
+        return _loaded_index
+
+
+def reload_index():
+    """Forgets the loaded index so the next retrieval picks up a rebuilt one."""
+    global _loaded_index
+    with _index_lock:
+        _loaded_index = None
+        _set_status("few_shot_index", "not_loaded")
+
+
+def warm_up(model=True, index=True, background=True):
+    """
+    Loads the embedding model and/or the few-shot index ahead of the first request.
+
+    The components it loads become required for readiness() and are marked "loading" before this
+    returns; the ones it skips are marked "disabled". Load failures are logged and reported as
+    "failed"; retrieval then degrades as it would on first use.
+
+    Args:
+        model (bool): Load the embedding model and run one encode (the first call is the slowest).
+        index (bool): Load the FAISS index and its metadata.
+        background (bool): Load on a daemon thread instead of blocking the caller.
+
+    Returns:
+        threading.Thread or None: The warm-up thread when background is set.
+    """
+    for component, wanted, loaded in (("embedding_model", model, _embedder is not None),
+                                      ("few_shot_index", index, _loaded_index is not None)):
+        if not loaded:
+            _set_status(component, "loading" if wanted else "disabled", required=wanted)
+        else:
+            with _status_lock:
+                _status[component]["required"] = wanted
+
+    def load():
+        if index:
+            load_index()
+        if model:
+            try:
+                embed_query("warm-up")
+            except Exception as e:
+                logging.error(f"Embedding model warm-up failed: {e}")
+
+    if not background:
+        load()
+        return None
+    thread = threading.Thread(target=load, name="retrieval-warmup", daemon=True)
+    thread.start()
+    return thread
+
+
+def readiness():
+    """
+    Load state of the heavy retrieval components, for the /ready endpoint.
+
+    Returns:
+        dict: {"ready": bool, "components": {name: {"state", "required", ...}}}. Ready once every
+              component the warm-up loads is "ready" and none has "failed"; components it does
+              not load (warm-up off) are not required and load on first use.
+    """
+    with _status_lock:
+        components = {name: dict(status) for name, status in _status.items()}
+    ready = all(status["state"] == "ready" for status in components.values() if status["required"])
+    failed = any(status["state"] == "failed" for status in components.values())
+    return {"ready": ready and not failed, "components": components}
+
+
+def _lookup_metadata(metadata, idx):
+    """
+    Metadata is keyed by example ID (an ExampleStore from vectordb.py, or a dict from pickled
+    builds) or a positional list (the oldest builds).
+    """
+    if idx < 0:
+        return None
+    if not isinstance(metadata, list):
+        return metadata.get(idx)
+    return metadata[idx] if idx < len(metadata) else None
+
+
+def retrieve_examples(query, k=FEW_SHOT_K, min_similarity=FEW_SHOT_MIN_SIMILARITY):
+    """
+    Finds the few-shot examples (instruction/input/output) closest to a user query.
+
+    Args:
+        query (str): The user's natural language question.
+        k (int): Maximum number of examples to return.
+        min_similarity (float): Examples below this cosine similarity are dropped.
+
+    Returns:
+        list: Example dicts from json.txt with an added "similarity" key, best match first.
+              Empty if retrieval is disabled (k <= 0) or the index is unavailable.
+    """
+    if k <= 0:
+        return []
+    index, metadata = load_index()
+    if index is None or not metadata:
+        return []
+
+    try:
+        import numpy as np
+        vector = np.asarray(embed_query(query), dtype="float32").reshape(1, -1)
+        if vector.shape[1] != index.d:
+            logging.error(f"Few-shot index has {index.d}-dim vectors but the embedder returns {vector.shape[1]}; "
+                          f"rebuild it with vectordb.py")
+            return []
+        distances, ids = index.search(vector, min(k, index.ntotal))
+    except Exception as e:
+        logging.error(f"Few-shot retrieval failed: {e}")
+        return []
+
+    examples = []
+    for distance, idx in zip(distances[0], ids[0]):
+        item = _lookup_metadata(metadata, int(idx))
+        if item is None:
+            continue
+        # L2 indexes return squared distances (approximate for hnsw/ivfpq/sq8); for unit vectors cos = 1 - d^2 / 2
+        similarity = 1.0 - float(distance) / 2.0
+        if similarity < min_similarity:
+            continue
+        example = dict(item)
+        example["similarity"] = similarity
+        examples.append(example)
+    return examples
+
+
+def format_examples(examples):
+    """Renders retrieved examples as a prompt section (empty string when there are none)."""
+    if not examples:
+        return ""
+    lines = ["**Similar Questions and Their SQL (follow the schema above for table and column names):**"]
+    for example in examples:
+        lines.append(f"Question: {example['input']}")
+        lines.append(f"SQL: {example['output']}")
+        lines.append("")
+    return "\n".join(lines)
@@ -0,0 +1,328 @@
+import os
+import json
+import time
+import sqlite3
+import logging
+import threading
+from collections import OrderedDict
+from collections.abc import MutableMapping
+
+# Session store settings (overridable through the environment)
+SESSION_STORE = os.getenv("SESSION_STORE", "memory")  # "memory" (per process) or "sqlite" (shared by workers)
+SESSION_STORE_PATH = os.getenv("SESSION_STORE_PATH", "sessions.db")
+SESSION_IDLE_TTL = float(os.getenv("SESSION_IDLE_TTL", "1800"))  # seconds; matches permanent_session_lifetime
+SESSION_MAX_SESSIONS = int(os.getenv("SESSION_MAX_SESSIONS", "1000"))  # per namespace, least recently used evicted
+SESSION_MAX_HISTORY = int(os.getenv("SESSION_MAX_HISTORY", "20"))  # turns kept per session
+
+# List-valued session fields that grow with every turn and are trimmed to SESSION_MAX_HISTORY
+HISTORY_KEYS = ("history", "entity_history")
+
+
+def new_session_data():
+    """Returns the empty per-session structure used by every chat entry point."""
+    return {"entities": {}, "history": []}
+
+
+def estimate_size(data):
+    """Approximate memory footprint of a session in bytes (its JSON encoding)."""
+    return len(json.dumps(data, default=str).encode("utf-8"))
+
+
+class MemoryBackend:
+    """
+    In-process backend: an OrderedDict in least-recently-used order per namespace.
+
+    Session dicts are stored by reference, so in-place changes are visible immediately;
+    SessionStore.save() still has to be called to trim history and refresh the size estimate.
+    """
+
+    name = "memory"
+
+    def __init__(self, idle_ttl=SESSION_IDLE_TTL, max_sessions=SESSION_MAX_SESSIONS):
+        self.idle_ttl = idle_ttl
+        self.max_sessions = max_sessions
+        self._lock = threading.Lock()
+        self._entries = {}  # namespace -> OrderedDict(session_id -> [data, last_access, size])
+        self._expirations = 0
+        self._evictions = 0
+
+    def _namespace(self, namespace):
+        return self._entries.setdefault(namespace, OrderedDict())
+
+    def _expire(self, entries, now):
+        # Entries are in access order, so the expired ones are all at the front
+        while entries:
+            session_id, entry = next(iter(entries.items()))
+            if now - entry[1] <= self.idle_ttl:
+                break
+            del entries[session_id]
+            self._expirations += 1
+
+    def load(self, namespace, session_id):
+        now = time.monotonic()
+        with self._lock:
+            entries = self._namespace(namespace)
+            self._expire(entries, now)
+            entry = entries.get(session_id)
+            if entry is None:
+                return None
+            entry[1] = now
+            entries.move_to_end(session_id)
+            return entry[0]
+
+    def store(self, namespace, session_id, data, size):
+        now = time.monotonic()
+        with self._lock:
+            entries = self._namespace(namespace)
+            entries[session_id] = [data, now, size]
+            entries.move_to_end(session_id)
+            self._expire(entries, now)
+            while len(entries) > self.max_sessions:
+                entries.popitem(last=False)
+                self._evictions += 1
+
+    def delete(self, namespace, session_id):
+        with self._lock:
+            self._namespace(namespace).pop(session_id, None)
+
+    def session_ids(self, namespace):
+        with self._lock:
+            entries = self._namespace(namespace)
+            self._expire(entries, time.monotonic())
+            return list(entries)
+
+    def stats(self, namespace):
+        with self._lock:
+            entries = self._namespace(namespace)
+            self._expire(entries, time.monotonic())
+            return {
+                "sessions": len(entries),
+                "bytes": sum(entry[2] for entry in entries.values()),
+                "expirations": self._expirations,
+                "evictions": self._evictions,
+            }
+
+
+class SQLiteBackend:
+    """
+    On-disk backend shared by every worker process that points at the same file.
+
+    Sessions are stored as JSON, so a loaded session is a copy: changes must be written
+    back with SessionStore.save(). Expiry and the session cap are enforced on access and
+    by a sweep at most every `sweep_interval` seconds, so the cap can be briefly exceeded.
+    """
+
+    name = "sqlite"
+
+    def __init__(self, path=SESSION_STORE_PATH, idle_ttl=SESSION_IDLE_TTL, max_sessions=SESSION_MAX_SESSIONS,
+                 sweep_interval=5.0):
+        self.path = path
+        self.idle_ttl = idle_ttl
+        self.max_sessions = max_sessions
+        self.sweep_interval = sweep_interval
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._last_sweep = {}  # namespace -> time of last sweep
+        self._expirations = 0
+        self._evictions = 0
+
+        conn = self._conn()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            " namespace TEXT NOT NULL, session_id TEXT NOT NULL, data TEXT NOT NULL,"
+            " last_access REAL NOT NULL, size INTEGER NOT NULL,"
+            " PRIMARY KEY (namespace, session_id))"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS sessions_lru ON sessions (namespace, last_access)")
+
+    def _conn(self):
+        # sqlite3 connections cannot be shared across threads, so keep one per thread
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _sweep(self, namespace, force=False):
+        now = time.time()
+        with self._lock:
+            if not force and now - self._last_sweep.get(namespace, 0.0) < self.sweep_interval:
+                return
+            self._last_sweep[namespace] = now
+        conn = self._conn()
+        expired = conn.execute("DELETE FROM sessions WHERE namespace = ? AND last_access < ?",
+                               (namespace, now - self.idle_ttl)).rowcount
+        count = conn.execute("SELECT COUNT(*) FROM sessions WHERE namespace = ?", (namespace,)).fetchone()[0]
+        evicted = 0
+        if count > self.max_sessions:
+            evicted = conn.execute(
+                "DELETE FROM sessions WHERE namespace = ? AND session_id IN ("
+                " SELECT session_id FROM sessions WHERE namespace = ? ORDER BY last_access ASC LIMIT ?)",
+                (namespace, namespace, count - self.max_sessions)).rowcount
+        with self._lock:
+            self._expirations += max(expired, 0)
+            self._evictions += max(evicted, 0)
+
+    def load(self, namespace, session_id):
+        conn = self._conn()
+        row = conn.execute("SELECT data, last_access FROM sessions WHERE namespace = ? AND session_id = ?",
+                           (namespace, session_id)).fetchone()
+        if row is None:
+            return None
+        now = time.time()
+        if now - row[1] > self.idle_ttl:
+            self.delete(namespace, session_id)
+            with self._lock:
+                self._expirations += 1
+            return None
+        conn.execute("UPDATE sessions SET last_access = ? WHERE namespace = ? AND session_id = ?",
+                     (now, namespace, session_id))
+        return json.loads(row[0])
+
+    def store(self, namespace, session_id, data, size):
+        self._conn().execute(
+            "INSERT INTO sessions (namespace, session_id, data, last_access, size) VALUES (?, ?, ?, ?, ?) "
+            "ON CONFLICT (namespace, session_id) DO UPDATE SET "
+            "data = excluded.data, last_access = excluded.last_access, size = excluded.size",
+            (namespace, session_id, json.dumps(data, default=str), time.time(), size))
+        self._sweep(namespace)
+
+    def delete(self, namespace, session_id):
+        self._conn().execute("DELETE FROM sessions WHERE namespace = ? AND session_id = ?", (namespace, session_id))
+
+    def session_ids(self, namespace):
+        self._sweep(namespace)
+        rows = self._conn().execute("SELECT session_id FROM sessions WHERE namespace = ? ORDER BY last_access",
+                                    (namespace,)).fetchall()
+        return [row[0] for row in rows]
+
+    def stats(self, namespace):
+        self._sweep(namespace, force=True)
+        count, total = self._conn().execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM sessions WHERE namespace = ?", (namespace,)).fetchone()
+        with self._lock:
+            return {"sessions": count, "bytes": total,
+                    "expirations": self._expirations, "evictions": self._evictions}
+
+
+class SessionStore(MutableMapping):
+    """
+    Bounded per-session state (entities, history, ...) keyed by session ID.
+
+    Behaves like the dict it replaces (`store[session_id]`, `in`, assignment), with idle-TTL
+    expiry, a least-recently-used cap on sessions and a cap on history turns per session.
+    Each module uses its own namespace so their session layouts do not collide.
+
+    After changing a session in place, call save() so the change is persisted (SQLite)
+    and the history cap and size accounting are applied.
+    """
+
+    def __init__(self, namespace, backend=None, max_history=SESSION_MAX_HISTORY):
+        self.namespace = namespace
+        self.backend = backend if backend is not None else MemoryBackend()
+        self.max_history = max_history
+
+    def _trim(self, data):
+        for key in HISTORY_KEYS:
+            turns = data.get(key)
+            if isinstance(turns, list) and len(turns) > self.max_history:
+                del turns[:len(turns) - self.max_history]  # in place, so callers' references stay valid
+
+    def __getitem__(self, session_id):
+        data = self.backend.load(self.namespace, session_id)
+        if data is None:
+            raise KeyError(session_id)
+        return data
+
+    def __setitem__(self, session_id, data):
+        self.save(session_id, data)
+
+    def __delitem__(self, session_id):
+        self.backend.delete(self.namespace, session_id)
+
+    def __iter__(self):
+        return iter(self.backend.session_ids(self.namespace))
+
+    def __len__(self):
+        return len(self.backend.session_ids(self.namespace))
+
+    def __contains__(self, session_id):
+        return self.backend.load(self.namespace, session_id) is not None
+
+    def get_or_create(self, session_id, factory=new_session_data):
+        """
+        Returns the session's data, creating (and saving) a fresh one if it is missing or expired.
+
+        Args:
+            session_id (str): The session ID from the Flask/Quart cookie session.
+            factory (callable): Builds the empty structure for a new session.
+
+        Returns:
+            dict: The session data.
+        """
+        data = self.backend.load(self.namespace, session_id)
+        if data is None:
+            data = factory()
+            self.save(session_id, data)
+        return data
+
+    def save(self, session_id, data):
+        """Trims the history, updates the size estimate and persists the session."""
+        self._trim(data)
+        try:
+            size = estimate_size(data)
+        except (TypeError, ValueError) as e:
+            logging.error(f"Session size estimate failed: {e}")
+            size = 0
+        self.backend.store(self.namespace, session_id, data, size)
+
+    def append_turn(self, session_id, user_message, bot_response, key="history"):
+        """Appends one user/bot exchange to a session's history and saves it."""
+        data = self.get_or_create(session_id)
+        data.setdefault(key, []).append({"user": user_message, "bot": bot_response})
+        self.save(session_id, data)
+        return data
+
+    def reset(self, session_id, factory=new_session_data):
+        """Replaces a session with a fresh structure (e.g. for /clear_history)."""
+        data = factory()
+        self.save(session_id, data)
+        return data
+
+    def stats(self):
+        """Returns session count, approximate bytes held and expiry/eviction counters."""
+        stats = self.backend.stats(self.namespace)
+        stats.update({
+            "backend": self.backend.name,
+            "namespace": self.namespace,
+            "max_sessions": self.backend.max_sessions,
+            "max_history": self.max_history,
+            "idle_ttl": self.backend.idle_ttl,
+        })
+        return stats
+
+
+_sqlite_backends = {}
+_sqlite_backends_lock = threading.Lock()
+
+
+def create_session_store(namespace):
+    """
+    Builds the session store for one module using the SESSION_STORE* settings.
+
+    All namespaces in a process share one SQLite backend per file; the in-memory
+    backend is private to each store.
+    """
+    if SESSION_STORE == "sqlite":
+        with _sqlite_backends_lock:
+            backend = _sqlite_backends.get(SESSION_STORE_PATH)
+            if backend is None:
+                backend = SQLiteBackend(SESSION_STORE_PATH)
+                _sqlite_backends[SESSION_STORE_PATH] = backend
+    else:
+        if SESSION_STORE != "memory":
+            logging.error(f"Unknown SESSION_STORE '{SESSION_STORE}', using the in-memory store.")
+        backend = MemoryBackend()
+    return SessionStore(namespace, backend)
@@ -0,0 +1,213 @@
+import os
+import re
+import time
+import hashlib
+import logging
+from collections import OrderedDict
+from threading import Lock
+
+from sqltemplates import BASE_STAGES, STAGE_ALIASES, load_seed_stages, normalize_key
+
+# Cache settings (overridable through the environment)
+SQL_CACHE_TTL = float(os.getenv("SQL_CACHE_TTL", "3600"))  # seconds a generated query stays valid
+SQL_CACHE_MAX_ENTRIES = int(os.getenv("SQL_CACHE_MAX_ENTRIES", "1024"))
+SQL_CACHE_SIMILARITY = float(os.getenv("SQL_CACHE_SIMILARITY", "0.95"))  # cosine cutoff for the semantic tier
+SQL_CACHE_SEMANTIC = os.getenv("SQL_CACHE_SEMANTIC", "0") in ("1", "true", "True")  # enable the embedding tier
+
+# Tokens that change the meaning of otherwise similar questions (vehicle numbers, codes, dates, quoted values)
+_LITERAL_PATTERN = re.compile(r"'[^']*'|\"[^\"]*\"|\b\w*\d\w*\b|\b[A-Z][A-Z\-]{1,}\b")
+# Enumerated values written in any case or spacing ("Gate-In", "gate in"): stages and trip statuses
+STATUS_VALUES = ["Active", "Completed"]
+_PUNCTUATION_PATTERN = re.compile(r"[?!.,;:]+$")
+
+
+def _enumerated_values():
+    """Maps each stage/status value's normalized key to the key it stands for (aliases included)."""
+    values = {normalize_key(value): normalize_key(value)
+              for value in BASE_STAGES + load_seed_stages() + STATUS_VALUES}
+    values.update({alias: normalize_key(stage) for alias, stage in STAGE_ALIASES.items()})
+    return values
+
+
+_ENUMERATED_VALUES = _enumerated_values()
+_ENUMERATED_PATTERN = re.compile(
+    "|".join(r"\b" + r"[\s\-_()]*".join(re.escape(character) for character in key) + r"\b"
+             for key in sorted(_ENUMERATED_VALUES, key=len, reverse=True)),
+    re.IGNORECASE)
+
+
+def normalize_question(question):
+    """Lower-cases, collapses whitespace and strips trailing punctuation from a question."""
+    question = " ".join(question.strip().lower().split())
+    return _PUNCTUATION_PATTERN.sub("", question).strip()
+
+
+def literal_signature(question):
+    """
+    Returns the set of literal values in a question.
+
+    Two questions can only share cached SQL if they mention exactly the same literals, so
+    "latest trip for MH34AB1393" never reuses the SQL generated for "latest trip for MH34AB1394".
+    Stage and status names are matched in any case, so "Gate-In" and "gate in" agree while
+    "Gate-In" and "Gate-Out" do not.
+    """
+    enumerated = {_ENUMERATED_VALUES[normalize_key(match)] for match in _ENUMERATED_PATTERN.findall(question)}
+    remaining = _ENUMERATED_PATTERN.sub(" ", question)
+    return frozenset(enumerated | {token.strip("'\"").lower() for token in _LITERAL_PATTERN.findall(remaining)})
+
+
+def fingerprint(*parts):
+    """Returns a stable hash of the prompt ingredients (schema, template, aliases...)."""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(str(part).encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class SQLCache:
+    """
+    Two-tier cache of generated SQL.
+
+    Tier 1 is an exact lookup on (normalized question, plant code). On a miss, tier 2 compares
+    the question embedding against cached questions for the same plant and returns the closest
+    entry whose cosine similarity reaches ``similarity`` and whose literal values are identical.
+    Entries expire after ``ttl`` seconds and the least recently used entry is evicted when
+    ``max_entries`` is reached. Calling ensure_version() with a new fingerprint (schema or prompt
+    template changed) drops every entry.
+
+    Args:
+        embed_fn (callable, optional): Maps a question to a vector; None disables the semantic tier.
+    """
+
+    def __init__(self, ttl=SQL_CACHE_TTL, max_entries=SQL_CACHE_MAX_ENTRIES,
+                 similarity=SQL_CACHE_SIMILARITY, embed_fn=None):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.similarity = similarity
+        self.embed_fn = embed_fn
+        self.version = None
+        self._lock = Lock()
+        self._entries = OrderedDict()  # (question, plant_code) -> entry dict
+        self._stats = {
+            "exact_hits": 0,
+            "semantic_hits": 0,
+            "misses": 0,
+            "evictions": 0,
+            "expirations": 0,
+            "invalidations": 0,
+        }
+
+    def ensure_version(self, version):
+        """Clears the cache when the prompt/schema fingerprint changes."""
+        with self._lock:
+            if self.version != version:
+                if self._entries:
+                    logging.info("SQL cache invalidated: schema or prompt template changed.")
+                    self._stats["invalidations"] += len(self._entries)
+                self._entries.clear()
+                self.version = version
+
+    def _embed(self, question):
+        """Returns a unit-length numpy vector for the question, or None if embedding is unavailable."""
+        if self.embed_fn is None:
+            return None
+        try:
+            import numpy as np
+            vector = np.asarray(self.embed_fn(question), dtype="float32").ravel()
+            norm = float(np.linalg.norm(vector))
+            return vector / norm if norm else None
+        except Exception as e:
+            logging.warning(f"SQL cache embedding failed, semantic tier skipped: {e}")
+            return None
+
+    def _is_expired(self, entry, now):
+        return self.ttl and now - entry["created_at"] > self.ttl
+
+    def get(self, question, plant_code):
+        """
+        Looks up cached SQL for a question.
+
+        Returns:
+            str: The cached SQL, or None on a miss.
+        """
+        key = (normalize_question(question), plant_code)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if self._is_expired(entry, now):
+                    del self._entries[key]
+                    self._stats["expirations"] += 1
+                else:
+                    self._entries.move_to_end(key)
+                    self._stats["exact_hits"] += 1
+                    return entry["sql"]
+            if self.embed_fn is None:
+                self._stats["misses"] += 1
+                return None
+
+        vector = self._embed(key[0])
+        if vector is None:
+            with self._lock:
+                self._stats["misses"] += 1
+            return None
+        signature = literal_signature(question)
+        with self._lock:
+            best_key, best_score = None, self.similarity
+            for cached_key, cached in self._entries.items():
+                if cached_key[1] != plant_code or cached["vector"] is None:
+                    continue
+                if cached["signature"] != signature or self._is_expired(cached, now):
+                    continue
+                score = float(vector @ cached["vector"])
+                if score >= best_score:
+                    best_key, best_score = cached_key, score
+            if best_key is None:
+                self._stats["misses"] += 1
+                return None
+            self._entries.move_to_end(best_key)
+            self._stats["semantic_hits"] += 1
+            logging.info(f"SQL cache semantic hit ({best_score:.3f}): '{key[0]}' ~ '{best_key[0]}'")
+            return self._entries[best_key]["sql"]
+
+    def put(self, question, plant_code, sql):
+        """Stores the final, validated SQL for a question."""
+        key = (normalize_question(question), plant_code)
+        vector = self._embed(key[0])
+        entry = {
+            "sql": sql,
+            "created_at": time.monotonic(),
+            "vector": vector,
+            "signature": literal_signature(question),
+        }
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    def invalidate(self, question, plant_code):
+        """Removes a single entry (e.g. cached SQL that no longer validates)."""
+        with self._lock:
+            if self._entries.pop((normalize_question(question), plant_code), None) is not None:
+                self._stats["invalidations"] += 1
+
+    def clear(self):
+        with self._lock:
+            self._stats["invalidations"] += len(self._entries)
+            self._entries.clear()
+
+    def stats(self):
+        """
+        Returns:
+            dict: Hit/miss counters, current size and overall hit rate.
+        """
+        with self._lock:
+            snapshot = dict(self._stats)
+            snapshot["size"] = len(self._entries)
+        hits = snapshot["exact_hits"] + snapshot["semantic_hits"]
+        lookups = hits + snapshot["misses"]
+        snapshot["hit_rate"] = hits / lookups if lookups else 0.0
+        return snapshot
@@ -1,15 +1,30 @@
 
 import os
 import json
+import time
 import mysql.connector
 import requests
 import re
 import uuid
-from flask import Flask, request, jsonify,session
-from flask_session import Session
+from flask import jsonify, session
 from dotenv import load_dotenv
 import logging
 from threading import Lock
+from dbpool import ConnectionPool, PoolTimeoutError
+from llmclient import chat_completion, completion_content
+from sqlcache import SQLCache, SQL_CACHE_SEMANTIC, fingerprint
+from retrieval import embed_query, retrieve_examples, format_examples
+from sessionstore import create_session_store, new_session_data
+from tokencount import record_prompt_tokens
+from columnmeta import COLUMN_METADATA
+from sqltemplates import TemplateEngine, ParameterizedSQL, SQL_TEMPLATES_ENABLED
+from resultcache import ResultCache
+from resultstream import StreamingResult
+from sqlguard import guard_sql, explain_guard
+from entityscanner import convert_natural_dates
+from aliasmatcher import AliasResolver, parse_alias_lines, format_alias_line
+from eventlog import log_line, debug
+from metrics import HistogramFamily
 
 # Setup Logging
 # logging.basicConfig(
@@ -18,23 +33,16 @@ from threading import Lock
 #     format="%(asctime)s - %(levelname)s - %(message)s",
 # )
 
-# Restricted SQL keywords for injection prevention
-RESTRICTED_SQL_KEYWORDS = [
-    "delete", "update", "insert", "truncate", "drop", "alter", "create",
-    "replace", "grant", "revoke", "execute", "call", "--", ";", "/*", "*/",
-    "union", "into", "load", "outfile", "dumpfile", "shutdown", "lock"
-]
-
 # Load predefined responses from JSON file
 try:
     with open("predefined_responses.json", "r") as f:
         PREDEFINED_RESPONSES = json.load(f)
 except FileNotFoundError:
-    print("Error: 'predefined_responses.json' not found.  Using empty dict.")
+    debug("Error: 'predefined_responses.json' not found.  Using empty dict.")
     logging.error("Error: 'predefined_responses.json' not found.")
     PREDEFINED_RESPONSES = {}
 except json.JSONDecodeError as e:
-    print(f"Error: Invalid JSON in 'predefined_responses.json': {e}")
+    debug(f"Error: Invalid JSON in 'predefined_responses.json': {e}")
     logging.error(f"Error: Invalid JSON in 'predefined_responses.json': {e}")
     PREDEFINED_RESPONSES = {}  # Ensure it's initialized to an empty dict to prevent errors later.
 
@@ -63,19 +71,14 @@ def get_response(user_input):
     return PREDEFINED_RESPONSES.get(user_input.strip().lower(), None)
 
 def extract_plant_from_query(query):
-    query = query.lower()
-
-    # Check for plant name in query
-    for plant_name, code in PLANT_NAME_CODE_MAP.items():
-        if plant_name in query:
-            return code, plant_name
-
-    # Check for plant code in query (e.g., N205)
-    for code in PLANT_CODE_NAME_MAP:
-        if code in query:
-            return code, PLANT_CODE_NAME_MAP[code]
+    """
+    Finds the plant a query mentions by name or code (e.g. "sindri" or "N205").
 
-    return None, None
+    Returns:
+        tuple: (plant code, plant name), or (None, None) if no plant is mentioned.
+    """
+    match = alias_resolver.resolve(query)
+    return match["plant_code"], match["plant_name"]
 
 def format_sql_result(sql_result):
     if "error" in sql_result:
@@ -90,12 +93,9 @@ def format_sql_result(sql_result):
     return response
 
 def log_query(query):
-    try:
-        with open("query_logs.txt", "a", encoding="utf-8") as f:
-            f.write(f"[SQL] Generated SQL: {query}\n")
-        print(f"Query logged: {query}")
-    except Exception as e:
-        print(f"Error writing to query_logs.txt: {e}")
+    """Queues the generated SQL for query_logs.txt (written in batches, see eventlog.py)."""
+    log_line(f"[SQL] Generated SQL: {query}")
+    debug(f"Query logged: {query}")
 
 def log_error(error_message):
     logging.error(f"[Error]: {error_message}")
@@ -109,17 +109,10 @@ def save_session_history():
             for entry in session['history']:
                 f.write(f"User: {entry['user']}\n")
                 f.write(f"Bot: {entry['bot']}\n\n")
-        print(f"Session history saved: {filename}")
+        debug(f"Session history saved: {filename}")
 
-# Load environment variables
+# Load environment variables (the web apps live in main.py and asgi_main.py; session below is theirs)
 load_dotenv()
-app = Flask(__name__)
-
-# Flask-Session configuration
-app.config["SESSION_PERMANENT"] = False
-app.config["SESSION_TYPE"] = "filesystem"
-app.secret_key = os.getenv("SECRET_KEY", "your-secret-key-here")
-Session(app)
 
 session_lock = Lock()
 
@@ -129,7 +122,6 @@ MYSQL_USER = os.getenv("MYSQL_USER")
 MYSQL_PASSWORD = os.getenv("MYSQL_PASSWORD")
 MYSQL_DATABASE = os.getenv("MYSQL_DATABASE")
 SQLGEN_GROQ_API_KEY = os.getenv("SQLGEN_GROQ_API_KEY")
-LLM_API_ENDPOINT = "https://api.groq.com/openai/v1/chat/completions"
 
 # Database Schema
 CACHED_DB_SCHEMA = """
@@ -174,17 +166,29 @@ The database 'transactionalplms' has the following structure:
    - cityName (string): City name associated with trip.
 """
 
+def open_db_connection():
+    """Opens a new MySQL connection (raises mysql.connector.Error on failure)."""
+    # autocommit stops a reused connection from pinning one REPEATABLE READ snapshot across requests
+    return mysql.connector.connect(
+        host=MYSQL_HOST,
+        user=MYSQL_USER,
+        password=MYSQL_PASSWORD,
+        database=MYSQL_DATABASE,
+        autocommit=True
+    )
+
+# Shared connection pool; connections are opened lazily on first borrow
+db_pool = ConnectionPool(open_db_connection)
+
+# Cache of executed query results, with freshness windows per query class (see resultcache.py)
+result_cache = ResultCache()
+
 def connect_db():
     try:
-        conn = mysql.connector.connect(
-            host=MYSQL_HOST,
-            user=MYSQL_USER,
-            password=MYSQL_PASSWORD,
-            database=MYSQL_DATABASE
-        )
+        conn = open_db_connection()
         return conn
     except mysql.connector.Error as e:
-        print(f"Database connection error: {e}")
+        debug(f"Database connection error: {e}")
         logging.error(f"Database connection error: {e}")
         return None
 
@@ -203,7 +207,7 @@ def validate_sql_query(query):
 
     # Validate WHERE clause format
     if "WHERE" in query.upper():
-        if not re.search(r'\b\w+\s*(=|IN|LIKE|BETWEEN|>|<|>=|<=)\s*[\w\'"\(\)]+', query, re.IGNORECASE):
+        if not re.search(r'\b\w+\s*(=|IN|LIKE|BETWEEN|>|<|>=|<=)\s*[\w\'"\(\)%]+', query, re.IGNORECASE):
             return False, "WHERE clause must contain a valid condition."
 
     return True, "Valid SQL query."
@@ -240,18 +244,29 @@ def fix_generated_sql(query, plant_code=None):
 
     return query
 
-def execute_sql(query, plant_code=None):
+def execute_sql(query, plant_code=None, params=None, stream=False):
     """
     Executes an SQL query against the database.
 
+    Rows are fetched in batches and capped at SQL_MAX_ROWS rows / SQL_MAX_RESULT_BYTES bytes
+    (see resultstream.py); a capped result carries "truncated": True.
+
     Args:
         query (str): The SQL query to execute.
         plant_code (str, optional): The plant code to filter the query. Defaults to None.
+        params (tuple, optional): Values for %s placeholders in the query. Template SQL
+            (ParameterizedSQL) carries its own placeholders and parameters.
+        stream (bool, optional): Return a StreamingResult that fetches rows as it is iterated
+            (bypasses the result cache; close it or iterate it to the end). Defaults to False.
 
     Returns:
         dict: A dictionary containing the column names and data, or an error message.
               Expected keys: 'columns' (list), 'data' (list of lists), or 'error' (str).
+              With stream=True, a StreamingResult unless an error dict is returned.
     """
+    if params is None and isinstance(query, ParameterizedSQL):
+        query, params = query.template, query.params
+
     # Fix SQL format issues and enforce plant code
     query = fix_generated_sql(query, plant_code)
 
@@ -259,57 +274,99 @@ def execute_sql(query, plant_code=None):
     is_valid, msg = validate_sql_query(query)
     if not is_valid:
         error_message = f"SQL Validation Failed: {msg} for query: {query}"
-        print(error_message)
+        debug(error_message)
         logging.error(error_message)
         return {"error": error_message}  # Return structured error
 
-    try:
-        conn = connect_db()
-        if conn is None:  # Check if connection failed
-            error_message = "Database connection failed."
-            print(error_message)
-            logging.error(error_message)
-            return {"error": error_message}  # Return structured error
+    is_safe, msg = is_safe_sql_query(query)
+    if not is_safe:
+        logging.error(f"Restricted SQL rejected: {msg} for query: {query}")
+        return {"error": msg.strip()}
 
-        cursor = conn.cursor()
-        cursor.execute(query)
-        results = cursor.fetchall()
-        column_names = [desc[0] for desc in cursor.description]
+    # Bound the query before it runs: single SELECT, LIMIT on row queries, execution time hint
+    query, guard_error = guard_sql(query)
+    if guard_error:
+        debug(f"SQL guard rejected query: {guard_error}")
+        logging.error(f"SQL guard rejected query: {guard_error}")
+        return {"error": guard_error}
 
-        cursor.close()
-        conn.close()
+    if stream:
+        return open_query_stream(query, params)
 
-        return {"columns": column_names, "data": results}  # Return structured data
+    # Identical queries for the same plant are served from the result cache (one DB round trip per miss)
+    return result_cache.get_or_execute(query, params, plant_code, lambda: run_query(query, params))
 
-    except mysql.connector.Error as e:
+def query_error(e, query):
+    """Logs a failed query and returns the structured error for execute_sql."""
+    if isinstance(e, mysql.connector.Error):
         error_message = f"Database query error: {e} for query: {query}"
-        print(error_message)
+        debug(error_message)
         logging.error(error_message)
         return {"error": error_message}  # Return structured error
+    error_message = f"Unexpected error executing SQL: {e} for query: {query}"
+    debug(error_message)
+    logging.error(error_message)
+    return {"error": "Internal server error"}  # Return structured error
+
+def open_query_stream(query, params=None):
+    """
+    Runs a fixed and validated query on a pooled, unbuffered cursor.
+
+    Returns:
+        StreamingResult: Rows fetched lazily; the connection goes back to the pool when it is done.
+                         On failure, the execute_sql error dict instead.
+    """
+    try:
+        conn = db_pool.acquire()
+    except (mysql.connector.Error, PoolTimeoutError) as e:
+        error_message = "Database connection failed."
+        debug(f"{error_message} {e}")
+        logging.error(f"{error_message} {e}")
+        return {"error": error_message}  # Return structured error
+
+    try:
+        query, explain_error = explain_guard(conn, query, params)  # optional EXPLAIN row estimate check
+        if explain_error:
+            db_pool.release(conn)
+            return {"error": explain_error}
+        cursor = conn.cursor(buffered=False)  # rows stay on the server until fetched
+        cursor.execute(query, params)
+        return StreamingResult(cursor, lambda discard: db_pool.release(conn, discard=discard))
     except Exception as e:
-        error_message = f"Unexpected error executing SQL: {e} for query: {query}"
-        print(error_message)
-        logging.error(error_message)
-        return {"error": "Internal server error"}  # Return structured error
+        db_pool.release(conn, discard=True)  # Only healthy connections go back into the pool
+        return query_error(e, query)
+
+def run_query(query, params=None):
+    """Runs a fixed and validated query and returns the (capped) execute_sql result dict."""
+    result = open_query_stream(query, params)
+    if isinstance(result, dict):
+        return result
+    try:
+        return result.to_dict()  # Return structured data
+    except Exception as e:
+        return query_error(e, query)
 
-def query_groq_api(prompt):
-    url = "https://api.groq.com/openai/v1/chat/completions"
-    headers = {
-        "Authorization": f"Bearer {SQLGEN_GROQ_API_KEY}",
-        "Content-Type": "application/json"
-    }
-    data = {
+def build_sql_payload(prompt):
+    """Chat completion request body for SQL generation."""
+    return {
         "model": "gemma2-9b-it",
         "messages": [{"role": "user", "content": prompt}]
     }
+
+def extract_sql_from_completion(content):
+    """Pulls the SQL out of a ```sql fenced block, or returns the whole completion."""
+    sql_match = re.search(r"```sql\s*(.*?)\s*```", content, re.DOTALL)
+    return sql_match.group(1).strip() if sql_match else content.strip()
+
+def query_groq_api(prompt):
+    data = build_sql_payload(prompt)
     try:
-        response = requests.post(url, headers=headers, json=data)
+        response = chat_completion(data, SQLGEN_GROQ_API_KEY)
         response.raise_for_status()
-        content = response.json()['choices'][0]['message']['content']
-        sql_match = re.search(r"```sql\s*(.*?)\s*```", content, re.DOTALL)
-        return sql_match.group(1).strip() if sql_match else content.strip()
+        content = completion_content(response, data["model"])
+        return extract_sql_from_completion(content)
     except requests.exceptions.RequestException as e:
-        print(f"Groq API error: {e}")
+        debug(f"Groq API error: {e}")
         return "Error generating SQL query."
 
 entity_aliases = """
@@ -402,54 +459,31 @@ entity_aliases = """
 - "trip number" refers to "tripId"
 """
 
-def convert_natural_dates(nl_query):
-    patterns = {
-        r"\b(last|past) (\d+) days?\b": r"DATE_SUB(NOW(), INTERVAL \2 DAY)",
-        r"\b(last|past) (\d+) weeks?\b": r"DATE_SUB(NOW(), INTERVAL \2 WEEK)",
-        r"\b(last|past) (\d+) months?\b": r"DATE_SUB(NOW(), INTERVAL \2 MONTH)",
-        r"\b(last|past) (\d+) years?\b": r"DATE_SUB(NOW(), INTERVAL \2 YEAR)",
-        r"last (\d+) days?": r"DATE_SUB(NOW(), INTERVAL \1 DAY)",
-        r"last (\d+) weeks?": r"DATE_SUB(NOW(), INTERVAL \1 WEEK)",
-        r"last (\d+) months?": r"DATE_SUB(NOW(), INTERVAL \1 MONTH)",
-        r"last (\d+) years?": r"DATE_SUB(NOW(), INTERVAL \1 YEAR)",
-        r"from (\d+) days? ago": r"DATE_SUB(NOW(), INTERVAL \1 DAY)",
-        r"from (\d+) weeks? ago": r"DATE_SUB(NOW(), INTERVAL \1 WEEK)",
-        r"from (\d+) months? ago": r"DATE_SUB(NOW(), INTERVAL \1 MONTH)",
-        r"from (\d+) years? ago": r"DATE_SUB(NOW(), INTERVAL \1 YEAR)",
-    }
-    for pattern, replacement in patterns.items():
-        nl_query = re.sub(pattern, replacement, nl_query, flags=re.IGNORECASE)
-    return nl_query
+# Plant names/codes and the entity_aliases phrases in one automaton (reloadable, see aliasmatcher.py)
+alias_resolver = AliasResolver(PLANT_NAME_CODE_MAP, parse_alias_lines(entity_aliases))
+
+def select_relevant_aliases(nl_query):
+    """Returns only the entity_aliases lines whose phrase appears in the query."""
+    aliases = alias_resolver.resolve(nl_query)["aliases"]
+    return "\n".join(format_alias_line(phrase, column) for phrase, column in aliases)
+
+
+# Keywords a generated query may not contain anywhere, subqueries included (file I/O, table locks,
+# server control). Compiled once; matched with string literals blanked so values cannot trigger it.
+RESTRICTED_SQL_KEYWORDS = ["into", "outfile", "dumpfile", "load", "lock", "shutdown"]
+RESTRICTED_SQL_PATTERN = re.compile(r"\b(?:" + "|".join(RESTRICTED_SQL_KEYWORDS) + r")\b", re.IGNORECASE)
+SQL_STRING_LITERAL_PATTERN = re.compile(r"'(?:[^'\\]|\\.|'')*'|\"(?:[^\"\\]|\\.)*\"")
 
 def is_safe_sql_query(sql_query):
-    """Check if the SQL query is safe (only SELECT statements allowed)."""
-    sql_lower = sql_query.lower().strip()
-    print(f"Checking SQL safety: {sql_query}")  # Debug
-
-    # Check if it starts with SELECT
-    if not sql_lower.startswith("select"):
-        print("Rejected: Does not start with SELECT")  # Debug
-        return False, "Query rejected due to security reason(s): Contains restricted keywords, consider rephrasing your query."
-
-    RESTRICTED_SQL_KEYWORDS = [
-        "delete", "update", "insert", "truncate", "drop", "alter", "create",
-        "replace", "grant", "revoke", "execute", "call", "--", ";", r"/\*", r"\*/",
-        "union", "into", "load", "outfile", "dumpfile", "shutdown", "lock", "set"
-    ]
-
-    for keyword in RESTRICTED_SQL_KEYWORDS:
-        escaped_keyword = re.escape(keyword)
-        if re.search(rf"\b{escaped_keyword}\b", sql_lower):
-            print(f"Rejected: Contains restricted keyword '{keyword}'")  # Debug
-            return False, f" Your query contains a restricted SQL keyword: '{keyword}'. SQL injection is not permitted."
-
-    if ";" in sql_lower and not sql_lower.endswith(";"):
-        print("Rejected: Contains semicolon not at end")  # Debug
-        return False, " Multiple SQL statements are not allowed. Please submit only one SELECT query."
-
-    print("SQL query is safe")  # Debug
+    """Check that the SQL query uses none of the restricted keywords."""
+    match = RESTRICTED_SQL_PATTERN.search(SQL_STRING_LITERAL_PATTERN.sub("''", sql_query))
+    if match:
+        keyword = match.group(0).lower()
+        debug(f"Rejected: Contains restricted keyword '{keyword}'")  # Debug
+        return False, f" Your query contains a restricted SQL keyword: '{keyword}'. SQL injection is not permitted."
     return True, ""
 
+
 def is_plant_related_query(query):
     """
     Checks if the given query is related to plant data using the Groq API.
@@ -459,10 +493,6 @@ def is_plant_related_query(query):
     Query: {query}
     """
 
-    headers = {
-        "Authorization": f"Bearer {SQLGEN_GROQ_API_KEY}",
-        "Content-Type": "application/json"
-    }
     payload = {
         "model": "gemma2-9b-it",
         "messages": [{"role": "user", "content": prompt}],
@@ -470,12 +500,12 @@ def is_plant_related_query(query):
         "max_tokens": 10
     }
     try:
-        response = requests.post(LLM_API_ENDPOINT, headers=headers, json=payload)
+        response = chat_completion(payload, SQLGEN_GROQ_API_KEY)
         response.raise_for_status()
-        content = response.json()['choices'][0]['message']['content'].strip().lower()
+        content = completion_content(response, payload["model"]).strip().lower()
         return "yes" in content
     except requests.exceptions.RequestException as e:
-        print(f"LLM API Error in is_plant_related_query: {e}")
+        debug(f"LLM API Error in is_plant_related_query: {e}")
         logging.error(f"LLM API error in is_plant_related_query: {e}")
         return jsonify(
             {"response": "Sorry, I'm unable to process your request due to an API issue. Please try again later."})
@@ -492,61 +522,6 @@ VALID_TIMESTAMP_COLUMNS = {
     "yardOut", "abortedTime"
 }
 
-COLUMN_METADATA = {
-    "id": {"label": "ID", "type": "int"},
-    "tripId": {"label": "Trip ID", "type": "string"},
-    "plantCode": {"label": "Plant code", "type": "string"},
-    "plant_name": {"label": "Plant name", "type": "string"},
-    "movementCode": {"label": "Movement code", "type": "string"},
-    "TokenNumber": {"label": "Token number", "type": "string"},
-    "materialType": {"label": "Material type", "type": "string"},
-    "material_code": {"label": "Material code", "type": "string"},
-    "vehicleNumber": {"label": "Vehicle number", "type": "string"},
-    "chassis_number": {"label": "Chassis number", "type": "string"},
-    "vehicle_capacity_min": {"label": "Vehicle capacity (min)", "type": "float"},
-    "vehicle_capacity_max": {"label": "Vehicle capacity (max)", "type": "float"},
-    "vehicle_type": {"label": "Vehicle type", "type": "string"},
-    "transporter_name": {"label": "Transporter name", "type": "string"},
-    "country_code": {"label": "Country code", "type": "string"},
-    "mapPlantStageLocation": {"label": "Plant stage location", "type": "string"},
-    "weightType": {"label": "Weight type", "type": "string"},
-    "weighmentDate": {"label": "Weighment date", "type": "datetime"},
-    "weight": {"label": "Weight", "type": "float"},
-    "isToleranceFailed": {"label": "Tolerance failed", "type": "boolean"},
-    "weighbridgeCode": {"label": "Weighbridge code", "type": "string"},
-    "tolWeightLower": {"label": "Lower weight tolerance", "type": "float"},
-    "tolWeightUpper": {"label": "Upper weight tolerance", "type": "float"},
-    "tolerance_Type": {"label": "Tolerance type", "type": "string"},
-    "minimum_alert": {"label": "Minimum alert", "type": "string"},
-    "maximum_alert": {"label": "Maximum alert", "type": "string"},
-    "tolerance_validation": {"label": "Tolerance validation", "type": "string"},
-    "yardIn": {"label": "Yard-in time", "type": "datetime"},
-    "gateIn": {"label": "Gate-in time", "type": "datetime"},
-    "gateOut": {"label": "Gate-out time", "type": "datetime"},
-    "tareWeight": {"label": "Tare weight", "type": "datetime"},
-    "grossWeight": {"label": "Gross weight", "type": "datetime"},
-    "packingIn": {"label": "Packing-in time", "type": "datetime"},
-    "packingOut": {"label": "Packing-out time", "type": "datetime"},
-    "unloadingIn": {"label": "Unloading-in time", "type": "datetime"},
-    "unloadingOut": {"label": "Unloading-out time", "type": "datetime"},
-    "yardOut": {"label": "Yard-out time", "type": "datetime"},
-    "abortedTime": {"label": "Aborted time", "type": "datetime"},
-    "sealNumber": {"label": "Seal number", "type": "string"},
-    "tw": {"label": "Tare weight", "type": "float"},
-    "gw": {"label": "Gross weight", "type": "float"},
-    "igpNumber": {"label": "IGP number", "type": "string"},
-    "driverId": {"label": "Driver ID", "type": "string"},
-    "abortedRemarks": {"label": "Aborted remarks", "type": "string"},
-    "abortedBy": {"label": "Aborted by", "type": "string"},
-    "status": {"label": "Status", "type": "string"},
-    "dinumber": {"label": "DI number", "type": "string"},
-    "diqty": {"label": "DI quantity", "type": "float"},
-    "ponumber": {"label": "PO number", "type": "string"},
-    "po_qty": {"label": "PO quantity", "type": "float"},
-    "consignmentDate": {"label": "Consignment date", "type": "datetime"},
-    "cityName": {"label": "City name", "type": "string"},
-}
-
 def initialize_entity_store():
     if 'entities' not in session:
         session['entities'] = {}
@@ -559,10 +534,9 @@ def initialize_entity_store():
 def build_entity_context():
     initialize_entity_store()
     session_id = session.get('session_id')
-    if session_id not in session_data:
-        session_data[session_id] = {'entities': {}, 'history': []}
+    current_session = session_data.get_or_create(session_id) if session_id else new_session_data()
     entity_context_lines = []
-    for key, value in session_data[session_id]['entities'].items():
+    for key, value in current_session['entities'].items():
         label = COLUMN_METADATA.get(key, {}).get('label', key)
         entity_context_lines.append(f"The {label} is {value}.")
     return "\n".join(entity_context_lines)
@@ -577,8 +551,8 @@ def is_gibberish(query):
         return True
     return False
 
-# Initialize a global dictionary to store session data
-session_data = {}
+# Per-session entity store, bounded and expiring (see sessionstore.py)
+session_data = create_session_store("sqlgen")
 
 # Setup Logging
 logging.basicConfig(
@@ -611,47 +585,8 @@ Ensure you only include conditions directly related to the user's boolean questi
 """
 
 
-def generate_sql_from_nl(nl_query, session_history="", plant_code=None):
-    """Generate an SQL query from a natural language query using the correct schema."""
-
-    if is_gibberish(nl_query):
-        print("Detected gibberish:", nl_query)
-        return "Sorry, I didn't understand your request. Could you please clarify?"
-
-    # if is_boolean_query(nl_query):
-    #     boolean_sql = generate_boolean_sql(nl_query, plant_code, CACHED_DB_SCHEMA, COLUMN_METADATA)
-    #     if boolean_sql:
-    #         print(f"Generated Boolean SQL Query: {boolean_sql}")
-    #         return boolean_sql
-    #     else:
-    #         return "Could not generate specific boolean SQL for this query."
-
-    sql_friendly_query = convert_natural_dates(nl_query)
-
-    # Build structured entity context
-    entity_context = build_entity_context()
-
-    # Detect multiple vehicle numbers
-    vehicle_pattern = r'\b[A-Z]{2}\d{2}[A-Z]{0,2}\d{4}\b'
-    vehicle_numbers = re.findall(vehicle_pattern, nl_query, re.IGNORECASE)
-
-    # Extract timestamp columns from query
-    found_timestamps = [col for col in VALID_TIMESTAMP_COLUMNS if col in nl_query]
-
-    # Ensure exactly 2 timestamps are present for TAT calculation
-    if len(found_timestamps) == 2:
-        start_time, end_time = found_timestamps
-        tat_sql = f"""
-            TIMESTAMPDIFF(
-                MINUTE, 
-                LEAST(CAST(t.{start_time} AS DATETIME), CAST(t.{end_time} AS DATETIME)), 
-                GREATEST(CAST(t.{start_time} AS DATETIME), CAST(t.{end_time} AS DATETIME))
-            ) AS TAT
-        """
-    else:
-        tat_sql = ""
-
-    prompt = f"""
+# Prompt template for SQL generation (str.format placeholders). Changing it invalidates the SQL cache.
+SQL_PROMPT_TEMPLATE = """
     You are an AI assistant tasked with converting natural language questions into SQL queries.
     Use the following database schema to generate accurate SQL statements:
     You are an SQL expert using MySQL. Based on the following database schema generate a safe sql query:
@@ -665,6 +600,8 @@ The following known entity values are available:
 **Entity Aliases:**
 {entity_aliases}
 
+{few_shot_examples}
+
 **Session History:**
 {session_history}
 
@@ -754,17 +691,111 @@ Developer Notes:
 
 """
 
+# Cache of generated SQL; the semantic (embedding) tier is opt-in via SQL_CACHE_SEMANTIC
+sql_cache = SQLCache(embed_fn=embed_query if SQL_CACHE_SEMANTIC else None)
+
+# Deterministic templates for common questions (no LLM call), seeded from json.txt
+sql_templates = TemplateEngine(VALID_TIMESTAMP_COLUMNS)
+
+# Time to produce SQL per path: "template" (fast path), "cache" or "llm"; the counts are the request counts
+SQL_PATH_LATENCY = HistogramFamily("sql_generation_seconds", "path")
+
+def sql_path_snapshot():
+    """Returns request counts and latency histograms (incl. p50/p95) per SQL generation path."""
+    return SQL_PATH_LATENCY.snapshot()
+
+def match_sql_template(nl_query, plant_code):
+    """Returns fast-path ParameterizedSQL when a template confidently matches, else None."""
+    if not SQL_TEMPLATES_ENABLED:
+        return None
+    template_sql = sql_templates.match(nl_query, plant_code)
+    if template_sql is not None:
+        debug(f"SQL template hit ({template_sql.intent}): {template_sql}")
+    return template_sql
+
+def sql_prompt_fingerprint():
+    """Hash of everything that shapes generated SQL; a change invalidates cached queries."""
+    return fingerprint(CACHED_DB_SCHEMA, SQL_PROMPT_TEMPLATE, BOOLEAN_LLM_INSTRUCTIONS, alias_resolver.version)
+
+
+def lookup_cached_sql(nl_query, plant_code):
+    """Returns re-validated SQL from the cache for a context-free question, or None."""
+    sql_cache.ensure_version(sql_prompt_fingerprint())
+    cached_sql = sql_cache.get(nl_query, plant_code)
+    if not cached_sql:
+        return None
+    cached_sql = fix_generated_sql(cached_sql, plant_code)
+    is_valid, msg = validate_sql_query(cached_sql)
+    if is_valid:
+        debug(f"SQL cache hit: {cached_sql}")
+        return cached_sql
+    debug(f"Cached SQL failed validation, regenerating: {msg}")
+    sql_cache.invalidate(nl_query, plant_code)
+    return None
+
+def build_sql_prompt(nl_query, session_history="", plant_code=None, entity_context=""):
+    """
+    Builds the SQL generation prompt for a natural language query.
+
+    Returns:
+        tuple: (full prompt text, date-converted query used for post-processing).
+    """
+    sql_friendly_query = convert_natural_dates(nl_query)
+
+    # Detect multiple vehicle numbers
+    vehicle_pattern = r'\b[A-Z]{2}\d{2}[A-Z]{0,2}\d{4}\b'
+    vehicle_numbers = re.findall(vehicle_pattern, nl_query, re.IGNORECASE)
+
+    # Extract timestamp columns from query
+    found_timestamps = [col for col in VALID_TIMESTAMP_COLUMNS if col in nl_query]
+
+    # Ensure exactly 2 timestamps are present for TAT calculation
+    if len(found_timestamps) == 2:
+        start_time, end_time = found_timestamps
+        tat_sql = f"""
+            TIMESTAMPDIFF(
+                MINUTE, 
+                LEAST(CAST(t.{start_time} AS DATETIME), CAST(t.{end_time} AS DATETIME)), 
+                GREATEST(CAST(t.{start_time} AS DATETIME), CAST(t.{end_time} AS DATETIME))
+            ) AS TAT
+        """
+    else:
+        tat_sql = ""
+
+    # Retrieve the closest few-shot examples and only the aliases this query actually uses
+    few_shot_examples = format_examples(retrieve_examples(nl_query))
+
+    prompt = SQL_PROMPT_TEMPLATE.format(
+        CACHED_DB_SCHEMA=CACHED_DB_SCHEMA,
+        entity_context=entity_context,
+        entity_aliases=select_relevant_aliases(nl_query),
+        few_shot_examples=few_shot_examples,
+        session_history=session_history,
+        sql_friendly_query=sql_friendly_query,
+        plant_code=plant_code,
+        tat_sql=tat_sql
+    )
+
     # Conditionally add boolean instructions if it's a boolean query
     full_prompt_content = prompt
     if is_boolean_query(nl_query):
         full_prompt_content = BOOLEAN_LLM_INSTRUCTIONS + "\n" + prompt
 
-    sql_query = query_groq_api(full_prompt_content)
-    print(f"Generated SQL Query: {sql_query}")
+    prompt_tokens = record_prompt_tokens("sqlgen", full_prompt_content)
+    logging.info(f"SQL prompt tokens: {prompt_tokens}")
+
+    return full_prompt_content, sql_friendly_query
+
+def postprocess_generated_sql(sql_query, sql_friendly_query, plant_code=None):
+    """
+    Normalizes, plant-scopes and validates the SQL returned by the LLM.
 
+    Returns:
+        tuple: (final SQL or a user-facing message, True if the first element is valid SQL).
+    """
     # Exit early if LLM failed to generate a proper SQL query
     if not sql_query.strip().upper().startswith("SELECT"):
-        return sql_query  # e.g., "Sorry, I didn't understand your request..."
+        return sql_query, False  # e.g., "Sorry, I didn't understand your request..."
 
     # Normalize SQL for consistent modification
     sql_query = " ".join(sql_query.split())  # Remove extra whitespace
@@ -794,11 +825,62 @@ Developer Notes:
     # Validate SQL before returning
     is_valid, msg = validate_sql_query(sql_query)
     if not is_valid:
-        print(f"SQL Validation Failed: {msg}")
-        return f"Error: Invalid SQL Query - {msg}"
+        debug(f"SQL Validation Failed: {msg}")
+        return f"Error: Invalid SQL Query - {msg}", False
 
     if not sql_query:
-        return "Error: Could not generate SQL query due to LLM failure"
+        return "Error: Could not generate SQL query due to LLM failure", False
+
+    return sql_query, True
+
+def generate_sql_from_nl(nl_query, session_history="", plant_code=None):
+    """Generate an SQL query from a natural language query using the correct schema."""
+
+    if is_gibberish(nl_query):
+        debug("Detected gibberish:", nl_query)
+        return "Sorry, I didn't understand your request. Could you please clarify?"
+
+    # if is_boolean_query(nl_query):
+    #     boolean_sql = generate_boolean_sql(nl_query, plant_code, CACHED_DB_SCHEMA, COLUMN_METADATA)
+    #     if boolean_sql:
+    #         debug(f"Generated Boolean SQL Query: {boolean_sql}")
+    #         return boolean_sql
+    #     else:
+    #         return "Could not generate specific boolean SQL for this query."
+
+    start = time.perf_counter()
+
+    # Common question shapes are answered by parameterized templates without an LLM call
+    template_sql = match_sql_template(nl_query, plant_code)
+    if template_sql is not None:
+        SQL_PATH_LATENCY.observe("template", time.perf_counter() - start)
+        log_query(template_sql)
+        return template_sql
+
+    # Build structured entity context
+    entity_context = build_entity_context()
+
+    # Repeated, context-free questions are answered from the SQL cache (still re-validated before use)
+    use_cache = bool(plant_code) and not session_history and not entity_context
+    if use_cache:
+        cached_sql = lookup_cached_sql(nl_query, plant_code)
+        if cached_sql:
+            SQL_PATH_LATENCY.observe("cache", time.perf_counter() - start)
+            return cached_sql
+
+    full_prompt_content, sql_friendly_query = build_sql_prompt(
+        nl_query, session_history, plant_code, entity_context)
+
+    sql_query = query_groq_api(full_prompt_content)
+    debug(f"Generated SQL Query: {sql_query}")
+
+    sql_query, is_sql = postprocess_generated_sql(sql_query, sql_friendly_query, plant_code)
+    SQL_PATH_LATENCY.observe("llm", time.perf_counter() - start)
+    if not is_sql:
+        return sql_query
+
+    if use_cache:
+        sql_cache.put(nl_query, plant_code, sql_query)
 
     log_query(sql_query)
     return sql_query
@@ -0,0 +1,300 @@
+import os
+import re
+import logging
+from threading import Lock
+import sqlparse
+from sqlparse import tokens as T
+from sqlparse.sql import Function, Parenthesis, Identifier, IdentifierList, Where
+from resultstream import SQL_MAX_ROWS
+
+# Pre-execution guard settings (overridable through the environment)
+SQL_GUARD_ENABLED = os.getenv("SQL_GUARD", "1") == "1"
+# LIMIT added to (or clamped on) row queries; 0 = off. One row past the fetch cap by default, so a
+# result cut short by the LIMIT is still reported as truncated by resultstream.
+SQL_AUTO_LIMIT = int(os.getenv("SQL_AUTO_LIMIT", str(SQL_MAX_ROWS + 1)))
+SQL_MAX_EXECUTION_TIME_MS = int(os.getenv("SQL_MAX_EXECUTION_TIME_MS", "30000"))  # MySQL optimizer hint; 0 = off
+SQL_EXPLAIN_GUARD = os.getenv("SQL_EXPLAIN_GUARD", "0") == "1"  # EXPLAIN every query before running it
+SQL_EXPLAIN_MAX_ROWS = int(os.getenv("SQL_EXPLAIN_MAX_ROWS", "5000000"))  # estimated rows examined
+SQL_EXPLAIN_ACTION = os.getenv("SQL_EXPLAIN_ACTION", "reject")  # "reject", or "rewrite" (tighter LIMIT on row queries)
+SQL_EXPLAIN_REWRITE_LIMIT = int(os.getenv("SQL_EXPLAIN_REWRITE_LIMIT", "100"))
+
+AGGREGATE_FUNCTIONS = {"COUNT", "SUM", "AVG", "MIN", "MAX", "GROUP_CONCAT", "STD", "STDDEV", "STDDEV_POP",
+                       "STDDEV_SAMP", "VARIANCE", "VAR_POP", "VAR_SAMP", "BIT_AND", "BIT_OR", "BIT_XOR",
+                       "JSON_ARRAYAGG", "JSON_OBJECTAGG"}
+
+_TRAILING_LIMIT = re.compile(r"\bLIMIT\s+(?:(\d+)\s*,\s*)?(\d+)(\s+OFFSET\s+\d+)?\s*$", re.IGNORECASE)
+_CROSS_JOIN = re.compile(r"\bCROSS\s+JOIN\b", re.IGNORECASE)
+_LOCKING_READ = re.compile(r"\bFOR\s+(?:UPDATE|SHARE)\b|\bLOCK\s+IN\s+SHARE\s+MODE\b", re.IGNORECASE)
+# alias.column = alias.column (optionally db-qualified), the join predicate of a comma join
+_JOIN_PREDICATE = re.compile(r"(?:\w+\.)?(\w+)\.\w+\s*(?:<=>|=)\s*(?:\w+\.)?(\w+)\.\w+")
+
+_stats_lock = Lock()
+_stats = {"checked": 0, "limits_added": 0, "limits_clamped": 0, "hints_added": 0, "rejected": 0,
+          "explained": 0, "explain_rejected": 0, "explain_rewritten": 0}
+
+
+def _count(key):
+    with _stats_lock:
+        _stats[key] += 1
+
+
+def guard_stats():
+    """Returns how many queries the guard checked, rewrote and rejected."""
+    with _stats_lock:
+        return dict(_stats)
+
+
+def parse_select(sql):
+    """Returns the sqlparse statement if sql is exactly one SELECT, else None."""
+    statements = [stmt for stmt in sqlparse.parse(sql) if stmt.token_first(skip_cm=True) is not None]
+    if len(statements) != 1 or statements[0].get_type() != "SELECT":
+        return None
+    return statements[0]
+
+
+def _is_subquery(token):
+    return isinstance(token, Parenthesis) and any(t.ttype is T.DML for t in token.tokens)
+
+
+def _functions(token):
+    """Function calls inside a token, not descending into subqueries."""
+    if isinstance(token, Function):
+        yield token
+    if token.is_group and not _is_subquery(token):
+        for child in token.tokens:
+            yield from _functions(child)
+
+
+def _top_level(stmt):
+    """Top-level keywords and the tokens of the first SELECT list."""
+    keywords, select_list, in_select = set(), [], False
+    for token in stmt.tokens:
+        if token.ttype is T.DML and token.normalized == "SELECT" and not keywords & {"SELECT"}:
+            keywords.add("SELECT")
+            in_select = True
+            continue
+        if token.is_keyword:
+            keywords.add(token.normalized)
+            if token.normalized == "FROM":
+                in_select = False
+        elif in_select:
+            select_list.append(token)
+    return keywords, select_list
+
+
+def is_row_query(stmt):
+    """
+    True if a SELECT returns one row per matching record: it reads FROM a table, has no
+    GROUP BY and no aggregate in its select list (those return one row, or one per group).
+    """
+    keywords, select_list = _top_level(stmt)
+    if "FROM" not in keywords or "GROUP BY" in keywords:
+        return False
+    for token in select_list:
+        for function in _functions(token):
+            if (function.get_name() or "").upper() in AGGREGATE_FUNCTIONS:
+                return False
+    return True
+
+
+def _strip_trailing(stmt):
+    """The statement's text without trailing whitespace, comments and semicolons."""
+    leaves = list(stmt.flatten())
+    while leaves and (leaves[-1].is_whitespace or leaves[-1].ttype in T.Comment
+                      or (leaves[-1].ttype is T.Punctuation and leaves[-1].value == ";")):
+        leaves.pop()
+    return "".join(str(leaf) for leaf in leaves)
+
+
+def _code_text(token):
+    """A token's SQL with comments dropped and string literals emptied, for keyword checks."""
+    parts = []
+    for leaf in token.flatten():
+        if leaf.ttype in T.Comment:
+            parts.append(" ")
+        elif leaf.ttype in T.String:
+            parts.append("''")
+        else:
+            parts.append(leaf.value)
+    return "".join(parts)
+
+
+def _table_names(identifier):
+    """Names a FROM-list entry can be referred to by: its alias, or its table name."""
+    alias = identifier.get_alias()
+    return {alias.lower()} if alias else {(identifier.get_real_name() or "").lower()}
+
+
+def _joined(tables, where):
+    """True if the WHERE predicates (alias.col = alias.col) connect every table of a comma join."""
+    group = list(range(len(tables)))
+
+    def find(i):
+        while group[i] != i:
+            i = group[i]
+        return i
+
+    owner = {name: i for i, names in enumerate(tables) for name in names}
+    text = _code_text(where) if where is not None else ""
+    for left, right in _JOIN_PREDICATE.findall(text):
+        a, b = owner.get(left.lower()), owner.get(right.lower())
+        if a is not None and b is not None:
+            group[find(a)] = find(b)
+    return len({find(i) for i in range(len(tables))}) == 1
+
+
+def has_unjoined_tables(token):
+    """
+    True if a FROM list (in the query or any subquery) names several tables without join
+    predicates linking them all: an implicit cross join such as ``FROM t a, t b``.
+    """
+    children = [child for child in token.tokens if not child.is_whitespace] if token.is_group else []
+    for position, child in enumerate(children[:-1]):
+        following = children[position + 1]
+        if child.is_keyword and child.normalized == "FROM" and isinstance(following, IdentifierList):
+            tables = [_table_names(entry) for entry in following.get_identifiers() if isinstance(entry, Identifier)]
+            where = next((later for later in children[position + 2:] if isinstance(later, Where)), None)
+            if len(tables) > 1 and not _joined(tables, where):
+                return True
+    return any(has_unjoined_tables(child) for child in children if child.is_group)
+
+
+def apply_limit(sql, stmt, limit):
+    """
+    Adds LIMIT to a row query, or lowers a larger trailing LIMIT to it.
+
+    Trailing semicolons and comments are dropped first; a trailing -- comment would otherwise
+    swallow the LIMIT. guard_sql() has already rejected the clauses that may follow a LIMIT
+    (INTO, locking reads).
+    """
+    if limit <= 0 or not is_row_query(stmt):
+        return sql
+    head = _strip_trailing(stmt)
+    keywords, _ = _top_level(stmt)
+    if "LIMIT" not in keywords:
+        _count("limits_added")
+        return f"{head} LIMIT {limit}"
+    match = _TRAILING_LIMIT.search(head)
+    if match and int(match.group(2)) > limit:
+        _count("limits_clamped")
+        offset = f"{match.group(1)}, " if match.group(1) else ""
+        return f"{head[:match.start()]}LIMIT {offset}{limit}{match.group(3) or ''}"
+    return sql
+
+
+def add_execution_time_hint(sql, stmt, timeout_ms):
+    """Puts a /*+ MAX_EXECUTION_TIME(ms) */ optimizer hint right after the top-level SELECT."""
+    if timeout_ms <= 0 or "MAX_EXECUTION_TIME" in sql.upper():
+        return sql
+    parts, added = [], False
+    for token in stmt.tokens:
+        parts.append(str(token))
+        if not added and token.ttype is T.DML and token.normalized == "SELECT":
+            parts.append(f" /*+ MAX_EXECUTION_TIME({timeout_ms}) */")
+            added = True
+    if not added:
+        return sql
+    _count("hints_added")
+    return "".join(parts)
+
+
+def guard_sql(sql, limit=SQL_AUTO_LIMIT, timeout_ms=SQL_MAX_EXECUTION_TIME_MS):
+    """
+    Checks and bounds a fixed, validated query before it runs.
+
+    Rejects anything other than a single SELECT, SELECT ... INTO (files or variables), locking
+    reads, and cross joins (explicit, or tables listed with commas and no join predicate linking
+    them). Adds or clamps a LIMIT on row queries (aggregates and GROUP BY results are left alone) and adds a
+    MAX_EXECUTION_TIME hint.
+
+    Args:
+        sql (str): The query (may contain %s placeholders).
+        limit (int): Row limit for row queries; 0 disables it.
+        timeout_ms (int): Server-side execution time limit; 0 disables it.
+
+    Returns:
+        tuple: (guarded SQL, None) or (None, error message).
+    """
+    if not SQL_GUARD_ENABLED:
+        return sql, None
+    _count("checked")
+    stmt = parse_select(sql)
+    if stmt is None:
+        _count("rejected")
+        return None, "Only a single SELECT statement can be run."
+    keywords, _ = _top_level(stmt)
+    code = _code_text(stmt)
+    error = None
+    if "INTO" in keywords:
+        error = "Queries that write results elsewhere (SELECT ... INTO) are not allowed."
+    elif _LOCKING_READ.search(code):
+        error = "Locking reads (FOR UPDATE, LOCK IN SHARE MODE) are not allowed."
+    elif _CROSS_JOIN.search(code) or has_unjoined_tables(stmt):
+        error = "Queries with a cross join (tables without a join condition) are not allowed."
+    if error:
+        _count("rejected")
+        logging.warning(f"SQL guard rejected query ({error}): {sql}")
+        return None, error
+    guarded = apply_limit(sql, stmt, limit)
+    if guarded != sql:
+        stmt = parse_select(guarded)
+        if stmt is None:
+            _count("rejected")
+            logging.error(f"SQL guard could not re-parse its rewrite of: {sql}")
+            return None, "The query could not be checked before running it."
+    guarded = add_execution_time_hint(guarded, stmt, timeout_ms)
+    if guarded != sql:
+        logging.info(f"SQL guard rewrote query: {guarded}")
+    return guarded, None
+
+
+def estimate_examined_rows(conn, sql, params=None):
+    """
+    Runs EXPLAIN and estimates the rows MySQL will examine.
+
+    Each SELECT in the plan costs the product of its tables' estimated rows (a join nests
+    its loops); the estimate is the sum over SELECTs.
+    """
+    cursor = conn.cursor(buffered=True)
+    try:
+        cursor.execute("EXPLAIN " + sql, params)
+        plan = cursor.fetchall()
+        columns = [desc[0] for desc in cursor.description]
+    finally:
+        cursor.close()
+    per_select = {}
+    for row in plan:
+        entry = dict(zip(columns, row))
+        rows = float(entry.get("rows") or 1)
+        per_select[entry.get("id")] = per_select.get(entry.get("id"), 1.0) * max(rows, 1.0)
+    return int(sum(per_select.values()))
+
+
+def explain_guard(conn, sql, params=None, max_rows=SQL_EXPLAIN_MAX_ROWS, action=SQL_EXPLAIN_ACTION):
+    """
+    Rejects (or, for row queries with action "rewrite", re-limits) queries whose plan
+    examines more than max_rows rows. Does nothing unless SQL_EXPLAIN_GUARD is on.
+
+    Returns:
+        tuple: (SQL to run, None) or (None, error message).
+    """
+    if not SQL_EXPLAIN_GUARD:
+        return sql, None
+    _count("explained")
+    try:
+        estimate = estimate_examined_rows(conn, sql, params)
+    except Exception as e:
+        logging.error(f"EXPLAIN failed, running query unchecked: {e}")
+        return sql, None
+    if estimate <= max_rows:
+        return sql, None
+    stmt = parse_select(sql)
+    if action == "rewrite" and stmt is not None and is_row_query(stmt):
+        _count("explain_rewritten")
+        rewritten = apply_limit(sql, stmt, SQL_EXPLAIN_REWRITE_LIMIT)
+        logging.warning(f"Query plan examines ~{estimate} rows; limited to {SQL_EXPLAIN_REWRITE_LIMIT}: {rewritten}")
+        return rewritten, None
+    _count("explain_rejected")
+    logging.warning(f"Query plan examines ~{estimate} rows (limit {max_rows}); rejected: {sql}")
+    return None, (f"This question would scan about {estimate:,} rows. "
+                  "Please narrow it down, for example to a date range, stage or vehicle.")
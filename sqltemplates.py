@@ -0,0 +1,194 @@
+import os
+import re
+import json
+import logging
+
+# Fast-path settings (overridable through the environment)
+SQL_TEMPLATES_ENABLED = os.getenv("SQL_TEMPLATES", "1") == "1"
+# Share of query words a template must account for before it is trusted over the LLM
+SQL_TEMPLATE_MIN_CONFIDENCE = float(os.getenv("SQL_TEMPLATE_MIN_CONFIDENCE", "1.0"))
+SQL_TEMPLATE_SEED_PATH = os.getenv("SQL_TEMPLATE_SEED_PATH", "json.txt")
+
+TRIP_VIEW = "transactionalplms.vw_trip_info"
+VEHICLE_NUMBER_PATTERN = re.compile(r'\b[A-Z]{2}\d{2}[A-Z]{2}\d{4}\b', re.IGNORECASE)
+
+# Stage values from the SQL prompt's mapPlantStageLocation mapping; json.txt adds the rest
+BASE_STAGES = ["PACKING-IN", "YARD-IN", "GATE-IN", "WB-3 (TW)", "GROSS-WEIGHT"]
+STAGE_ALIASES = {"tareweight": "WB-3 (TW)"}
+
+LATEST_TRIP_COLUMNS = ("tripId, vehicleNumber, mapPlantStageLocation, transporter_name, material_code, "
+                       "driverId, dinumber, status, yardIn, gateIn, gateOut")
+
+# Words each intent may contain besides its parameters; anything else lowers the confidence
+COMMON_WORDS = {"the", "a", "an", "is", "are", "of", "in", "at", "for", "me", "please", "what", "whats", "s",
+                "show", "tell", "give", "get", "can", "you", "i", "want", "to", "know", "find", "there", "plant"}
+INTENT_WORDS = {
+    "stage_count": {"how", "many", "number", "count", "vehicles", "vehicle", "trucks", "truck", "lorries", "lorry",
+                    "currently", "current", "right", "now", "present", "presently", "stage", "today"},
+    "current_stage": {"vehicle", "truck", "lorry", "number", "no", "current", "currently", "stage", "location",
+                      "where", "right", "now", "present", "presently", "latest"},
+    "latest_trip": {"vehicle", "truck", "lorry", "number", "no", "latest", "last", "recent", "most", "trip",
+                    "details", "detail", "info", "information", "about"},
+    "tat": {"tat", "turnaround", "turn", "around", "time", "taken", "take", "takes", "spent", "spend", "duration",
+            "minutes", "between", "and", "from", "average", "avg", "mean", "vehicle", "vehicles", "trip",
+            "latest", "last", "how", "much", "long", "does", "did", "do", "today", "stage", "stages", "number"},
+}
+COUNT_PREFIX = re.compile(r"^\s*(how many|number of|count of)\s+(vehicles|trucks|lorries)\b", re.IGNORECASE)
+AVERAGE_WORDS = {"average", "avg", "mean"}
+
+
+def normalize_key(text):
+    return re.sub(r"[^a-z0-9]", "", text.lower())
+
+
+def quote_literal(value):
+    """Renders a parameter as a MySQL string literal (for logs and the display form only)."""
+    return "'" + str(value).replace("\\", "\\\\").replace("'", "''") + "'"
+
+
+class ParameterizedSQL(str):
+    """
+    SQL produced by a template: a str (with literals inlined, for logging and display)
+    that also carries the %s template and its parameters for execution.
+    """
+
+    def __new__(cls, template, params, intent=None):
+        obj = super().__new__(cls, template % tuple(quote_literal(p) for p in params))
+        obj.template = template
+        obj.params = tuple(params)
+        obj.intent = intent
+        return obj
+
+
+def load_seed_stages(path=SQL_TEMPLATE_SEED_PATH):
+    """Collects hyphenated mapPlantStageLocation values (e.g. 'Gate-Out') used in the json.txt examples."""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            examples = json.load(f)
+    except Exception as e:
+        logging.error(f"Could not read template seed examples from {path}: {e}")
+        return []
+    stages = set()
+    for example in examples:
+        sql = example.get("output", "")
+        for clause in re.findall(r"mapPlantStageLocation\s*(?:=\s*'[^']*'|IN\s*\([^)]*\))", sql, re.IGNORECASE):
+            for value in re.findall(r"'([^']*)'", clause):
+                if re.fullmatch(r"[A-Za-z]+-[A-Za-z]+", value.strip()):
+                    stages.add(value.strip().upper())
+    return sorted(stages)
+
+
+class TemplateEngine:
+    """
+    Recognizes common question shapes and fills parameterized SQL without calling the LLM.
+
+    Intents: vehicle count at one stage, current stage / latest trip of one vehicle number,
+    and TAT between two timestamp columns (average, or for one vehicle's latest trip).
+    A match is only used when its confidence (share of query words explained by the
+    intent) reaches min_confidence; otherwise match() returns None and the LLM is used.
+    """
+
+    def __init__(self, timestamp_columns, stages=None, min_confidence=SQL_TEMPLATE_MIN_CONFIDENCE):
+        self.min_confidence = min_confidence
+        stage_values = list(BASE_STAGES) + list(stages if stages is not None else load_seed_stages())
+        self.stages = {normalize_key(value): value for value in stage_values}
+        self.stages.update(STAGE_ALIASES)
+        self.timestamp_columns = {normalize_key(column): column for column in timestamp_columns}
+
+    @staticmethod
+    def _find(words, vocabulary, max_window=3):
+        """Greedy longest-first scan for vocabulary entries spanning 1..max_window words."""
+        found, used, i = [], set(), 0
+        while i < len(words):
+            for size in range(min(max_window, len(words) - i), 0, -1):
+                value = vocabulary.get("".join(words[i:i + size]))
+                if value is not None:
+                    found.append(value)
+                    used.update(range(i, i + size))
+                    i += size
+                    break
+            else:
+                i += 1
+        return found, used
+
+    def _confidence(self, words, used, intent):
+        allowed = COMMON_WORDS | INTENT_WORDS[intent]
+        explained = sum(1 for i, word in enumerate(words) if i in used or word in allowed)
+        return explained / len(words) if words else 0.0
+
+    def _candidates(self, nl_query, plant_code):
+        words = re.findall(r"[a-z0-9]+", nl_query.lower())
+        vehicles = sorted({v.upper() for v in VEHICLE_NUMBER_PATTERN.findall(nl_query)})
+        vehicle_used = {i for i, word in enumerate(words) if word.upper() in vehicles}
+        today = "today" in words
+
+        columns, column_used = self._find(words, self.timestamp_columns)
+        if len(columns) == 2 and columns[0] != columns[1]:
+            start, end = columns
+            diff = f"TIMESTAMPDIFF(MINUTE, {start}, {end})"
+            used = column_used | vehicle_used
+            if len(vehicles) == 1:
+                sql = (f"SELECT vehicleNumber, {diff} AS tat_minutes FROM {TRIP_VIEW} "
+                       f"WHERE plantCode = %s AND vehicleNumber = %s AND {start} IS NOT NULL AND {end} IS NOT NULL "
+                       f"ORDER BY gateIn DESC LIMIT 1")
+                yield "tat", sql, (plant_code, vehicles[0]), used, words
+            elif not vehicles and AVERAGE_WORDS & set(words):
+                sql = (f"SELECT AVG({diff}) AS avg_tat_minutes FROM {TRIP_VIEW} "
+                       f"WHERE plantCode = %s AND {start} IS NOT NULL AND {end} IS NOT NULL AND {diff} >= 0")
+                if today:
+                    sql += f" AND DATE({start}) = CURRENT_DATE"
+                yield "tat", sql, (plant_code,), used, words
+            return
+
+        if len(vehicles) == 1 and len(vehicle_used) == 1:
+            if {"stage", "location", "where"} & set(words):
+                sql = (f"SELECT vehicleNumber, mapPlantStageLocation FROM {TRIP_VIEW} "
+                       f"WHERE plantCode = %s AND vehicleNumber = %s ORDER BY gateIn DESC LIMIT 1")
+                yield "current_stage", sql, (plant_code, vehicles[0]), vehicle_used, words
+            if "trip" in words:
+                sql = (f"SELECT {LATEST_TRIP_COLUMNS} FROM {TRIP_VIEW} "
+                       f"WHERE plantCode = %s AND vehicleNumber = %s ORDER BY gateIn DESC LIMIT 1")
+                yield "latest_trip", sql, (plant_code, vehicles[0]), vehicle_used, words
+            return
+
+        if not vehicles and COUNT_PREFIX.match(nl_query):
+            stages, stage_used = self._find(words, self.stages)
+            if len(stages) == 1:
+                sql = (f"SELECT COUNT(DISTINCT vehicleNumber) AS vehicle_count FROM {TRIP_VIEW} "
+                       f"WHERE plantCode = %s AND mapPlantStageLocation = %s")
+                if today:
+                    sql += " AND DATE(gateIn) = CURRENT_DATE"
+                yield "stage_count", sql, (plant_code, stages[0]), stage_used, words
+
+    def match(self, nl_query, plant_code):
+        """
+        Returns ParameterizedSQL for a confidently recognized question, or None.
+
+        Args:
+            nl_query (str): The user's question.
+            plant_code (str): Plant code bound into every template.
+        """
+        if not plant_code or not nl_query:
+            return None
+        best = None
+        for intent, sql, params, used, words in self._candidates(nl_query, plant_code):
+            confidence = self._confidence(words, used, intent)
+            if confidence >= self.min_confidence and (best is None or confidence > best[0]):
+                best = (confidence, ParameterizedSQL(sql, params, intent))
+        return best[1] if best else None
+
+
+if __name__ == "__main__":
+    # Coverage report: which json.txt examples the fast path would answer, and with what SQL
+    from sqlgen import VALID_TIMESTAMP_COLUMNS
+
+    engine = TemplateEngine(VALID_TIMESTAMP_COLUMNS)
+    with open(SQL_TEMPLATE_SEED_PATH, "r", encoding="utf-8") as f:
+        seed_examples = json.load(f)
+    matched = 0
+    for seed in seed_examples:
+        result = engine.match(seed["input"], "PLANT")
+        if result is not None:
+            matched += 1
+            print(f"[{result.intent}] {seed['input']}\n    template: {result}\n    example:  {seed['output']}")
+    print(f"\n{matched}/{len(seed_examples)} examples handled by templates; stages: {sorted(set(engine.stages.values()))}")
@@ -0,0 +1,112 @@
+import time
+import threading
+
+import pytest
+
+from dbpool import ConnectionPool, PoolTimeoutError
+
+
+class FakeConnection:
+    def __init__(self, number):
+        self.number = number
+        self.healthy = True
+        self.closed = False
+
+    def is_connected(self):
+        return self.healthy and not self.closed
+
+    def close(self):
+        self.closed = True
+
+
+class FakeDriver:
+    """Stands in for mysql.connector.connect, numbering the connections it opens."""
+
+    def __init__(self):
+        self.opened = []
+
+    def connect(self):
+        conn = FakeConnection(len(self.opened))
+        self.opened.append(conn)
+        return conn
+
+
+@pytest.fixture
+def driver():
+    return FakeDriver()
+
+
+def test_reuses_idle_connections(driver):
+    pool = ConnectionPool(driver.connect, size=2, timeout=1, max_lifetime=0)
+    first = pool.acquire()
+    pool.release(first)
+    assert pool.acquire() is first
+    assert len(driver.opened) == 1
+    assert pool.metrics()["borrowed"] == 2
+
+
+def test_opens_up_to_size_then_times_out(driver):
+    pool = ConnectionPool(driver.connect, size=2, timeout=0.05, max_lifetime=0)
+    borrowed = [pool.acquire(), pool.acquire()]
+    assert borrowed[0] is not borrowed[1]
+    with pytest.raises(PoolTimeoutError):
+        pool.acquire()
+    metrics = pool.metrics()
+    assert metrics["timeouts"] == 1 and metrics["in_use"] == 2 and metrics["created"] == 2
+
+
+def test_waiting_borrower_gets_released_connection(driver):
+    pool = ConnectionPool(driver.connect, size=1, timeout=2, max_lifetime=0)
+    conn = pool.acquire()
+    threading.Timer(0.05, pool.release, args=(conn,)).start()
+    assert pool.acquire() is conn
+    assert pool.metrics()["wait_time_max"] > 0
+
+
+def test_unhealthy_connection_replaced_on_borrow(driver):
+    pool = ConnectionPool(driver.connect, size=1, timeout=1, max_lifetime=0, health_check=True)
+    conn = pool.acquire()
+    pool.release(conn)
+    conn.healthy = False
+    replacement = pool.acquire()
+    assert replacement is not conn and conn.closed
+    assert pool.metrics()["failed_health_checks"] == 1
+
+
+def test_health_check_can_be_disabled(driver):
+    pool = ConnectionPool(driver.connect, size=1, timeout=1, max_lifetime=0, health_check=False)
+    conn = pool.acquire()
+    pool.release(conn)
+    conn.healthy = False
+    assert pool.acquire() is conn
+
+
+def test_expired_connection_recycled(driver):
+    pool = ConnectionPool(driver.connect, size=1, timeout=1, max_lifetime=0.05)
+    conn = pool.acquire()
+    pool.release(conn)
+    time.sleep(0.06)
+    replacement = pool.acquire()
+    assert replacement is not conn and conn.closed
+    pool.release(replacement)
+    assert pool.metrics()["recycled"] == 1
+
+
+def test_connection_discarded_when_block_raises(driver):
+    pool = ConnectionPool(driver.connect, size=1, timeout=1, max_lifetime=0)
+    with pytest.raises(RuntimeError):
+        with pool.connection() as conn:
+            raise RuntimeError("driver error")
+    assert conn.closed
+    assert pool.metrics()["in_use"] == 0 and pool.metrics()["idle"] == 0
+
+
+def test_failed_connect_frees_the_slot():
+    def refuse():
+        raise ConnectionError("server down")
+
+    pool = ConnectionPool(refuse, size=1, timeout=0.05, max_lifetime=0)
+    for _ in range(2):
+        with pytest.raises(ConnectionError):
+            pool.acquire()
+    assert pool.metrics()["in_use"] == 0
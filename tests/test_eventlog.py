@@ -0,0 +1,75 @@
+import os
+import time
+import logging
+
+from eventlog import AsyncLogWriter, LogWriterHandler, get_writer
+
+
+def rotated(path):
+    directory, name = os.path.split(path)
+    return [entry for entry in os.listdir(directory) if entry.startswith(name + ".")]
+
+
+def test_writes_batches(tmp_path):
+    path = str(tmp_path / "events.jsonl")
+    writer = AsyncLogWriter(path, flush_interval=0.01, max_bytes=0, rotate_interval=0)
+    writer.write({"event": "chat"})
+    writer.write("plain line")
+    writer.close()
+    with open(path, encoding="utf-8") as f:
+        assert f.read() == '{"event": "chat"}\nplain line\n'
+    assert writer.stats()["written"] == 2
+
+
+def test_rotates_by_size(tmp_path):
+    path = str(tmp_path / "sql.txt")
+    writer = AsyncLogWriter(path, batch_size=1, flush_interval=0.01, max_bytes=15, rotate_interval=0)
+    for line in ("first line", "second line"):
+        writer.write(line)
+        writer.flush()
+    writer.close()
+    assert len(rotated(path)) == 1
+    with open(path, encoding="utf-8") as f:
+        assert f.read() == "second line\n"
+
+
+def test_age_rotation_uses_file_mtime(tmp_path):
+    """A file last written in an earlier period is rotated, even by a freshly started writer."""
+    path = str(tmp_path / "sql.txt")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("yesterday\n")
+    day_ago = time.time() - 86400
+    os.utime(path, (day_ago, day_ago))
+
+    writer = AsyncLogWriter(path, flush_interval=0.01, max_bytes=0, rotate_interval=86400)
+    writer.write("today")
+    writer.close()
+    assert len(rotated(path)) == 1
+    with open(path, encoding="utf-8") as f:
+        assert f.read() == "today\n"
+
+
+def test_recent_file_is_appended_to(tmp_path):
+    path = str(tmp_path / "sql.txt")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("earlier\n")
+    writer = AsyncLogWriter(path, flush_interval=0.01, max_bytes=0, rotate_interval=86400)
+    writer.write("later")
+    writer.close()
+    assert rotated(path) == []
+
+
+def test_logging_handler_shares_the_writer(tmp_path):
+    path = str(tmp_path / "query_logs.txt")
+    handler = LogWriterHandler(path)
+    handler.setFormatter(logging.Formatter("%(levelname)s - %(message)s"))
+    logger = logging.getLogger("test_eventlog")
+    logger.addHandler(handler)
+    try:
+        logger.error("boom")
+    finally:
+        logger.removeHandler(handler)
+    get_writer(path).write("[SQL] Generated SQL: SELECT 1")
+    assert get_writer(path).flush()
+    with open(path, encoding="utf-8") as f:
+        assert f.read() == "ERROR - boom\n[SQL] Generated SQL: SELECT 1\n"
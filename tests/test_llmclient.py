@@ -0,0 +1,131 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+import requests
+from requests.adapters import BaseAdapter
+
+import llmclient
+from tracing import start_trace, use_trace
+
+ENDPOINT = "http://llm.test/v1/chat/completions"
+
+
+class StubAdapter(BaseAdapter):
+    """Answers every request with a canned completion."""
+
+    def __init__(self):
+        super().__init__()
+        self.calls = 0
+
+    def send(self, request, **kwargs):
+        self.calls += 1
+        response = requests.Response()
+        response.status_code = 200
+        response._content = json.dumps({"choices": [{"message": {"content": "ok"}}],
+                                        "usage": {"prompt_tokens": 7, "completion_tokens": 2}}).encode("utf-8")
+        response.request = request
+        response.url = request.url
+        return response
+
+    def close(self):
+        pass
+
+
+@pytest.fixture(autouse=True)
+def client(monkeypatch):
+    """Points the client at a fake endpoint, with fresh limits and sessions."""
+    monkeypatch.setattr(llmclient, "LLM_FIXTURE_MODE", "")
+    monkeypatch.setattr(llmclient, "LLM_ENDPOINT_POOL_MAXSIZE", 0)
+    monkeypatch.setattr(llmclient, "_endpoint_limits", {})
+    llmclient.configure(endpoint=ENDPOINT, pool_maxsize=10)
+    yield
+    llmclient.configure()
+    llmclient.configure_async()
+
+
+def test_session_is_reused():
+    stub = StubAdapter()
+    llmclient.get_session().mount("http://llm.test/", stub)
+    for _ in range(3):
+        response = llmclient.chat_completion({"model": "m", "messages": []}, "key")
+        assert response.json()["choices"][0]["message"]["content"] == "ok"
+    assert stub.calls == 3
+    assert llmclient.get_session() is llmclient.get_session()
+
+
+def test_completion_content_records_usage_once():
+    llmclient.get_session().mount("http://llm.test/", StubAdapter())
+    trace = start_trace()
+    try:
+        response = llmclient.chat_completion({"model": "m", "messages": []}, "key")
+        assert trace.counters["llm_calls"] == 0  # nothing is parsed until the caller reads the body
+        assert llmclient.completion_content(response, "m") == "ok"
+        assert trace.counters["prompt_tokens"] == 7 and trace.counters["llm_calls"] == 1
+    finally:
+        use_trace(None)
+
+
+def test_configure_drops_the_session():
+    session = llmclient.get_session()
+    llmclient.configure(read_timeout=30)
+    assert llmclient.get_session() is not session
+
+
+def test_endpoint_limit_from_env(monkeypatch):
+    monkeypatch.setattr(llmclient, "LLM_ENDPOINT_POOL_MAXSIZE", 2)
+    llmclient.configure()
+    adapter = llmclient.get_session().get_adapter(ENDPOINT)
+    assert adapter._pool_maxsize == 2 and adapter._pool_block
+    assert llmclient.get_session().get_adapter("https://other.test/")._pool_maxsize == 10
+
+
+def test_set_endpoint_limit_overrides_env(monkeypatch):
+    monkeypatch.setattr(llmclient, "LLM_ENDPOINT_POOL_MAXSIZE", 2)
+    llmclient.get_session()
+    llmclient.set_endpoint_limit("http://llm.test/", 5)
+    assert llmclient.get_session().get_adapter(ENDPOINT)._pool_maxsize == 5
+    assert llmclient._pool_limit(ENDPOINT) == 5
+
+
+def test_async_calls_bounded_on_a_custom_transport(monkeypatch):
+    monkeypatch.setattr(llmclient, "LLM_ENDPOINT_POOL_MAXSIZE", 2)
+    active, peak = 0, 0
+
+    async def handler(request):
+        nonlocal active, peak
+        active += 1
+        peak = max(peak, active)
+        await asyncio.sleep(0.01)
+        active -= 1
+        return httpx.Response(200, json={"choices": [{"message": {"content": "ok"}}]})
+
+    async def run():
+        llmclient.configure_async(httpx.MockTransport(handler))
+        try:
+            return await asyncio.gather(*(llmclient.achat_completion({"model": "m"}, "key") for _ in range(6)))
+        finally:
+            await llmclient.aclose_async_client()
+
+    responses = asyncio.run(run())
+    assert [response.status_code for response in responses] == [200] * 6
+    assert peak == 2
+
+
+def test_configure_async_closes_the_old_client():
+    async def create():
+        return llmclient.get_async_client()
+
+    client = asyncio.run(create())
+    llmclient.configure_async()
+    assert client.is_closed
+
+    async def replace_inside_loop():
+        inner = llmclient.get_async_client()
+        llmclient.set_endpoint_limit("http://llm.test/", 3)
+        await asyncio.sleep(0.01)  # the close is scheduled on this loop
+        return inner
+
+    inner = asyncio.run(replace_inside_loop())
+    assert inner.is_closed and llmclient._async_client is None
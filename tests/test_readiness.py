@@ -0,0 +1,40 @@
+import pytest
+
+import retrieval
+
+
+@pytest.fixture
+def status(monkeypatch):
+    """Fresh component status; the loaders are replaced so nothing heavy is imported."""
+    monkeypatch.setattr(retrieval, "_status", {
+        "embedding_model": {"state": "not_loaded", "required": False},
+        "few_shot_index": {"state": "not_loaded", "required": False},
+    })
+    monkeypatch.setattr(retrieval, "_embedder", None)
+    monkeypatch.setattr(retrieval, "_loaded_index", None)
+    return retrieval._status
+
+
+def test_ready_without_warm_up(status):
+    assert retrieval.readiness()["ready"]
+
+
+def test_not_ready_until_warm_up_finishes(status, monkeypatch):
+    monkeypatch.setattr(retrieval, "load_index", lambda: None)
+    monkeypatch.setattr(retrieval, "embed_query", lambda text: None)
+    retrieval.warm_up(model=True, index=False, background=False)
+    assert status["few_shot_index"]["state"] == "disabled"
+    assert not retrieval.readiness()["ready"]  # the stubbed loader never marks the model ready
+    retrieval._set_status("embedding_model", "ready")
+    assert retrieval.readiness()["ready"]
+
+
+def test_failed_component_is_not_ready(status, monkeypatch):
+    def fail():
+        retrieval._set_status("few_shot_index", "failed", error="missing")
+
+    monkeypatch.setattr(retrieval, "load_index", fail)
+    retrieval.warm_up(model=False, index=True, background=False)
+    result = retrieval.readiness()
+    assert not result["ready"]
+    assert result["components"]["few_shot_index"]["required"]
@@ -0,0 +1,114 @@
+import threading
+import time
+from datetime import date
+
+from resultcache import ResultCache, classify_query, estimate_result_bytes
+
+TODAY = date(2024, 6, 15)
+
+
+def rows(count, value="x"):
+    return {"columns": ["id", "value"], "data": [[i, value] for i in range(count)]}
+
+
+def test_closed_past_range_is_historical():
+    assert classify_query("SELECT COUNT(*) FROM vw_trip_info WHERE gateIn BETWEEN '2024-01-01' AND '2024-01-31'",
+                          TODAY) == "historical"
+    assert classify_query("SELECT COUNT(*) FROM vw_trip_info WHERE gateIn >= '2024-01-01' AND gateIn < '2024-02-01'",
+                          TODAY) == "historical"
+    assert classify_query("SELECT COUNT(*) FROM vw_trip_info WHERE DATE(gateIn) = '2024-01-05'", TODAY) == "historical"
+
+
+def test_open_ended_range_is_not_historical():
+    # Only bounded below: today's rows still match
+    assert classify_query("SELECT COUNT(*) FROM vw_trip_info WHERE gateIn >= '2024-01-01'", TODAY) == "default"
+    assert classify_query("SELECT COUNT(*) FROM vw_trip_info WHERE gateIn > '2024-01-01'", TODAY) == "default"
+    assert classify_query("SELECT COUNT(*) FROM vw_trip_info WHERE gateIn NOT BETWEEN '2024-01-01' AND '2024-01-31'",
+                          TODAY) == "default"
+    assert classify_query("SELECT COUNT(*) FROM vw_trip_info WHERE gateIn < '2024-02-01' OR gateOut > '2024-01-01'",
+                          TODAY) == "default"
+    # A range that reaches today or later can still change
+    assert classify_query("SELECT COUNT(*) FROM vw_trip_info WHERE DATE(gateIn) = '2024-06-15'", TODAY) == "default"
+
+
+def test_relative_and_live_classes():
+    assert classify_query("SELECT COUNT(*) FROM vw_trip_info WHERE DATE(gateIn) = CURDATE()", TODAY) == "today"
+    assert classify_query("SELECT status FROM vw_trip_info WHERE vehicleNumber = 'MH34AB1393'", TODAY) == "live"
+    assert classify_query("SELECT COUNT(*) FROM vw_trip_info", TODAY) == "default"
+
+
+def test_hit_returns_copy_and_runs_once():
+    cache = ResultCache(max_bytes=10**6, max_entry_bytes=10**6)
+    calls = []
+
+    def run():
+        calls.append(1)
+        return rows(2)
+
+    first = cache.get_or_execute("SELECT 1", None, "N205", run)
+    first["data"] = []
+    assert cache.get_or_execute("SELECT 1", None, "N205", run) == rows(2)
+    assert cache.get_or_execute("SELECT 1", None, "NE03", run) == rows(2)
+    assert len(calls) == 2
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 2
+
+
+def test_ttl_per_query_class():
+    cache = ResultCache(max_bytes=10**6, max_entry_bytes=10**6, ttls={"default": 0.05, "historical": 60})
+    historical = "SELECT COUNT(*) FROM vw_trip_info WHERE gateIn BETWEEN '2024-01-01' AND '2024-01-31'"
+    default = "SELECT COUNT(*) FROM vw_trip_info"
+    cache.get_or_execute(historical, None, "N205", lambda: rows(1))
+    cache.get_or_execute(default, None, "N205", lambda: rows(1))
+    time.sleep(0.1)
+    cache.get_or_execute(historical, None, "N205", lambda: rows(1))
+    cache.get_or_execute(default, None, "N205", lambda: rows(1))
+    stats = cache.stats()
+    assert stats["by_class"]["historical"] == {"hits": 1, "misses": 1}
+    assert stats["by_class"]["default"] == {"hits": 0, "misses": 2}
+    assert stats["expirations"] == 1
+
+
+def test_byte_bound_evicts_least_recently_used():
+    size = estimate_result_bytes(rows(10))
+    cache = ResultCache(max_bytes=size * 2, max_entry_bytes=size * 2)
+    for sql in ("SELECT 1", "SELECT 2"):
+        cache.get_or_execute(sql, None, "N205", lambda: rows(10))
+    cache.get_or_execute("SELECT 1", None, "N205", lambda: rows(10))  # refreshes SELECT 1
+    cache.get_or_execute("SELECT 3", None, "N205", lambda: rows(10))
+    stats = cache.stats()
+    assert stats["evictions"] == 1 and stats["entries"] == 2 and stats["bytes"] <= size * 2
+    cache.get_or_execute("SELECT 1", None, "N205", lambda: rows(10))
+    assert cache.stats()["hits"] == 2  # SELECT 2 was evicted, not SELECT 1
+
+
+def test_oversized_and_error_results_are_not_cached():
+    cache = ResultCache(max_bytes=10**6, max_entry_bytes=estimate_result_bytes(rows(5)))
+    cache.get_or_execute("SELECT big", None, "N205", lambda: rows(500))
+    cache.get_or_execute("SELECT bad", None, "N205", lambda: {"error": "boom"})
+    stats = cache.stats()
+    assert stats["uncacheable"] == 1 and stats["entries"] == 0
+
+
+def test_concurrent_misses_are_coalesced():
+    cache = ResultCache(max_bytes=10**6, max_entry_bytes=10**6, wait_timeout=5)
+    release = threading.Event()
+    calls = []
+
+    def run():
+        calls.append(1)
+        release.wait(5)
+        return rows(3)
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get_or_execute("SELECT 1", None, "N205", run)))
+               for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    while cache.stats()["coalesced"] < 4:
+        time.sleep(0.01)
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert len(calls) == 1
+    assert results == [rows(3)] * 5
+    assert cache.stats()["coalesced"] == 4
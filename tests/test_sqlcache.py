@@ -0,0 +1,94 @@
+import time
+
+import numpy as np
+
+from sqlcache import SQLCache, literal_signature, normalize_question
+
+WORDS = ["latest", "trip", "for", "vehicle", "last", "status", "count", "trucks", "today"]
+
+
+def bag_of_words(question):
+    """Embeds only the known words, so questions that differ in a literal embed identically."""
+    tokens = question.lower().split()
+    return np.array([tokens.count(word) for word in WORDS], dtype="float32")
+
+
+def test_normalize_question():
+    assert normalize_question("  Latest   TRIP for MH34AB1393?? ") == "latest trip for mh34ab1393"
+
+
+def test_literal_signature():
+    assert literal_signature("trip for MH34AB1393 on '2024-01-05'") == {"mh34ab1393", "2024-01-05"}
+    assert literal_signature("latest trip") == frozenset()
+
+
+def test_exact_hit_is_per_plant():
+    cache = SQLCache(ttl=0, max_entries=10)
+    cache.put("Latest trip?", "N205", "SELECT 1")
+    assert cache.get("latest trip", "N205") == "SELECT 1"
+    assert cache.get("latest trip", "NE03") is None
+    assert cache.stats()["exact_hits"] == 1 and cache.stats()["misses"] == 1
+
+
+def test_semantic_hit_with_same_literals():
+    cache = SQLCache(ttl=0, max_entries=10, similarity=0.9, embed_fn=bag_of_words)
+    cache.put("latest trip for vehicle MH34AB1393", "N205", "SELECT a")
+    assert cache.get("latest trip for the vehicle MH34AB1393", "N205") == "SELECT a"
+    assert cache.stats()["semantic_hits"] == 1
+
+
+def test_semantic_tier_never_crosses_literals():
+    cache = SQLCache(ttl=0, max_entries=10, similarity=0.9, embed_fn=bag_of_words)
+    cache.put("latest trip for vehicle MH34AB1393", "N205", "SELECT a")
+    # Identical embedding, different vehicle number
+    assert cache.get("latest trip for vehicle MH34AB1394", "N205") is None
+    assert cache.get("latest trip for vehicle", "N205") is None
+    assert cache.stats()["semantic_hits"] == 0
+
+
+def test_semantic_tier_never_crosses_stage_names():
+    cache = SQLCache(ttl=0, max_entries=10, similarity=0.9, embed_fn=bag_of_words)
+    cache.put("count trucks at Gate-In", "N205", "SELECT a")
+    # Identical embedding, different stage
+    assert cache.get("count trucks at Gate-Out", "N205") is None
+    assert cache.get("count trucks at yard in", "N205") is None
+    # Same stage in another case or spacing
+    assert cache.get("count trucks at gate in", "N205") == "SELECT a"
+    assert cache.get("count trucks at GATE IN", "N205") == "SELECT a"
+    assert cache.stats()["semantic_hits"] == 2
+
+
+def test_semantic_tier_respects_similarity_cutoff():
+    cache = SQLCache(ttl=0, max_entries=10, similarity=0.99, embed_fn=bag_of_words)
+    cache.put("count trucks today", "N205", "SELECT COUNT(*)")
+    assert cache.get("count trucks", "N205") is None
+
+
+def test_entries_expire_after_ttl():
+    cache = SQLCache(ttl=0.05, max_entries=10, similarity=0.9, embed_fn=bag_of_words)
+    cache.put("latest trip", "N205", "SELECT 1")
+    assert cache.get("latest trip", "N205") == "SELECT 1"
+    time.sleep(0.06)
+    assert cache.get("latest trip", "N205") is None
+    assert cache.stats()["expirations"] == 1
+
+
+def test_least_recently_used_entry_evicted():
+    cache = SQLCache(ttl=0, max_entries=2)
+    cache.put("first", "N205", "SELECT 1")
+    cache.put("second", "N205", "SELECT 2")
+    assert cache.get("first", "N205") == "SELECT 1"  # now the most recently used
+    cache.put("third", "N205", "SELECT 3")
+    assert cache.get("second", "N205") is None
+    assert cache.get("first", "N205") == "SELECT 1"
+    assert cache.get("third", "N205") == "SELECT 3"
+    assert cache.stats()["evictions"] == 1 and cache.stats()["size"] == 2
+
+
+def test_new_version_clears_entries():
+    cache = SQLCache(ttl=0, max_entries=10)
+    cache.ensure_version("v1")
+    cache.put("latest trip", "N205", "SELECT 1")
+    cache.ensure_version("v2")
+    assert cache.get("latest trip", "N205") is None
+    assert cache.stats()["invalidations"] == 1
@@ -0,0 +1,71 @@
+import pytest
+
+from sqlguard import guard_sql
+
+
+@pytest.mark.parametrize("sql, expected", [
+    ("SELECT * FROM t;", "SELECT * FROM t LIMIT 10"),
+    ("SELECT * FROM t -- newest first", "SELECT * FROM t LIMIT 10"),
+    ("SELECT * FROM t /* all */ ;\n", "SELECT * FROM t LIMIT 10"),
+    ("SELECT * FROM t LIMIT 500;", "SELECT * FROM t LIMIT 10"),
+    ("SELECT * FROM t WHERE a = 'FOR UPDATE'", "SELECT * FROM t WHERE a = 'FOR UPDATE' LIMIT 10"),
+    ("SELECT a.id FROM vw_trip_info a, vw_trip_info b WHERE a.id = b.id",
+     "SELECT a.id FROM vw_trip_info a, vw_trip_info b WHERE a.id = b.id LIMIT 10"),
+    ("SELECT x.id FROM db.t1 AS x, db.t2 y, db.t3 z WHERE x.id = y.tid AND db.z.tid = y.tid",
+     "SELECT x.id FROM db.t1 AS x, db.t2 y, db.t3 z WHERE x.id = y.tid AND db.z.tid = y.tid LIMIT 10"),
+])
+def test_limit_added_to_row_queries(sql, expected):
+    assert guard_sql(sql, limit=10, timeout_ms=0) == (expected, None)
+
+
+@pytest.mark.parametrize("sql", ["SELECT COUNT(*) FROM t;", "SELECT a, SUM(b) FROM t GROUP BY a",
+                                 "SELECT * FROM t LIMIT 5"])
+def test_aggregates_and_small_limits_left_alone(sql):
+    assert guard_sql(sql, limit=10, timeout_ms=0) == (sql, None)
+
+
+def test_execution_hint_after_select():
+    guarded, error = guard_sql("SELECT * FROM t -- c", limit=10, timeout_ms=2000)
+    assert error is None
+    assert guarded == "SELECT /*+ MAX_EXECUTION_TIME(2000) */ * FROM t LIMIT 10"
+
+
+@pytest.mark.parametrize("sql", [
+    "DELETE FROM t",
+    "SELECT 1; SELECT 2",
+    "SELECT * FROM a CROSS JOIN b",
+])
+def test_rejected(sql):
+    guarded, error = guard_sql(sql)
+    assert guarded is None and error
+
+
+@pytest.mark.parametrize("sql", [
+    "SELECT * FROM vw_trip_info INTO OUTFILE '/tmp/x'",
+    "SELECT * FROM vw_trip_info INTO DUMPFILE '/tmp/x';",
+    "SELECT id INTO @trip FROM vw_trip_info",
+])
+def test_select_into_rejected(sql):
+    guarded, error = guard_sql(sql)
+    assert guarded is None and "INTO" in error
+
+
+@pytest.mark.parametrize("sql", [
+    "SELECT * FROM t WHERE a = %s FOR UPDATE",
+    "SELECT * FROM t LIMIT 5 FOR SHARE SKIP LOCKED",
+    "SELECT * FROM t LOCK IN SHARE MODE;",
+])
+def test_locking_reads_rejected(sql):
+    guarded, error = guard_sql(sql)
+    assert guarded is None and "Locking" in error
+
+
+@pytest.mark.parametrize("sql", [
+    "SELECT COUNT(*) FROM vw_trip_info a, vw_trip_info b",
+    "SELECT a.id FROM vw_trip_info a, vw_trip_info b WHERE a.plantCode = 'N205'",
+    "SELECT a.id FROM t1 a, t2 b, t3 c WHERE a.id = b.id",
+    "SELECT * FROM t WHERE id IN (SELECT u.id FROM u, v WHERE u.x = 1)",
+])
+def test_comma_join_without_predicate_rejected(sql):
+    guarded, error = guard_sql(sql)
+    assert guarded is None and "cross join" in error
@@ -0,0 +1,24 @@
+import sys
+import logging
+
+import tokencount
+
+
+def test_missing_tokenizer_estimates_and_warns_once(monkeypatch, caplog):
+    monkeypatch.setattr(tokencount, "PROMPT_TOKENIZER", "no-such-org/no-such-tokenizer")
+    monkeypatch.setattr(tokencount, "_tokenizer", None)
+    monkeypatch.setattr(tokencount, "_tokenizer_load_attempted", False)
+    monkeypatch.setitem(sys.modules, "transformers", None)  # import fails without a download
+    with caplog.at_level(logging.WARNING):
+        assert tokencount.count_tokens("x" * 40) == 11
+        assert tokencount.count_tokens("x" * 8) == 3
+    assert len([record for record in caplog.records if "unavailable" in record.getMessage()]) == 1
+
+
+def test_empty_setting_skips_the_tokenizer(monkeypatch):
+    monkeypatch.setattr(tokencount, "PROMPT_TOKENIZER", "")
+    monkeypatch.setattr(tokencount, "_tokenizer", None)
+    monkeypatch.setattr(tokencount, "_tokenizer_load_attempted", False)
+    tokencount.warm_up(background=False)
+    assert tokencount.get_tokenizer() is None
+    assert tokencount.count_tokens("") == 0
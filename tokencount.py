@@ -0,0 +1,85 @@
+import os
+import logging
+import threading
+from threading import Lock
+from metrics import HistogramFamily
+
+# Tokenizer used to measure prompts; defaults to the SQL model's own, which is gated on Hugging Face
+# (accept its license and set HF_TOKEN, or counts are estimated). Empty = always estimate.
+PROMPT_TOKENIZER = os.getenv("PROMPT_TOKENIZER", "google/gemma-2-9b-it")
+CHARS_PER_TOKEN = 4.0  # rough fallback when the tokenizer cannot be loaded
+
+# Prompt size per LLM call, labelled by caller (e.g. sqlgen, chatbot)
+PROMPT_TOKEN_BUCKETS = (256, 512, 1024, 2048, 4096, 8192, 16384, 32768)
+PROMPT_TOKENS = HistogramFamily("prompt_tokens", "source", buckets=PROMPT_TOKEN_BUCKETS)
+
+_lock = Lock()
+_tokenizer = None
+_tokenizer_load_attempted = False
+
+
+def get_tokenizer():
+    """
+    Returns the Hugging Face tokenizer (loaded once), or None if it is unavailable.
+
+    A failed load is logged once; token counts are estimated from then on.
+    """
+    global _tokenizer, _tokenizer_load_attempted
+    if _tokenizer_load_attempted:
+        return _tokenizer
+    with _lock:
+        if not _tokenizer_load_attempted:
+            if PROMPT_TOKENIZER:
+                try:
+                    from transformers import AutoTokenizer
+                    _tokenizer = AutoTokenizer.from_pretrained(PROMPT_TOKENIZER)
+                except Exception as e:
+                    logging.warning(f"Tokenizer '{PROMPT_TOKENIZER}' unavailable (gated models need HF_TOKEN), "
+                                    f"estimating token counts at {CHARS_PER_TOKEN} characters per token: {e}")
+            _tokenizer_load_attempted = True
+        return _tokenizer
+
+
+def warm_up(background=True):
+    """
+    Loads the tokenizer ahead of the first prompt, so no request waits on the download.
+
+    Returns:
+        threading.Thread or None: The loading thread when background is set.
+    """
+    if not background:
+        get_tokenizer()
+        return None
+    thread = threading.Thread(target=get_tokenizer, name="tokenizer-warmup", daemon=True)
+    thread.start()
+    return thread
+
+
+def count_tokens(text):
+    """
+    Counts the tokens in a piece of text.
+
+    Args:
+        text (str): Text to measure.
+
+    Returns:
+        int: Token count from the tokenizer, or a characters-per-token estimate if it is unavailable.
+    """
+    if not text:
+        return 0
+    tokenizer = get_tokenizer()
+    if tokenizer is None:
+        return int(len(text) / CHARS_PER_TOKEN) + 1
+    return len(tokenizer.encode(text, add_special_tokens=False))
+
+
+def record_prompt_tokens(source, prompt):
+    """Counts a prompt's tokens, adds them to the PROMPT_TOKENS histogram and returns the count."""
+    tokens = count_tokens(prompt)
+    PROMPT_TOKENS.observe(source, tokens)
+    return tokens
+
+
+def prompt_token_snapshot():
+    """Returns the per-source prompt token histograms as plain dicts."""
+    return PROMPT_TOKENS.snapshot()
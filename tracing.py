@@ -0,0 +1,131 @@
+import re
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from metrics import HistogramFamily
+
+# Per-request tracing: stage timings, LLM token usage and DB row counts, kept on the request's
+# context and aggregated into histograms exposed at /metrics.
+REQUEST_ID_HEADER = "X-Request-ID"
+_VALID_REQUEST_ID = re.compile(r"^[A-Za-z0-9._:-]{1,128}$")  # client-supplied ids are echoed back, so keep them tame
+
+TOKEN_BUCKETS = (16, 64, 256, 512, 1024, 2048, 4096, 8192, 16384, 32768)
+ROW_BUCKETS = (0, 1, 10, 100, 1000, 5000, 10000, 100000)
+
+REQUEST_LATENCY = HistogramFamily("chat_request_seconds", "endpoint")
+STAGE_LATENCY = HistogramFamily("chat_stage_seconds", "stage")
+LLM_PROMPT_TOKENS = HistogramFamily("llm_prompt_tokens", "model", buckets=TOKEN_BUCKETS)
+LLM_COMPLETION_TOKENS = HistogramFamily("llm_completion_tokens", "model", buckets=TOKEN_BUCKETS)
+DB_ROWS = HistogramFamily("db_result_rows", "source", buckets=ROW_BUCKETS)
+
+_current_trace = ContextVar("current_trace", default=None)
+
+
+class Trace:
+    """Timings and counters collected for one request."""
+
+    def __init__(self, request_id):
+        self.request_id = request_id
+        self.start = time.perf_counter()
+        self.stages = []  # (stage, seconds) in the order they finished
+        self.counters = {"prompt_tokens": 0, "completion_tokens": 0, "llm_calls": 0, "db_rows": 0}
+        self.finished = False
+
+    def add(self, key, amount):
+        self.counters[key] = self.counters.get(key, 0) + amount
+
+    def to_dict(self):
+        """Summary for the JSON log: request id, elapsed time, per-stage seconds and counters."""
+        stages = {}
+        for stage, seconds in self.stages:
+            stages[stage] = round(stages.get(stage, 0.0) + seconds, 4)
+        return {
+            "request_id": self.request_id,
+            "elapsed": round(time.perf_counter() - self.start, 4),
+            "stages": stages,
+            **self.counters,
+        }
+
+
+def new_request_id(incoming=None):
+    """Returns the client's request id if it is well-formed, else a fresh one."""
+    if incoming and _VALID_REQUEST_ID.match(incoming):
+        return incoming
+    return uuid.uuid4().hex
+
+
+def start_trace(request_id=None):
+    """Starts a trace for the current request (thread or task) and returns it."""
+    trace = Trace(request_id or new_request_id())
+    _current_trace.set(trace)
+    return trace
+
+
+def use_trace(trace):
+    """Makes an existing trace current again, e.g. inside a streamed response generator."""
+    _current_trace.set(trace)
+    return trace
+
+
+def current_trace():
+    """The trace of the request being handled, or None outside a traced request."""
+    return _current_trace.get()
+
+
+def current_request_id():
+    trace = _current_trace.get()
+    return trace.request_id if trace is not None else None
+
+
+def finish_trace(trace, endpoint):
+    """Records the request's total latency once and detaches the trace from the context."""
+    if trace is None or trace.finished:
+        return
+    trace.finished = True
+    REQUEST_LATENCY.observe(endpoint, time.perf_counter() - trace.start)
+    if _current_trace.get() is trace:
+        _current_trace.set(None)
+
+
+@contextmanager
+def stage(name):
+    """Times a pipeline stage into STAGE_LATENCY and the current trace (also when it raises)."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_LATENCY.observe(name, elapsed)
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.stages.append((name, elapsed))
+
+
+def record_llm_usage(model, usage):
+    """
+    Records the token usage reported by an OpenAI-compatible completion.
+
+    Args:
+        model (str): Model name (histogram label).
+        usage (dict): The response's "usage" object (prompt_tokens / completion_tokens); may be None.
+    """
+    if not usage:
+        return
+    prompt_tokens = int(usage.get("prompt_tokens") or 0)
+    completion_tokens = int(usage.get("completion_tokens") or 0)
+    LLM_PROMPT_TOKENS.observe(model, prompt_tokens)
+    LLM_COMPLETION_TOKENS.observe(model, completion_tokens)
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.add("prompt_tokens", prompt_tokens)
+        trace.add("completion_tokens", completion_tokens)
+        trace.add("llm_calls", 1)
+
+
+def record_db_rows(rows, source="query"):
+    """Records the number of rows a database query returned."""
+    DB_ROWS.observe(source, rows)
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.add("db_rows", rows)
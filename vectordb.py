@@ -1,39 +1,340 @@
+import os
+import json
+import math
+import time
+import hashlib
+import argparse
+from concurrent.futures import ThreadPoolExecutor
 import faiss
-from sentence_transformers import SentenceTransformer
 import numpy as np
-import json
-import pickle
 from dotenv import load_dotenv
- 
+from retrieval import (get_embedder, embedder_location, EMBEDDER_BACKEND, FEW_SHOT_INDEX_PATH,
+                       FEW_SHOT_METADATA_PATH)
+from embedders import embedder_name
+from examplestore import write_example_store, load_metadata, ExampleStore
+from metrics import percentile
+
 load_dotenv()
- 
-model = SentenceTransformer('sentence-transformers/all-mpnet-base-v2')
-embeddings = []
-metadata = []
- 
-# Load JSON data from file
-with open("json.txt", "r") as file:
-    json_data = json.load(file)
- 
-# Convert JSON data to the desired format
-context_data = []
-for item in json_data:
-    combined_text = f"instruction: {item['instruction']}; input: {item['input']}; output: {item['output']}"
-    context_data.append({"text": combined_text, "metadata": item})
- 
-for item in context_data:
-    embedding = model.encode(item["text"])
-    embeddings.append(embedding)
-    metadata.append(item["metadata"])
- 
-embeddings_array = np.array(embeddings).astype('float32')
-index = faiss.IndexFlatL2(embeddings_array.shape[1])
-index.add(embeddings_array)
- 
-faiss.write_index(index, "plant_data.index")
- 
-with open("plant_data.metadata", "wb") as f:
-    pickle.dump(metadata, f)
- 
-print("FAISS index and metadata created from json.txt.")
- 
\ No newline at end of file
+
+JSON_DATA_PATH = "json.txt"
+MANIFEST_PATH = os.getenv("FEW_SHOT_MANIFEST_PATH", "plant_data.manifest.json")
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "32"))
+EMBED_WORKERS = int(os.getenv("EMBED_WORKERS", "1"))
+
+# Index type; flat is exact, the others trade a little recall for memory and/or search speed
+INDEX_TYPES = ("flat", "hnsw", "ivfpq", "sq8")
+FEW_SHOT_INDEX_TYPE = os.getenv("FEW_SHOT_INDEX_TYPE", "flat")
+FEW_SHOT_HNSW_M = int(os.getenv("FEW_SHOT_HNSW_M", "32"))  # graph neighbours per vector
+FEW_SHOT_HNSW_EF_SEARCH = int(os.getenv("FEW_SHOT_HNSW_EF_SEARCH", "64"))  # candidates visited per query
+FEW_SHOT_IVF_NPROBE = int(os.getenv("FEW_SHOT_IVF_NPROBE", "8"))  # inverted lists scanned per query
+FEW_SHOT_PQ_M = int(os.getenv("FEW_SHOT_PQ_M", "64"))  # PQ sub-quantizers (must divide the embedding size)
+
+
+def load_examples(json_path=JSON_DATA_PATH):
+    """
+    Loads the few-shot examples and gives each one a stable key and a content hash.
+
+    The key is the instruction + input (numbered when the same pair occurs more than once),
+    so an example whose SQL output is edited is detected as changed rather than added.
+
+    Returns:
+        list: (key, content_hash, text, item) tuples in file order.
+    """
+    with open(json_path, "r") as file:
+        json_data = json.load(file)
+
+    examples, seen = [], {}
+    for item in json_data:
+        base_key = f"{item['instruction']}\x1f{item['input']}"
+        occurrence = seen.get(base_key, 0)
+        seen[base_key] = occurrence + 1
+        combined_text = f"instruction: {item['instruction']}; input: {item['input']}; output: {item['output']}"
+        content_hash = hashlib.sha256(combined_text.encode("utf-8")).hexdigest()
+        examples.append((f"{base_key}#{occurrence}", content_hash, combined_text, item))
+    return examples
+
+
+def encode_texts(texts, batch_size=EMBED_BATCH_SIZE, workers=EMBED_WORKERS):
+    """
+    Encodes texts in batches, spreading the batches over a thread pool.
+
+    Returns:
+        np.ndarray: float32 array of unit-length embeddings, one row per text.
+    """
+    embedder = get_embedder()
+    batches = [texts[i:i + batch_size] for i in range(0, len(texts), batch_size)]
+
+    def encode_batch(batch):
+        return embedder.encode(batch, batch_size=batch_size)
+
+    if workers > 1 and len(batches) > 1:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            encoded = list(executor.map(encode_batch, batches))
+    else:
+        encoded = [encode_batch(batch) for batch in batches]
+    return np.vstack(encoded).astype("float32")
+
+
+def index_factory_spec(index_type, dim, count):
+    """
+    faiss.index_factory description of an index type for ``count`` training vectors.
+
+    IVF-PQ gets about 4*sqrt(count) lists with at least 39 training vectors each, and 8-bit codes
+    (fewer bits while there are fewer than 256 training vectors).
+    """
+    if index_type == "flat":
+        return "Flat"
+    if index_type == "sq8":
+        return "SQ8"
+    if index_type == "hnsw":
+        return f"HNSW{FEW_SHOT_HNSW_M}"
+    if index_type == "ivfpq":
+        if dim % FEW_SHOT_PQ_M:
+            raise ValueError(f"FEW_SHOT_PQ_M={FEW_SHOT_PQ_M} must divide the embedding size {dim}")
+        nlist = max(1, min(int(4 * math.sqrt(count)), count // 39))
+        nbits = max(1, min(8, int(math.log2(max(count, 2)))))
+        return f"IVF{nlist},PQ{FEW_SHOT_PQ_M}x{nbits}np"  # np: skip polysemous training, unused and slow
+    raise ValueError(f"Unknown index type '{index_type}' (expected one of: {', '.join(INDEX_TYPES)})")
+
+
+def new_index(index_type, dim, train_vectors):
+    """
+    Creates an empty ID-mapped index, trained on ``train_vectors`` if the type needs training.
+
+    The search settings (HNSW efSearch, IVF nprobe) are stored in the index file, so retrieval.py
+    needs no per-type configuration.
+    """
+    spec = index_factory_spec(index_type, dim, len(train_vectors))
+    index = faiss.IndexIDMap2(faiss.index_factory(dim, spec, faiss.METRIC_L2))
+    if not index.is_trained:
+        index.train(train_vectors)
+    inner = faiss.downcast_index(index.index)
+    if index_type == "hnsw":
+        inner.hnsw.efSearch = FEW_SHOT_HNSW_EF_SEARCH
+    elif index_type == "ivfpq":
+        inner.nprobe = FEW_SHOT_IVF_NPROBE
+    return index
+
+
+def _rebuild_without(index, index_type, stale_ids):
+    """HNSW graphs cannot delete vectors: rebuilds the index from the vectors that remain."""
+    ids = faiss.vector_to_array(index.id_map)
+    keep = ~np.isin(ids, stale_ids)
+    vectors = faiss.downcast_index(index.index).reconstruct_n(0, index.ntotal)[keep]
+    rebuilt = new_index(index_type, index.d, vectors)
+    if len(vectors):
+        rebuilt.add_with_ids(vectors, ids[keep])
+    return rebuilt
+
+
+def _load_state(index_path, metadata_path, manifest_path, model_name, index_type=FEW_SHOT_INDEX_TYPE):
+    """Returns (index, metadata, manifest) for an incremental build, or None if a full build is needed."""
+    if not (os.path.exists(index_path) and os.path.exists(metadata_path) and os.path.exists(manifest_path)):
+        return None
+    with open(manifest_path, "r") as f:
+        manifest = json.load(f)
+    if manifest.get("model") != model_name:
+        print(f"Embedding model changed ({manifest.get('model')} -> {model_name}), rebuilding.")
+        return None
+    if manifest.get("index_type", "flat") != index_type:
+        print(f"Index type changed ({manifest.get('index_type', 'flat')} -> {index_type}), rebuilding.")
+        return None
+    index = faiss.read_index(index_path)
+    if not isinstance(index, faiss.IndexIDMap2):
+        try:
+            index = faiss.downcast_index(index)
+        except Exception:
+            pass
+    if not isinstance(index, faiss.IndexIDMap2):
+        print("Existing index has no ID mapping, rebuilding.")
+        return None
+    metadata = load_metadata(metadata_path)
+    if isinstance(metadata, ExampleStore):
+        store, metadata = metadata, metadata.to_dict()
+        store.close()
+    if not isinstance(metadata, dict):
+        return None
+    return index, metadata, manifest
+
+
+def _write_atomic(path, write_fn):
+    tmp_path = f"{path}.tmp"
+    write_fn(tmp_path)
+    os.replace(tmp_path, path)
+
+
+def build_index(json_path=JSON_DATA_PATH, index_path=FEW_SHOT_INDEX_PATH, metadata_path=FEW_SHOT_METADATA_PATH,
+                manifest_path=MANIFEST_PATH, batch_size=EMBED_BATCH_SIZE, workers=EMBED_WORKERS,
+                full_rebuild=False, index_type=FEW_SHOT_INDEX_TYPE):
+    """
+    Builds or incrementally updates the FAISS few-shot index from json.txt.
+
+    Only examples that were added or whose content hash changed are embedded; removed and
+    changed examples are deleted from the index by ID, so existing vectors are never recomputed.
+    Trained index types (ivfpq) are trained on the examples of the full build; incremental adds
+    reuse that training. The metadata is written in the columnar format of examplestore.py.
+
+    Returns:
+        dict: Counts of added/changed/removed/unchanged examples, the number embedded,
+              elapsed seconds and examples_per_sec for the embedding step.
+    """
+    start = time.perf_counter()
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown index type '{index_type}' (expected one of: {', '.join(INDEX_TYPES)})")
+    examples = load_examples(json_path)
+    model_name = embedder_name(EMBEDDER_BACKEND, embedder_location())
+    state = None if full_rebuild else _load_state(index_path, metadata_path, manifest_path, model_name, index_type)
+
+    if state is None:
+        index, metadata = None, {}
+        manifest = {"model": model_name, "index_type": index_type, "next_id": 0, "entries": {}}
+    else:
+        index, metadata, manifest = state
+
+    entries = manifest["entries"]
+    current_keys = {key for key, _, _, _ in examples}
+    removed = [key for key in entries if key not in current_keys]
+    added, changed, unchanged = [], [], 0
+    for example in examples:
+        key, content_hash = example[0], example[1]
+        if key not in entries:
+            added.append(example)
+        elif entries[key]["hash"] != content_hash:
+            changed.append(example)
+        else:
+            unchanged += 1
+
+    # Drop vectors for removed and changed examples
+    stale_ids = [entries[key]["id"] for key in removed] + [entries[ex[0]]["id"] for ex in changed]
+    if index is not None and stale_ids:
+        if index_type == "hnsw":
+            index = _rebuild_without(index, index_type, np.array(stale_ids, dtype="int64"))
+        else:
+            index.remove_ids(np.array(stale_ids, dtype="int64"))
+    for key in removed:
+        metadata.pop(entries.pop(key)["id"], None)
+
+    # Embed only what is new or changed
+    to_embed = added + changed
+    embed_seconds = 0.0
+    if to_embed:
+        embed_start = time.perf_counter()
+        vectors = encode_texts([text for _, _, text, _ in to_embed], batch_size=batch_size, workers=workers)
+        embed_seconds = time.perf_counter() - embed_start
+
+        ids = []
+        for key, content_hash, _, item in to_embed:
+            if key in entries:
+                example_id = entries[key]["id"]  # changed: keep its ID
+            else:
+                example_id = manifest["next_id"]
+                manifest["next_id"] += 1
+            entries[key] = {"id": example_id, "hash": content_hash}
+            metadata[example_id] = item
+            ids.append(example_id)
+
+        if index is None:
+            index = new_index(index_type, vectors.shape[1], vectors)
+            manifest["index_spec"] = index_factory_spec(index_type, vectors.shape[1], len(vectors))
+            manifest["trained_on"] = len(vectors)
+        index.add_with_ids(vectors, np.array(ids, dtype="int64"))
+        if index_type == "ivfpq" and index.ntotal > 4 * manifest.get("trained_on", index.ntotal):
+            print(f"The IVF-PQ index was trained on {manifest['trained_on']} examples and now holds {index.ntotal}; "
+                  f"run with --full-rebuild to retrain it.")
+
+    if index is not None and (to_embed or removed):
+        _write_atomic(index_path, lambda path: faiss.write_index(index, path))
+
+        def write_metadata(path):
+            write_example_store(path, metadata)
+
+        def write_manifest(path):
+            with open(path, "w") as f:
+                json.dump(manifest, f)
+
+        _write_atomic(metadata_path, write_metadata)
+        _write_atomic(manifest_path, write_manifest)
+
+    return {
+        "added": len(added),
+        "changed": len(changed),
+        "removed": len(removed),
+        "unchanged": unchanged,
+        "embedded": len(to_embed),
+        "total": index.ntotal if index is not None else 0,
+        "elapsed_sec": time.perf_counter() - start,
+        "examples_per_sec": len(to_embed) / embed_seconds if embed_seconds else 0.0,
+    }
+
+
+def index_report(vectors, queries, k=3, index_types=INDEX_TYPES):
+    """
+    Compares index types on the same vectors against exact search.
+
+    Args:
+        vectors (np.ndarray): Example embeddings (float32, unit length).
+        queries (np.ndarray): Query embeddings, searched one at a time as retrieval.py does.
+        k (int): Neighbours per query.
+        index_types (iterable): Types to build (see INDEX_TYPES).
+
+    Returns:
+        list: Per type: recall@k (share of the exact top-k found), search latency p50/p95 in
+              microseconds, build seconds and serialized size in KB.
+    """
+    k = min(k, len(vectors))
+    exact = faiss.IndexFlatL2(vectors.shape[1])
+    exact.add(vectors)
+    _, truth = exact.search(queries, k)
+    ids = np.arange(len(vectors), dtype="int64")
+
+    report = []
+    for index_type in index_types:
+        build_start = time.perf_counter()
+        index = new_index(index_type, vectors.shape[1], vectors)
+        index.add_with_ids(vectors, ids)
+        build_seconds = time.perf_counter() - build_start
+
+        latencies, hits = [], 0
+        for query, expected in zip(queries, truth):
+            search_start = time.perf_counter()
+            _, found = index.search(query.reshape(1, -1), k)
+            latencies.append((time.perf_counter() - search_start) * 1e6)
+            hits += len(set(found[0].tolist()) & set(expected.tolist()))
+        report.append({
+            "index_type": index_type,
+            "spec": index_factory_spec(index_type, vectors.shape[1], len(vectors)),
+            f"recall@{k}": round(hits / (len(queries) * k), 4),
+            "search_us_p50": round(percentile(latencies, 50), 1),
+            "search_us_p95": round(percentile(latencies, 95), 1),
+            "build_sec": round(build_seconds, 3),
+            "size_kb": round(faiss.serialize_index(index).nbytes / 1024, 1),
+        })
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build or update the FAISS few-shot index from json.txt.")
+    parser.add_argument("--batch-size", type=int, default=EMBED_BATCH_SIZE)
+    parser.add_argument("--workers", type=int, default=EMBED_WORKERS)
+    parser.add_argument("--full-rebuild", action="store_true", help="Ignore the manifest and re-embed everything.")
+    parser.add_argument("--index-type", choices=INDEX_TYPES, default=FEW_SHOT_INDEX_TYPE)
+    parser.add_argument("--report", action="store_true",
+                        help="Also compare recall@k and search latency of every index type on json.txt.")
+    parser.add_argument("--report-k", type=int, default=3)
+    args = parser.parse_args()
+
+    stats = build_index(batch_size=args.batch_size, workers=args.workers, full_rebuild=args.full_rebuild,
+                        index_type=args.index_type)
+    print(f"FAISS {args.index_type} index updated from {JSON_DATA_PATH}: {stats['added']} added, "
+          f"{stats['changed']} changed, {stats['removed']} removed, {stats['unchanged']} unchanged "
+          f"({stats['total']} total).")
+    print(f"Embedded {stats['embedded']} examples at {stats['examples_per_sec']:.1f} examples/sec "
+          f"({stats['elapsed_sec']:.2f}s overall).")
+
+    if args.report:
+        # The examples are indexed as instruction + input + output; users ask the bare question
+        examples = load_examples()
+        vectors = encode_texts([text for _, _, text, _ in examples], batch_size=args.batch_size, workers=args.workers)
+        queries = encode_texts([item["input"] for _, _, _, item in examples], batch_size=args.batch_size,
+                               workers=args.workers)
+        print(json.dumps(index_report(vectors, queries, k=args.report_k), indent=2))